@@ -1,17 +1,73 @@
+import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-from config import ADMIN_CONFIG, MENSAJES
-from database import db
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from telegram.error import BadRequest
+from telegram.helpers import escape_markdown
+from config import ADMIN_CONFIG, CACHE_CONFIG, LIGAS_PERMITIDAS, MENSAJES, PROFILING_CONFIG
+from database import db, utc_today
+from api_client import api
+from broadcast_pool import broadcast
+from metrics import (
+    API_CACHE, API_RESPONSES, API_SECONDS, CALLBACK_ERRORS, CALLBACK_SECONDS,
+    DB_SECONDS, FANOUT_SECONDS, LOOP_LAG, LOOP_STALLS, MESSAGES_SENT, PLAN_CACHE, SEND_RATE
+)
+from profiler import profiler
+from router import CallbackRouter, parse_int
+from runtime_config import runtime
+from startup import Lazy
 import asyncio
 
+# Días sin actividad para el segmento de broadcast 'inactive'
+BROADCAST_INACTIVE_DAYS = 30
+
+# Segmentos que se eligen desde el menú de mensajes masivos
+BROADCAST_TYPES = ('all', 'premium', 'free', 'inactive')
+
+# Nombres de las claves de la configuración en caliente en el panel
+ETIQUETAS_CONFIG = {
+    'consultas_diarias': 'Consultas diarias (plan gratuito)',
+    'ligas_gratuitas': 'Ligas del plan gratuito',
+    'ligas_activas': 'Ligas habilitadas',
+    'intervalo_monitoreo': 'Intervalo de monitoreo',
+    'reserva_monitoreo': 'Reserva de cuota para el monitoreo',
+    'umbral_bajo': 'Margen antes de degradar consultas gratuitas',
+    'cache_ttl': 'Caché de la API'
+}
+
+# Claves que se ajustan desde el menú de límites (el resto, desde el de monitoreo)
+MENU_LIMITES = ('consultas_diarias', 'reserva_monitoreo', 'umbral_bajo')
+
+# Intervalos de monitoreo que ofrece el panel, en segundos
+INTERVALOS_MONITOREO = (15, 30, 60, 120, 300)
+
+# Botones de los menús de usuarios y premium que todavía no tienen implementación
+ACCIONES_PROXIMAMENTE = (
+    'admin_list_users', 'admin_search_user', 'admin_premium_users', 'admin_free_users',
+    'admin_give_premium', 'admin_remove_premium', 'admin_premium_stats'
+)
+
+def _parse_adjust(rest: str) -> Dict:
+    """admin_adjust_<clave>:<delta>"""
+    key, delta = rest.rsplit(':', 1)
+    return {'key': key, 'delta': int(delta)}
+
+def _parse_broadcast_type(rest: str) -> Dict:
+    """admin_broadcast_<segmento>"""
+    if rest not in BROADCAST_TYPES:
+        raise ValueError(rest)
+    return {'broadcast_type': rest}
+
 class AdminPanel:
-    def __init__(self):
-        self.admin_ids = ADMIN_CONFIG['admin_ids']
-        self.log_channel = ADMIN_CONFIG['log_channel']
-        self.support_channel = ADMIN_CONFIG['support_channel']
+    def __init__(self, config: Dict = None):
+        config = config or ADMIN_CONFIG
+        self.admin_ids = config['admin_ids']
+        self.log_channel = config['log_channel']
+        self.support_channel = config['support_channel']
+        self.router = self.build_router()
+        self._background = set()
     
     def is_admin(self, chat_id: int) -> bool:
         """Verifica si un usuario es administrador"""
@@ -23,6 +79,20 @@ class AdminPanel:
             await update.message.reply_text("❌ No tienes permisos de administrador.")
             return
         
+        mensaje, keyboard = self._main_menu()
+        await update.message.reply_text(
+            mensaje,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    
+    async def show_main_menu(self, query):
+        """Vuelve al menú principal desde cualquier pantalla del panel"""
+        mensaje, keyboard = self._main_menu()
+        await self._edit(query, mensaje, keyboard)
+    
+    @staticmethod
+    def _main_menu():
         keyboard = [
             [InlineKeyboardButton('📊 Estadísticas', callback_data='admin_stats')],
             [InlineKeyboardButton('👥 Gestión de Usuarios', callback_data='admin_users')],
@@ -38,44 +108,48 @@ class AdminPanel:
             "Selecciona una opción para continuar.\n\n"
             "Desarrollado por Valentín Olivero"
         )
-        
-        await update.message.reply_text(
-            mensaje,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
+        return mensaje, keyboard
     
-    async def admin_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Maneja los callbacks del panel de administración"""
-        query = update.callback_query
-        await query.answer()
-        
-        if not self.is_admin(query.message.chat_id):
-            await query.edit_message_text("❌ No tienes permisos de administrador.")
+    def build_router(self) -> CallbackRouter:
+        """Tabla de rutas del panel (el permiso de administrador se verifica antes de despachar)"""
+        router = CallbackRouter()
+        router.exact('admin_back', self.show_main_menu)
+        router.exact('admin_stats', self.show_stats)
+        router.exact('admin_users', self.show_users_menu)
+        router.exact('admin_broadcast', self.show_broadcast_menu)
+        router.exact('admin_premium', self.show_premium_menu)
+        router.exact('admin_config', self.show_config_menu)
+        router.exact('admin_logs', self.show_logs)
+        router.exact('admin_profile', self.start_profile)
+        router.exact('admin_change_limits', self.show_limits_menu)
+        router.exact('admin_change_monitoring', self.show_monitoring_menu)
+        router.exact('admin_manage_leagues', self.show_leagues_menu)
+        for data in ACCIONES_PROXIMAMENTE:
+            router.exact(data, self.show_coming_soon)
+        router.prefix('admin_adjust_', self.adjust_setting, parse=_parse_adjust)
+        router.prefix('admin_interval_', self.set_monitoring_interval, parse=parse_int('seconds'))
+        router.prefix('admin_league_active_', self.toggle_league, parse=parse_int('league_id'), key='ligas_activas')
+        router.prefix('admin_league_free_', self.toggle_league, parse=parse_int('league_id'), key='ligas_gratuitas')
+        router.exact('admin_broadcast_cancel', self.cancel_broadcast, with_context=True)
+        router.prefix('admin_broadcast_', self.handle_broadcast, parse=_parse_broadcast_type, with_context=True)
+        return router
+    
+    async def handle_admin_callback(self, query, data: str, context: ContextTypes.DEFAULT_TYPE = None):
+        """Despacha un callback del panel a su ruta"""
+        route, params = self.router.resolve(data)
+        if route is None:
+            logging.warning(f"Callback de administración sin ruta: {data}")
             return
-        
-        data = query.data
-        
-        if data == 'admin_stats':
-            await self.show_stats(query)
-        elif data == 'admin_users':
-            await self.show_users_menu(query)
-        elif data == 'admin_broadcast':
-            await self.show_broadcast_menu(query)
-        elif data == 'admin_premium':
-            await self.show_premium_menu(query)
-        elif data == 'admin_config':
-            await self.show_config_menu(query)
-        elif data == 'admin_logs':
-            await self.show_logs(query)
-        elif data.startswith('admin_user_'):
-            await self.show_user_details(query, data)
-        elif data.startswith('admin_broadcast_'):
-            await self.handle_broadcast(query, data)
+        await self.router.call(route, query, params, context=context)
+    
+    async def show_coming_soon(self, query):
+        keyboard = [[InlineKeyboardButton('🔙 Volver', callback_data='admin_back')]]
+        await self._edit(query, MENSAJES['proximamente'], keyboard)
     
     async def show_stats(self, query):
         """Muestra estadísticas del bot"""
         stats = db.get_stats()
+        quota = api.quota.get_status()
         
         mensaje = (
             "📊 *Estadísticas del Bot*\n\n"
@@ -84,6 +158,8 @@ class AdminPanel:
             f"📈 **% Premium:** {stats.get('premium_percentage', 0):.1f}%\n"
             f"🔍 **Consultas hoy:** {stats.get('queries_today', 0)}\n"
             f"⚡ **Usuarios activos hoy:** {stats.get('active_today', 0)}\n\n"
+            f"🌐 **Cuota API restante:** {quota['daily_remaining']}/{quota['daily_limit']}\n"
+            f"⏬ **Llamadas degradadas hoy:** {quota['shed_today']}\n\n"
             f"📅 *Fecha:* {datetime.now().strftime('%d/%m/%Y %H:%M')}"
         )
         
@@ -97,11 +173,12 @@ class AdminPanel:
     
     async def show_users_menu(self, query):
         """Menú de gestión de usuarios"""
-        users = db.get_all_users()
+        # El total sale de los contadores incrementales, no de cargar todos los usuarios
+        stats = db.get_stats()
         
         mensaje = (
             "👥 *Gestión de Usuarios*\n\n"
-            f"Total de usuarios: {len(users)}\n\n"
+            f"Total de usuarios: {stats.get('total_users', 0)}\n\n"
             "Selecciona una opción:"
         )
         
@@ -131,6 +208,7 @@ class AdminPanel:
             [InlineKeyboardButton('📢 A Todos', callback_data='admin_broadcast_all')],
             [InlineKeyboardButton('💎 Solo Premium', callback_data='admin_broadcast_premium')],
             [InlineKeyboardButton('🔹 Solo Gratuitos', callback_data='admin_broadcast_free')],
+            [InlineKeyboardButton('😴 Inactivos (30 días)', callback_data='admin_broadcast_inactive')],
             [InlineKeyboardButton('🔙 Volver', callback_data='admin_back')]
         ]
         
@@ -167,15 +245,26 @@ class AdminPanel:
         )
     
     async def show_config_menu(self, query):
-        """Menú de configuración"""
+        """Menú de configuración con los valores vigentes de la configuración en caliente"""
+        snapshot = runtime.snapshot()
+        history = await asyncio.to_thread(runtime.history, 3)
         mensaje = (
             "🔧 *Configuración del Bot*\n\n"
-            "Configuración actual:\n"
-            "• Límite gratuito: 10 consultas/día\n"
-            "• Monitoreo: 60 segundos\n"
-            "• Ligas disponibles: 10\n\n"
-            "Selecciona una opción:"
+            f"Configuración actual (v{snapshot.version}):\n"
+            f"• Límite gratuito: {snapshot['consultas_diarias']} consultas/día\n"
+            f"• Monitoreo: {snapshot['intervalo_monitoreo']} segundos\n"
+            f"• Ligas habilitadas: {len(snapshot['ligas_activas'])} de {len(LIGAS_PERMITIDAS)} "
+            f"({len(set(snapshot['ligas_activas']) & set(snapshot['ligas_gratuitas']))} gratuitas)\n\n"
         )
+        if history:
+            mensaje += "*Últimos cambios:*\n"
+            for change in history:
+                mensaje += (
+                    f"• v{change['version']} {ETIQUETAS_CONFIG.get(change['key'], change['key'])}: "
+                    f"{self._format_setting(json.loads(change['value']))} ({change['updated_at']})\n"
+                )
+            mensaje += "\n"
+        mensaje += "Los cambios aplican sin reiniciar. Selecciona una opción:"
         
         keyboard = [
             [InlineKeyboardButton('⚙️ Cambiar Límites', callback_data='admin_change_limits')],
@@ -190,19 +279,192 @@ class AdminPanel:
             parse_mode='Markdown'
         )
     
-    async def show_logs(self, query):
-        """Muestra logs del sistema"""
+    async def show_limits_menu(self, query, aviso: str = ''):
+        """Límite del plan gratuito y reservas de cuota de la API"""
+        snapshot = runtime.snapshot()
+        mensaje = (
+            f"{aviso}⚙️ *Límites* (v{snapshot.version})\n\n"
+            f"• {ETIQUETAS_CONFIG['consultas_diarias']}: {snapshot['consultas_diarias']}\n"
+            f"• {ETIQUETAS_CONFIG['reserva_monitoreo']}: {snapshot['reserva_monitoreo']} requests/día\n"
+            f"• {ETIQUETAS_CONFIG['umbral_bajo']}: {snapshot['umbral_bajo']} requests/día"
+        )
+        keyboard = [
+            self._adjust_row('Consultas', 'consultas_diarias', (-5, -1, 1, 5)),
+            self._adjust_row('Reserva', 'reserva_monitoreo', (-10, 10)),
+            self._adjust_row('Margen', 'umbral_bajo', (-10, 10)),
+            [InlineKeyboardButton('🔙 Volver', callback_data='admin_config')]
+        ]
+        await self._edit(query, mensaje, keyboard)
+    
+    async def show_monitoring_menu(self, query, aviso: str = ''):
+        """Intervalo del monitoreo en vivo y antigüedad máxima de los partidos en caché"""
+        snapshot = runtime.snapshot()
+        ttl = snapshot['cache_ttl'].get('/fixtures', CACHE_CONFIG['ttl_default'])
         mensaje = (
-            "📋 *Logs del Sistema*\n\n"
-            "Funcionalidad en desarrollo.\n\n"
-            "Los logs se guardan automáticamente en:\n"
-            "• Errores de API\n"
-            "• Actividad de usuarios\n"
-            "• Cambios de suscripción\n"
-            "• Mensajes masivos"
+            f"{aviso}🕐 *Monitoreo* (v{snapshot.version})\n\n"
+            f"• {ETIQUETAS_CONFIG['intervalo_monitoreo']}: {snapshot['intervalo_monitoreo']} segundos\n"
+            f"• Caché de partidos: {ttl} segundos\n\n"
+            "El intervalo nuevo aplica en la vuelta en curso del monitoreo."
         )
+        keyboard = [
+            [InlineKeyboardButton(f"{seconds}s", callback_data=f"admin_interval_{seconds}")
+             for seconds in INTERVALOS_MONITOREO],
+            self._adjust_row('Caché', 'cache_ttl/fixtures', (-30, -15, 15, 30)),
+            [InlineKeyboardButton('🔙 Volver', callback_data='admin_config')]
+        ]
+        await self._edit(query, mensaje, keyboard)
+    
+    async def show_leagues_menu(self, query, aviso: str = ''):
+        """Ligas habilitadas (✅/❌) y cuáles entran en el plan gratuito (🆓/💎)"""
+        snapshot = runtime.snapshot()
+        mensaje = (
+            f"{aviso}🏆 *Gestionar Ligas* (v{snapshot.version})\n\n"
+            "Izquierda: habilitar o deshabilitar la liga (menús y monitoreo).\n"
+            "Derecha: incluirla o no en el plan gratuito."
+        )
+        keyboard = [
+            [
+                InlineKeyboardButton(
+                    f"{'✅' if league_id in snapshot['ligas_activas'] else '❌'} {name}",
+                    callback_data=f"admin_league_active_{league_id}"
+                ),
+                InlineKeyboardButton(
+                    '🆓' if league_id in snapshot['ligas_gratuitas'] else '💎',
+                    callback_data=f"admin_league_free_{league_id}"
+                )
+            ]
+            for league_id, name in LIGAS_PERMITIDAS.items()
+        ]
+        keyboard.append([InlineKeyboardButton('🔙 Volver', callback_data='admin_config')])
+        await self._edit(query, mensaje, keyboard)
+    
+    async def adjust_setting(self, query, key: str, delta: int):
+        """Suma delta a un valor numérico (o al TTL de un endpoint con cache_ttl/<endpoint>)"""
+        snapshot = runtime.snapshot()
+        if key.startswith('cache_ttl/'):
+            endpoint = key[len('cache_ttl'):]
+            ttls = dict(snapshot['cache_ttl'])
+            ttls[endpoint] = max(ttls.get(endpoint, CACHE_CONFIG['ttl_default']) + delta, 0)
+            aviso = await self._save_setting(query, 'cache_ttl', ttls)
+        else:
+            aviso = await self._save_setting(query, key, snapshot[key] + delta)
         
-        keyboard = [[InlineKeyboardButton('🔙 Volver', callback_data='admin_back')]]
+        if key in MENU_LIMITES:
+            await self.show_limits_menu(query, aviso)
+        else:
+            await self.show_monitoring_menu(query, aviso)
+    
+    async def set_monitoring_interval(self, query, seconds: int):
+        aviso = await self._save_setting(query, 'intervalo_monitoreo', seconds)
+        await self.show_monitoring_menu(query, aviso)
+    
+    async def toggle_league(self, query, league_id: int, key: str):
+        """Agrega o quita una liga de ligas_activas o de ligas_gratuitas"""
+        leagues = set(runtime.get(key))
+        leagues.symmetric_difference_update({league_id})
+        aviso = await self._save_setting(query, key, sorted(leagues))
+        await self.show_leagues_menu(query, aviso)
+    
+    async def _save_setting(self, query, key: str, value) -> str:
+        """Guarda el valor en la configuración en caliente; devuelve el aviso para el menú"""
+        try:
+            snapshot = await asyncio.to_thread(runtime.set, key, value, query.from_user.id)
+        except (KeyError, ValueError) as e:
+            return f"❌ Valor no válido: {e}\n\n"
+        except RuntimeError as e:
+            logging.error(f"Error guardando configuración: {e}")
+            return "❌ No se pudo guardar el cambio.\n\n"
+        logging.info(
+            "Configuración %s cambiada por %s", key, query.from_user.id,
+            extra={'config_key': key, 'config_version': snapshot.version}
+        )
+        return f"✅ Guardado como v{snapshot.version}\n\n"
+    
+    @staticmethod
+    def _adjust_row(label: str, key: str, deltas) -> List[InlineKeyboardButton]:
+        return [
+            InlineKeyboardButton(f"{label} {delta:+d}", callback_data=f"admin_adjust_{key}:{delta}")
+            for delta in deltas
+        ]
+    
+    @staticmethod
+    def _format_setting(value) -> str:
+        if isinstance(value, list):
+            return f"{len(value)} ligas"
+        if isinstance(value, dict):
+            return ', '.join(f"{endpoint} {seconds}s" for endpoint, seconds in value.items())
+        return str(value)
+    
+    @staticmethod
+    async def _edit(query, mensaje: str, keyboard):
+        try:
+            await query.edit_message_text(
+                mensaje,
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown'
+            )
+        except BadRequest as e:
+            if "Message is not modified" not in str(e):
+                raise
+    
+    async def show_logs(self, query):
+        """Muestra el resumen de métricas del proceso (el detalle completo está en /metrics)"""
+        mensaje = "📋 *Métricas del Sistema*\n\n"
+        
+        mensaje += "*Rutas más lentas (p95):*\n"
+        errors = CALLBACK_ERRORS.values()
+        for key, summary in self._slowest(CALLBACK_SECONDS.summary(), 5):
+            mensaje += (
+                f"• `{key[0]}`: {self._format_seconds(summary['p95'])} "
+                f"({summary['count']} llamadas, {int(errors.get(key, 0))} errores)\n"
+            )
+        
+        mensaje += "\n*API-Football:*\n"
+        statuses = {}
+        for (endpoint, status), count in API_RESPONSES.values().items():
+            # Estados como connection_error cortarían el Markdown: van escapados
+            statuses.setdefault(endpoint, []).append(f"{escape_markdown(str(status))}: {int(count)}")
+        for key, summary in self._slowest(API_SECONDS.summary(), 5):
+            mensaje += (
+                f"• `{key[0]}`: p95 {self._format_seconds(summary['p95'])} "
+                f"({', '.join(sorted(statuses.get(key[0], [])))})\n"
+            )
+        
+        mensaje += "\n*Cachés:*\n"
+        api_cache = {}
+        for (_, result), count in API_CACHE.values().items():
+            api_cache[result] = api_cache.get(result, 0) + count
+        plan_cache = {key[0]: count for key, count in PLAN_CACHE.values().items()}
+        mensaje += f"• API: {self._hit_ratio(api_cache.get('hit', 0) + api_cache.get('stale', 0), sum(api_cache.values()))}\n"
+        mensaje += f"• Planes: {self._hit_ratio(plan_cache.get('hit', 0), sum(plan_cache.values()))}\n"
+        
+        mensaje += "\n*Base de datos (p95):*\n"
+        for key, summary in self._slowest(DB_SECONDS.summary(), 5):
+            mensaje += f"• `{key[0]}`: {self._format_seconds(summary['p95'])} ({summary['count']} llamadas)\n"
+        
+        lag = LOOP_LAG.summary().get(())
+        if lag:
+            stalls = sum(LOOP_STALLS.values().values())
+            mensaje += (
+                f"\n*Event loop:* atraso p95 {self._format_seconds(lag['p95'])}, "
+                f"{int(stalls)} bloqueos\n"
+            )
+        
+        mensaje += "\n*Envíos:*\n"
+        fanout = FANOUT_SECONDS.summary().get(())
+        if fanout:
+            mensaje += f"• Alertas: {fanout['count']} envíos, {fanout['avg']:.1f}s promedio\n"
+        sent = MESSAGES_SENT.values()
+        for (kind,), rate in sorted(SEND_RATE.values().items()):
+            mensaje += (
+                f"• {escape_markdown(kind)}: {int(sent.get((kind, 'sent'), 0))} enviados, "
+                f"{int(sent.get((kind, 'failed'), 0))} fallidos, último a {rate:.1f} msg/s\n"
+            )
+        
+        keyboard = [
+            [InlineKeyboardButton(f"🔬 Perfil de {PROFILING_CONFIG['segundos']}s", callback_data='admin_profile')],
+            [InlineKeyboardButton('🔙 Volver', callback_data='admin_back')]
+        ]
         
         await query.edit_message_text(
             mensaje,
@@ -210,12 +472,68 @@ class AdminPanel:
             parse_mode='Markdown'
         )
     
-    async def handle_broadcast(self, query, data):
-        """Maneja el envío de mensajes masivos"""
-        broadcast_type = data.split('_')[2]
+    async def start_profile(self, query):
+        """Inicia una captura de perfil en segundo plano y responde con el resumen al terminar.
+        Perfila el proceso que atendió el botón (en modo webhook, un worker)"""
+        if profiler.running:
+            await query.edit_message_text("⏳ Ya hay una captura de perfil en curso.")
+            return
         
-        # Guardar el tipo de broadcast en el contexto
-        query.message.chat_data['broadcast_type'] = broadcast_type
+        await query.edit_message_text(
+            f"🔬 Capturando perfil durante {PROFILING_CONFIG['segundos']} segundos..."
+        )
+        
+        async def capture():
+            try:
+                summary = await profiler.capture()
+            except Exception as e:
+                logging.error(f"Error capturando perfil: {e}")
+                await query.message.reply_text(f"❌ Error capturando perfil: {e}")
+                return
+            
+            if summary['bloqueos'] is None:
+                bloqueos = "sin medir (watchdog deshabilitado)"
+            else:
+                bloqueos = f"{summary['bloqueos']} (máximo {summary['bloqueo_max_ms']:.0f} ms)"
+            mensaje = (
+                f"🔬 Perfil del proceso {summary['pid']} ({summary['muestras']} muestras)\n\n"
+                f"Bloqueos del event loop: {bloqueos}\n\n"
+                "Más tiempo en el hilo del loop:\n"
+            )
+            for entry in summary['top_loop'][:8]:
+                mensaje += f"• {entry['porcentaje']}% {entry['funcion']}\n"
+            mensaje += f"\nGuardado en {summary['archivo_resumen']}"
+            await query.message.reply_text(mensaje)
+        
+        # La captura no retiene el handler: los updates se siguen procesando mientras dura
+        task = asyncio.create_task(capture())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    @staticmethod
+    def _slowest(summaries: Dict, limit: int) -> List:
+        """Entradas de un resumen de histograma ordenadas por p95 descendente"""
+        def p95(item):
+            value = item[1]['p95']
+            return float('inf') if value is None else value
+        return sorted(summaries.items(), key=p95, reverse=True)[:limit]
+    
+    @staticmethod
+    def _format_seconds(value) -> str:
+        if value is None:
+            return '>10s'
+        return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.1f}s"
+    
+    @staticmethod
+    def _hit_ratio(hits: float, total: float) -> str:
+        if not total:
+            return 'sin lecturas'
+        return f"{hits / total:.0%} aciertos ({int(total)} lecturas)"
+    
+    async def handle_broadcast(self, query, broadcast_type: str, context: ContextTypes.DEFAULT_TYPE):
+        """Maneja el envío de mensajes masivos"""
+        # Guardar el tipo de broadcast en el contexto: el próximo texto del chat es el mensaje
+        context.chat_data['broadcast_type'] = broadcast_type
         
         mensaje = (
             "📢 *Mensaje Masivo*\n\n"
@@ -224,7 +542,7 @@ class AdminPanel:
             "Usa /cancel para cancelar"
         )
         
-        keyboard = [[InlineKeyboardButton('❌ Cancelar', callback_data='admin_back')]]
+        keyboard = [[InlineKeyboardButton('❌ Cancelar', callback_data='admin_broadcast_cancel')]]
         
         await query.edit_message_text(
             mensaje,
@@ -232,38 +550,61 @@ class AdminPanel:
             parse_mode='Markdown'
         )
     
-    async def send_broadcast(self, message_text: str, broadcast_type: str, context: ContextTypes.DEFAULT_TYPE) -> Dict:
-        """Envía un mensaje masivo"""
-        users = db.get_all_users()
-        sent_count = 0
-        failed_count = 0
+    async def cancel_broadcast(self, query, context: ContextTypes.DEFAULT_TYPE):
+        """Botón Cancelar: descarta el mensaje masivo pendiente y vuelve al menú principal"""
+        context.chat_data.pop('broadcast_type', None)
+        await self.show_main_menu(query)
+    
+    async def cancel_broadcast_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/cancel: descarta el mensaje masivo pendiente"""
+        if context.chat_data.pop('broadcast_type', None) is None:
+            await update.message.reply_text("No hay ningún mensaje masivo pendiente.")
+            return
+        await update.message.reply_text("❌ Mensaje masivo cancelado.")
+    
+    async def receive_broadcast_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Texto que escribe el administrador después de elegir el tipo de mensaje masivo.
+        Si no hay uno pendiente, no hace nada y el texto sigue a los handlers del grupo siguiente"""
+        chat_id = update.effective_chat.id
+        broadcast_type = context.chat_data.get('broadcast_type')
+        if broadcast_type is None or not self.is_admin(chat_id):
+            return
+        del context.chat_data['broadcast_type']
+        message_text = update.message.text
+        
+        await update.message.reply_text(f"📤 Enviando mensaje masivo ({broadcast_type})...")
         
-        for user in users:
+        async def send():
             try:
-                # Filtrar usuarios según el tipo de broadcast
-                if broadcast_type == 'premium' and not db.is_premium(user['chat_id']):
-                    continue
-                elif broadcast_type == 'free' and db.is_premium(user['chat_id']):
-                    continue
-                
-                await context.bot.send_message(
-                    chat_id=user['chat_id'],
-                    text=message_text
-                )
-                sent_count += 1
-                
-                # Pequeña pausa para evitar límites de rate
-                await asyncio.sleep(0.1)
-                
+                counts = await self.send_broadcast(message_text, broadcast_type, context)
             except Exception as e:
-                logging.error(f"Error sending broadcast to {user['chat_id']}: {e}")
-                failed_count += 1
+                logging.error(f"Error enviando mensaje masivo: {e}")
+                await update.message.reply_text(f"❌ Error enviando el mensaje masivo: {e}")
+                return
+            
+            await update.message.reply_text(
+                f"✅ Mensaje masivo enviado: {counts['sent']} entregados, {counts['failed']} fallidos."
+            )
+            await self.log_admin_action(chat_id, 'broadcast', f"{broadcast_type}: {counts['sent']}/{counts['total']}",
+                                        context)
+        
+        # El envío dura minutos con muchos usuarios: no retiene el handler
+        task = asyncio.create_task(send())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        raise ApplicationHandlerStop
+    
+    async def send_broadcast(self, message_text: str, broadcast_type: str, context: ContextTypes.DEFAULT_TYPE,
+                             segment_value=None) -> Dict:
+        """Envía un mensaje masivo al segmento indicado ('all', 'premium', 'free', 'league', 'inactive').
+        Los destinatarios se reparten entre los procesos de broadcast_pool"""
+        # Normalizar planes vencidos en bloque para que el segmento se resuelva solo en SQL
+        await asyncio.to_thread(db.expire_lapsed_plans)
+        
+        if broadcast_type == 'inactive' and segment_value is None:
+            segment_value = BROADCAST_INACTIVE_DAYS
         
-        return {
-            'sent': sent_count,
-            'failed': failed_count,
-            'total': len(users)
-        }
+        return await broadcast(context.bot, message_text, broadcast_type, segment_value)
     
     async def log_admin_action(self, admin_id: int, action: str, details: str = "", context: ContextTypes.DEFAULT_TYPE = None):
         """Registra acciones de administración"""
@@ -288,23 +629,22 @@ class AdminPanel:
     def get_user_usage_stats(self, chat_id: int) -> Dict:
         """Obtiene estadísticas de uso de un usuario específico"""
         try:
-            today = datetime.now().date()
-            daily_queries = db.get_daily_queries_count(chat_id, today)
+            daily_queries = db.get_daily_queries_count(chat_id, utc_today())
             user = db.get_user(chat_id)
             
             return {
                 'chat_id': chat_id,
-                'username': user.get('username', 'N/A'),
-                'first_name': user.get('first_name', 'N/A'),
-                'plan': user.get('plan', 'gratuito'),
+                'username': user.username or 'N/A',
+                'first_name': user.first_name or 'N/A',
+                'plan': user.plan or 'gratuito',
                 'daily_queries': daily_queries,
                 'is_premium': db.is_premium(chat_id),
-                'created_at': user.get('created_at', 'N/A'),
-                'last_activity': user.get('last_activity', 'N/A')
+                'created_at': user.created_at or 'N/A',
+                'last_activity': user.last_activity or 'N/A'
             }
         except Exception as e:
             logging.error(f"Error getting user usage stats: {e}")
             return {}
 
 # Instancia global del panel de administración
-admin_panel = AdminPanel() 
\ No newline at end of file
+admin_panel = Lazy('admin_panel', AdminPanel) 
\ No newline at end of file
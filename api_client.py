@@ -0,0 +1,310 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from config import API_FOOTBALL_TOKEN, API_FOOTBALL_URL, API_QUOTA_CONFIG, CACHE_CONFIG
+from database import db, utc_now, utc_today
+from http_client import http
+from fixtures_parser import parse_fixtures_response
+from metrics import API_CACHE
+from models import Fixture
+from runtime_config import runtime
+from startup import Lazy
+
+# Prioridades de las llamadas a la API (menor número = más prioritaria)
+PRIORIDAD_LIVE = 'live'  # monitorear_eventos
+PRIORIDAD_USUARIO = 'user'  # Vistas de usuarios premium
+PRIORIDAD_BAJA = 'low'  # Vistas gratuitas, predicciones, forma de equipos
+
+# Registros que devuelve cada parser, para reconstruirlos desde la caché compartida
+_PARSER_RECORDS = {parse_fixtures_response.__name__: Fixture}
+
+class QuotaGovernor:
+    """Lleva la cuenta del presupuesto diario y por minuto de API-Football.
+    Con store, las llamadas se cuentan en la base (tabla api_usage) y cada proceso decide con
+    el total de todos; sin store, cada proceso cuenta solo las suyas"""
+
+    def __init__(self, config: Dict = None, store=None):
+        config = config or API_QUOTA_CONFIG
+        self.daily_limit = config['limite_diario']
+        self.minute_limit = config['limite_por_minuto']
+        self.reserva_monitoreo = config['reserva_monitoreo']
+        self.umbral_bajo = config['umbral_bajo']
+        self.reserva_minuto = config['reserva_minuto']
+        self.store = store
+
+        self.daily_used = 0
+        self.daily_remaining = None  # Último valor informado por la API
+        self.used_at_header = 0  # daily_used cuando llegó ese valor
+        self.minute_remaining = None
+        self.shared_minute_used = 0  # Llamadas de todos los procesos en el minuto actual
+        self.day = utc_today()  # API-Football reinicia la cuota diaria a las 00:00 UTC
+        self.minute_window = deque()
+        self.shed_count = 0
+        self._lock = threading.Lock()
+
+    def _rollover(self):
+        """Reinicia los contadores al cambiar de día y limpia la ventana de un minuto"""
+        today = utc_today()
+        if today != self.day:
+            self.day = today
+            self.daily_used = 0
+            self.daily_remaining = None
+            self.used_at_header = 0
+            self.shed_count = 0
+
+        limit = time.monotonic() - 60
+        while self.minute_window and self.minute_window[0] < limit:
+            self.minute_window.popleft()
+
+    @staticmethod
+    def _periods() -> Tuple[str, str]:
+        """Claves de api_usage del día y del minuto actuales"""
+        now = utc_now()
+        return now.date().isoformat(), now.strftime('%Y-%m-%dT%H:%M')
+    
+    def _sync(self):
+        """Toma de la base las llamadas de todos los procesos (si falla, sigue con la cuenta local)"""
+        if self.store is None:
+            return
+        usage = self.store.get_api_usage(*self._periods())
+        if usage is not None:
+            self.daily_used, self.shared_minute_used = usage
+    
+    def remaining_today(self) -> int:
+        """Requests diarios restantes (según la API o la cuenta local)"""
+        local = self.daily_limit - self.daily_used
+        if self.daily_remaining is None:
+            return local
+        # Lo que informó la API menos las llamadas hechas desde entonces
+        return min(local, self.daily_remaining - (self.daily_used - self.used_at_header))
+
+    def remaining_minute(self) -> int:
+        """Requests restantes en el minuto actual"""
+        local = self.minute_limit - max(len(self.minute_window), self.shared_minute_used)
+        if self.minute_remaining is None:
+            return local
+        return min(local, self.minute_remaining)
+
+    def allow(self, priority: str) -> bool:
+        """Decide si una llamada con la prioridad indicada puede consumir cuota"""
+        with self._lock:
+            self._rollover()
+            self._sync()
+            daily = self.remaining_today()
+            minute = self.remaining_minute()
+
+            if priority == PRIORIDAD_LIVE:
+                allowed = daily > 0 and minute > 0
+            elif priority == PRIORIDAD_USUARIO:
+                allowed = daily > self.reserva_monitoreo and minute > self.reserva_minuto
+            else:
+                allowed = (daily > self.reserva_monitoreo + self.umbral_bajo
+                           and minute > self.reserva_minuto)
+
+            if not allowed:
+                self.shed_count += 1
+            return allowed
+
+    def record_request(self):
+        """Registra una llamada realizada"""
+        with self._lock:
+            self._rollover()
+            self.minute_window.append(time.monotonic())
+            if self.minute_remaining is not None:
+                self.minute_remaining -= 1
+            usage = self.store.record_api_request(*self._periods()) if self.store is not None else None
+            if usage is None:
+                self.daily_used += 1
+            else:
+                self.daily_used, self.shared_minute_used = usage
+
+    def update_from_headers(self, headers):
+        """Actualiza el presupuesto con los headers de rate limit de la respuesta"""
+        with self._lock:
+            try:
+                if headers.get('x-ratelimit-requests-limit'):
+                    self.daily_limit = int(headers['x-ratelimit-requests-limit'])
+                if headers.get('x-ratelimit-requests-remaining'):
+                    self.daily_remaining = int(headers['x-ratelimit-requests-remaining'])
+                    self.used_at_header = self.daily_used
+                if headers.get('X-RateLimit-Limit'):
+                    self.minute_limit = int(headers['X-RateLimit-Limit'])
+                if headers.get('X-RateLimit-Remaining'):
+                    self.minute_remaining = int(headers['X-RateLimit-Remaining'])
+            except (TypeError, ValueError) as e:
+                logging.error(f"Error parsing rate limit headers: {e}")
+
+    def apply_runtime(self, snapshot):
+        """Toma las reservas ajustadas desde el panel (runtime_config)"""
+        with self._lock:
+            self.reserva_monitoreo = snapshot['reserva_monitoreo']
+            self.umbral_bajo = snapshot['umbral_bajo']
+    
+    def get_status(self) -> Dict:
+        """Obtiene el estado actual del presupuesto"""
+        with self._lock:
+            self._rollover()
+            self._sync()
+            return {
+                'daily_limit': self.daily_limit,
+                'daily_remaining': self.remaining_today(),
+                'minute_remaining': self.remaining_minute(),
+                'shed_today': self.shed_count
+            }
+
+class ApiFootballClient:
+    def __init__(self):
+        self.api_token = API_FOOTBALL_TOKEN
+        self.headers = {'x-apisports-key': self.api_token}
+        self.base_url = API_FOOTBALL_URL
+        self.quota = QuotaGovernor(store=db if API_QUOTA_CONFIG['compartida'] else None)
+        runtime.subscribe(self.quota.apply_runtime)
+        # Con varios procesos, la caché en memoria se completa con la guardada en la base
+        self.shared_cache = CACHE_CONFIG['compartida']
+
+        # Última respuesta válida por endpoint y parámetros: (payload, fecha de obtención)
+        self._cache: Dict[Tuple, Tuple[Dict, datetime]] = {}
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=CACHE_CONFIG['workers_refresco'],
+            thread_name_prefix='api-refresh'
+        )
+
+    def _cache_key(self, endpoint: str, params: Dict, parser: Callable = None) -> Tuple:
+        return (endpoint, parser.__name__ if parser else None, tuple(sorted((params or {}).items())))
+
+    def _ttl(self, endpoint: str) -> timedelta:
+        seconds = runtime.get('cache_ttl').get(endpoint, CACHE_CONFIG['ttl_default'])
+        return timedelta(seconds=seconds)
+
+    def _cached(self, key: Tuple) -> Optional[Tuple[Dict, datetime]]:
+        """Devuelve la entrada en caché si no superó la antigüedad máxima"""
+        entry = self._cache.get(key)
+        if self.shared_cache and (entry is None or datetime.now() - entry[1] > self._ttl(key[0])):
+            # Otro proceso pudo haber traído una respuesta más nueva
+            shared = self._load_shared(key)
+            if shared and (entry is None or shared[1] > entry[1]):
+                entry = self._cache[key] = shared
+        if entry and datetime.now() - entry[1] <= timedelta(hours=CACHE_CONFIG['max_stale_horas']):
+            return entry
+        return None
+
+    def _load_shared(self, key: Tuple) -> Optional[Tuple[Dict, datetime]]:
+        row = db.get_cached_response(json.dumps(key))
+        if row is None:
+            return None
+        payload, fetched_at = json.loads(row[0]), datetime.fromisoformat(row[1])
+        record = _PARSER_RECORDS.get(key[1])
+        if record:
+            payload = [record(**item) for item in payload]
+        return payload, fetched_at
+    
+    def _store(self, key: Tuple, data, fetched_at: datetime):
+        """Guarda la respuesta en la caché del proceso y, si está activa, en la compartida"""
+        self._cache[key] = (data, fetched_at)
+        if self.shared_cache:
+            payload = [item.to_dict() for item in data] if key[1] in _PARSER_RECORDS else data
+            db.set_cached_response(json.dumps(key), json.dumps(payload), fetched_at)
+    
+    def _fetch(self, endpoint: str, params: Dict, priority: str, parser: Callable = None):
+        """Llama a la API y guarda la respuesta válida en caché.
+        Con parser, el cuerpo se lee en streaming y se guarda lo que devuelva el parser"""
+        try:
+            # El monitoreo en vivo usa hedging para acotar la latencia de cola
+            response = http.get(
+                f"{self.base_url}{endpoint}", endpoint,
+                headers=self.headers, params=params,
+                hedge=priority == PRIORIDAD_LIVE,
+                stream=parser is not None,
+                on_attempt=self.quota.record_request
+            )
+            if response is None:
+                return None
+            self.quota.update_from_headers(response.headers)
+
+            if response.status_code == 200:
+                try:
+                    data = parser(response) if parser else response.json()
+                finally:
+                    response.close()
+                self._store(self._cache_key(endpoint, params, parser), data, datetime.now())
+                return data
+
+            response.close()
+            logging.error(f"API {endpoint} respondió {response.status_code}")
+            return None
+        except Exception as e:
+            logging.error(f"Error calling API {endpoint}: {e}")
+            return None
+
+    def get(self, endpoint: str, params: Dict = None, priority: str = PRIORIDAD_USUARIO,
+            parser: Callable = None) -> Optional[Dict]:
+        """Hace un GET a la API respetando la cuota; degrada a la caché si no hay presupuesto"""
+        if not self.quota.allow(priority):
+            cached = self._cached(self._cache_key(endpoint, params, parser))
+            API_CACHE.inc(endpoint=endpoint, result='shed_hit' if cached else 'shed_miss')
+            logging.warning(
+                f"Cuota de API baja, llamada {priority} a {endpoint} "
+                f"{'servida desde caché' if cached else 'descartada'}"
+            )
+            return cached[0] if cached else None
+
+        return self._fetch(endpoint, params, priority, parser)
+
+    def get_with_age(self, endpoint: str, params: Dict = None, priority: str = PRIORIDAD_USUARIO,
+                     parser: Callable = None) -> Tuple[Optional[Dict], Optional[datetime]]:
+        """Stale-while-revalidate: devuelve la última respuesta válida y su fecha,
+        refrescándola en segundo plano si venció el TTL"""
+        key = self._cache_key(endpoint, params, parser)
+        cached = self._cached(key)
+
+        if cached:
+            payload, fetched_at = cached
+            if datetime.now() - fetched_at > self._ttl(endpoint):
+                API_CACHE.inc(endpoint=endpoint, result='stale')
+                self._refresh_in_background(key, endpoint, params, priority, parser)
+            else:
+                API_CACHE.inc(endpoint=endpoint, result='hit')
+            return payload, fetched_at
+
+        API_CACHE.inc(endpoint=endpoint, result='miss')
+        data = self.get(endpoint, params, priority, parser)
+        if data is None:
+            return None, None
+        return data, self._cache[key][1]
+
+    def _refresh_in_background(self, key: Tuple, endpoint: str, params: Dict, priority: str,
+                               parser: Callable = None):
+        """Lanza un único refresco por clave en el pool de hilos"""
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                if self.quota.allow(priority):
+                    self._fetch(endpoint, params, priority, parser)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def get_fixtures(self, params: Dict, priority: str = PRIORIDAD_USUARIO) -> Optional[List[Fixture]]:
+        """Partidos de /fixtures parseados en streaming a registros compactos"""
+        return self.get('/fixtures', params, priority, parse_fixtures_response)
+
+    def get_fixtures_with_age(self, params: Dict, priority: str = PRIORIDAD_USUARIO
+                              ) -> Tuple[Optional[List[Fixture]], Optional[datetime]]:
+        """Versión stale-while-revalidate de get_fixtures"""
+        return self.get_with_age('/fixtures', params, priority, parse_fixtures_response)
+
+# Instancia global del cliente de API-Football
+api = Lazy('api', ApiFootballClient)
@@ -0,0 +1,110 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qsl
+
+class FakeTelegram:
+    """Bot API local: responde a los métodos que usa el bot con objetos válidos para
+    python-telegram-bot y cuenta las llamadas. Con flood_rate, una fracción de los envíos
+    devuelve 429 con retry_after como hace Telegram al superar el límite. Las respuestas que
+    el cliente ya no espera (cortó la conexión por timeout) se cuentan en client_timeouts"""
+    
+    def __init__(self, latency: float = 0.03, jitter: float = 0.01, flood_rate: float = 0.0,
+                 retry_after: int = 1, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.client_timeouts = 0
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self._server = None
+    
+    def _message(self, params: Dict) -> Dict:
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        chat_id = int(params.get('chat_id') or 0)
+        return {
+            'message_id': int(params.get('message_id') or message_id),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot'},
+            'text': params.get('text', '')
+        }
+    
+    def result_for(self, method: str, params: Dict):
+        if method == 'getMe':
+            return {
+                'id': 1, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot',
+                'can_join_groups': False, 'can_read_all_group_messages': False, 'supports_inline_queries': False
+            }
+        if method in ('sendMessage', 'editMessageText'):
+            return self._message(params)
+        return True
+    
+    def _reply(self, method: str, params: Dict) -> Dict:
+        with self._lock:
+            self.calls[method] += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            flood = method == 'sendMessage' and self.flood_rate and self.random.random() < self.flood_rate
+        time.sleep(delay)
+        if flood:
+            with self._lock:
+                self.calls['429'] += 1
+            return {
+                'ok': False, 'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after}
+            }
+        return {'ok': True, 'result': self.result_for(method, params)}
+    
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Inicia el servidor en un hilo y devuelve la base_url para ApplicationBuilder/Bot"""
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length).decode('utf-8') if length else ''
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    params = json.loads(raw or '{}')
+                else:
+                    params = dict(parse_qsl(raw))
+                method = self.path.rstrip('/').rsplit('/', 1)[-1]
+                reply = fake._reply(method, params)
+                
+                body = json.dumps(reply).encode('utf-8')
+                try:
+                    self.send_response(200 if reply['ok'] else reply['error_code'])
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    with fake._lock:
+                        fake.client_timeouts += 1
+                    self.close_connection = True
+            
+            do_GET = do_POST
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-telegram', daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}/bot"
+    
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,173 @@
+import copy
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+PAYLOADS_DIR = os.path.join(os.path.dirname(__file__), 'payloads')
+
+def _load(name: str) -> Dict:
+    with open(os.path.join(PAYLOADS_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+class MockApiFootball:
+    """API-Football local: arma las respuestas a partir de los payloads grabados en payloads/
+    y agrega la latencia configurada. Los partidos en vivo avanzan en cada consulta a live=all
+    para que el monitoreo encuentre goles y finales nuevos"""
+    
+    def __init__(self, leagues: List[int], latency: float = 0.05, jitter: float = 0.02,
+                 error_rate: float = 0.0, fixtures_per_league: int = 10, live_per_league: int = 3,
+                 seed: int = 1):
+        self.leagues = leagues
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures_per_league = fixtures_per_league
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.client_timeouts = 0  # Respuestas que el cliente ya no esperaba (timeout o hedging)
+        self._lock = threading.Lock()
+        self._bodies: Dict[tuple, bytes] = {}
+        
+        self._fixture = _load('fixture.json')
+        self._standing = _load('standing.json')
+        self._topscorer = _load('topscorer.json')
+        self._live = [
+            self.build_fixture(league, index, status='1H', goals=(0, 0))
+            for league in leagues for index in range(live_per_league)
+        ]
+        self._live_snapshot = None
+        self._server = None
+    
+    def set_live_snapshot(self, fixtures: List[Dict]):
+        """Fija los partidos que devuelve live=all (reemplaza la simulación interna)"""
+        with self._lock:
+            self._live_snapshot = fixtures
+    
+    def build_fixture(self, league: int, index: int, status: str = 'NS', goals=(None, None)) -> Dict:
+        fixture = copy.deepcopy(self._fixture)
+        fixture['fixture']['id'] = league * 10000 + index
+        fixture['fixture']['date'] = datetime.now().strftime('%Y-%m-%dT') + f"{12 + index % 10:02d}:00:00+00:00"
+        fixture['fixture']['status']['short'] = status
+        fixture['league']['id'] = league
+        fixture['teams']['home'].update(id=league * 100 + 2 * index, name=f"Local {league}-{index}")
+        fixture['teams']['away'].update(id=league * 100 + 2 * index + 1, name=f"Visitante {league}-{index}")
+        fixture['goals'] = {'home': goals[0], 'away': goals[1]}
+        return fixture
+    
+    def _advance_live(self) -> List[Dict]:
+        """Un gol en un partido al azar y, cada tanto, un final que se reemplaza por uno nuevo"""
+        with self._lock:
+            fixture = self.random.choice(self._live)
+            if fixture['fixture']['status']['short'] == 'FT':
+                index = self._live.index(fixture)
+                league = fixture['league']['id']
+                self._live[index] = fixture = self.build_fixture(
+                    league, self.requests + 1000, status='1H', goals=(0, 0)
+                )
+            side = self.random.choice(('home', 'away'))
+            fixture['goals'][side] += 1
+            if self.random.random() < 0.2:
+                fixture['fixture']['status']['short'] = 'FT'
+            else:
+                fixture['fixture']['status']['short'] = 'LIVE'
+            return copy.deepcopy(self._live)
+    
+    def _response(self, path: str, params: Dict) -> List:
+        league = int(params.get('league', self.leagues[0]))
+        if path == '/fixtures':
+            if params.get('live'):
+                if self._live_snapshot is not None:
+                    return self._live_snapshot
+                return self._advance_live()
+            return [self.build_fixture(league, index) for index in range(self.fixtures_per_league)]
+        if path == '/standings':
+            rows = []
+            for rank in range(1, 21):
+                row = copy.deepcopy(self._standing)
+                row['rank'] = rank
+                row['points'] = 70 - 3 * rank
+                row['team'].update(id=league * 100 + rank, name=f"Equipo {league}-{rank}")
+                rows.append(row)
+            return [{'league': {'id': league, 'season': params.get('season'), 'standings': [rows]}}]
+        if path == '/players/topscorers':
+            players = []
+            for rank in range(20):
+                player = copy.deepcopy(self._topscorer)
+                player['player'].update(id=league * 1000 + rank, name=f"Jugador {league}-{rank}")
+                player['statistics'][0]['goals']['total'] = 25 - rank
+                players.append(player)
+            return players
+        return []
+    
+    def body_for(self, path: str, params: Dict) -> bytes:
+        """Cuerpo serializado; las respuestas fijas se arman una sola vez"""
+        live = path == '/fixtures' and params.get('live')
+        key = (path, tuple(sorted(params.items())))
+        if not live and key in self._bodies:
+            return self._bodies[key]
+        response = self._response(path, params)
+        body = json.dumps({
+            'get': path.lstrip('/'),
+            'parameters': params,
+            'errors': [],
+            'results': len(response),
+            'paging': {'current': 1, 'total': 1},
+            'response': response
+        }).encode('utf-8')
+        if not live:
+            self._bodies[key] = body
+        return body
+    
+    def _delay(self) -> float:
+        with self._lock:
+            self.requests += 1
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+    
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Inicia el servidor en un hilo y devuelve su URL base"""
+        mock = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                url = urlsplit(self.path)
+                time.sleep(mock._delay())
+                if mock.error_rate and mock.random.random() < mock.error_rate:
+                    body, status = b'{"errors": ["mock error"]}', 500
+                else:
+                    body, status = mock.body_for(url.path, dict(parse_qsl(url.query))), 200
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    # Presupuesto holgado para que la cuota no recorte el benchmark
+                    self.send_header('x-ratelimit-requests-limit', '1000000')
+                    self.send_header('x-ratelimit-requests-remaining', '1000000')
+                    self.send_header('X-RateLimit-Limit', '100000')
+                    self.send_header('X-RateLimit-Remaining', '100000')
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    with mock._lock:
+                        mock.client_timeouts += 1
+                    self.close_connection = True
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='mock-api-football', daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+    
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,338 @@
+"""Reproduce una jornada (partidos en vivo + clics de usuarios) contra el bot con los servicios
+simulados y registra series de tiempo de colas, latencias y llamadas a las APIs.
+
+La línea de tiempo es un JSON con los tiempos en segundos desde el inicio de la jornada:
+    {
+        "duracion": 7200,
+        "partidos": [{"id": 1, "liga": 39, "local": "A", "visitante": "B", "inicio": 0, "fin": 6300}],
+        "goles": [{"t": 1260, "partido": 1, "lado": "home"}],
+        "snapshots": [{"t": 0, "fixtures": [...]}],
+        "updates": [{"t": 1275, "chat_id": 100001, "data": "liga_tabla_39"}]
+    }
+"snapshots" es opcional: son respuestas de /fixtures?live=all grabadas de la API real. Si falta,
+cada snapshot se arma con "partidos" y "goles". Sin --timeline se sintetiza una jornada con --seed.
+
+--velocidad comprime solo la línea de tiempo externa (partidos, clics e intervalo del monitoreo).
+Los costos propios del bot y las latencias simuladas corren en tiempo real, por eso una velocidad
+alta muestra colas más largas que la jornada real.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.replay --velocidad 60 --csv jornada.csv
+    python -m benchmarks.replay --timeline derbi.json --velocidad 10 --usuarios 2000
+"""
+import argparse
+import asyncio
+import bisect
+import copy
+import csv
+import json
+import logging
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.run import LEAGUES, callback_update, percentile, seed_users, start_stand_ins
+
+# Segundos que un partido terminado sigue en live=all (el monitoreo detecta el final ahí)
+FT_VISIBLE_SEGUNDOS = 300
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Reproduce el tráfico de una jornada contra el bot')
+    parser.add_argument('--timeline', help='Línea de tiempo JSON; sin ella se sintetiza una jornada')
+    parser.add_argument('--guardar-timeline', help='Guarda la línea de tiempo usada (útil al sintetizar)')
+    parser.add_argument('--velocidad', type=float, default=60.0, help='Segundos de jornada por segundo real')
+    parser.add_argument('--usuarios', type=int, default=500)
+    parser.add_argument('--premium', type=float, default=0.3)
+    parser.add_argument('--partidos-por-liga', type=int, default=2)
+    parser.add_argument('--clics-por-minuto', type=float, default=30.0, help='Tráfico base de la jornada')
+    parser.add_argument('--clics-por-gol', type=int, default=80, help='Ráfaga de clics tras cada gol')
+    parser.add_argument('--muestreo', type=float, default=1.0, help='Segundos reales entre muestras')
+    parser.add_argument('--espera-final', type=float, default=60.0,
+                        help='Segundos reales máximos para vaciar las colas al terminar')
+    parser.add_argument('--latencia-api', type=float, default=0.05)
+    parser.add_argument('--latencia-telegram', type=float, default=0.03)
+    parser.add_argument('--errores-api', type=float, default=0.0)
+    parser.add_argument('--flood-telegram', type=float, default=0.0)
+    parser.add_argument('--procesos-broadcast', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--csv', help='Serie de tiempo de salida')
+    parser.add_argument('--json', help='Resumen de salida')
+    return parser.parse_args(argv)
+
+def synthesize_timeline(args, chat_ids: List[int]) -> Dict:
+    """Jornada de dos horas: los partidos del primer par de cada liga son los grandes y
+    cada gol dispara una ráfaga de clics de tabla y partidos de esa liga"""
+    rng = random.Random(args.seed)
+    duration = 7200
+    partidos, goles, updates = [], [], []
+    
+    for league in LEAGUES:
+        for index in range(args.partidos_por_liga):
+            inicio = rng.choice((0, 0, 900, 1800))
+            partido = {
+                'id': league * 10000 + index, 'liga': league,
+                'local': f"Local {league}-{index}", 'visitante': f"Visitante {league}-{index}",
+                'inicio': inicio, 'fin': min(duration - 60, inicio + 6300),
+                'interes': 3.0 if index == 0 else 1.0
+            }
+            partidos.append(partido)
+            # Goles: en promedio 2.7 por partido, repartidos en los 105 minutos (con entretiempo)
+            for _ in range(sum(1 for _ in range(27) if rng.random() < 0.1)):
+                minuto = rng.uniform(0, 90)
+                t = partido['inicio'] + minuto * 60 + (900 if minuto > 45 else 0)
+                goles.append({'t': round(t, 1), 'partido': partido['id'], 'lado': rng.choice(('home', 'away'))})
+    
+    # Tráfico base uniforme
+    for _ in range(int(args.clics_por_minuto * duration / 60)):
+        t = rng.uniform(0, duration)
+        league = rng.choice(LEAGUES)
+        data = rng.choice(('partidos', 'tabla', 'back', f"liga_partidos_{league}", f"liga_tabla_{league}",
+                           f"liga_goleadores_{league}"))
+        updates.append({'t': round(t, 1), 'chat_id': rng.choice(chat_ids), 'data': data})
+    
+    # Ráfagas correlacionadas: tras cada gol y cada final, la gente mira tabla y partidos de esa liga
+    por_id = {partido['id']: partido for partido in partidos}
+    disparos = [(gol['t'], por_id[gol['partido']]) for gol in goles]
+    disparos += [(partido['fin'], partido) for partido in partidos]
+    for t_evento, partido in disparos:
+        league = partido['liga']
+        for _ in range(int(args.clics_por_gol * partido['interes'])):
+            t = t_evento + rng.expovariate(1 / 30.0)
+            data = rng.choice(('tabla', f"liga_tabla_{league}", f"liga_tabla_{league}",
+                               f"liga_partidos_{league}", 'back'))
+            updates.append({'t': round(t, 1), 'chat_id': rng.choice(chat_ids), 'data': data})
+    
+    goles.sort(key=lambda gol: gol['t'])
+    updates.sort(key=lambda update: update['t'])
+    for partido in partidos:
+        del partido['interes']
+    return {'duracion': duration, 'partidos': partidos, 'goles': goles, 'updates': updates}
+
+class LiveFeed:
+    """Snapshot de live=all para un instante de la jornada"""
+    
+    def __init__(self, timeline: Dict, api_mock):
+        self.snapshots = timeline.get('snapshots')
+        self.partidos = timeline.get('partidos', [])
+        self.goles = timeline.get('goles', [])
+        self.api_mock = api_mock
+        if self.snapshots:
+            self.snapshots.sort(key=lambda snapshot: snapshot['t'])
+            self._times = [snapshot['t'] for snapshot in self.snapshots]
+        self._fixtures = {}
+        for index, partido in enumerate(self.partidos):
+            fixture = api_mock.build_fixture(partido['liga'], index, status='LIVE', goals=(0, 0))
+            fixture['fixture']['id'] = partido['id']
+            fixture['teams']['home']['name'] = partido['local']
+            fixture['teams']['away']['name'] = partido['visitante']
+            self._fixtures[partido['id']] = fixture
+    
+    def at(self, t: float) -> List[Dict]:
+        if self.snapshots:
+            index = bisect.bisect_right(self._times, t) - 1
+            return self.snapshots[index]['fixtures'] if index >= 0 else []
+        
+        marcador = {}
+        for gol in self.goles:
+            if gol['t'] > t:
+                break
+            goles = marcador.setdefault(gol['partido'], {'home': 0, 'away': 0})
+            goles[gol['lado']] += 1
+        
+        fixtures = []
+        for partido in self.partidos:
+            if t < partido['inicio'] or t >= partido['fin'] + FT_VISIBLE_SEGUNDOS:
+                continue
+            fixture = copy.deepcopy(self._fixtures[partido['id']])
+            fixture['goals'] = marcador.get(partido['id'], {'home': 0, 'away': 0})
+            fixture['fixture']['status']['short'] = 'FT' if t >= partido['fin'] else 'LIVE'
+            fixtures.append(fixture)
+        return fixtures
+
+class Replay:
+    def __init__(self, args, timeline: Dict, api_mock, telegram):
+        self.args = args
+        self.timeline = timeline
+        self.api_mock = api_mock
+        self.telegram = telegram
+        self.feed = LiveFeed(timeline, api_mock)
+        self.samples: List[Dict] = []
+        self.latencies: List[float] = []
+        self.in_flight = 0
+        self.errors = 0
+        self._window: List[float] = []
+        self._tasks = set()
+        self.unfinished = 0
+    
+    def sim_time(self) -> float:
+        return (time.perf_counter() - self.started) * self.args.velocidad
+    
+    async def _handle(self, app, bot, data: Dict, arrival: float):
+        from telegram import Update
+        
+        try:
+            await bot.handle_callback(Update.de_json(data, app.bot), None)
+        except Exception as e:
+            self.errors += 1
+            logging.debug(f"Callback {data['callback_query']['data']} falló: {e}")
+        finally:
+            self.in_flight -= 1
+        # Desde la llegada del update: incluye la espera hasta que el event loop lo toma
+        elapsed = time.perf_counter() - arrival
+        self.latencies.append(elapsed)
+        self._window.append(elapsed)
+    
+    async def _feed_live(self):
+        """Actualiza el snapshot de live=all a medida que avanza la jornada"""
+        while True:
+            self.api_mock.set_live_snapshot(self.feed.at(self.sim_time()))
+            await asyncio.sleep(0.05)
+    
+    async def _dispatch_updates(self, app, bot):
+        for index, update in enumerate(self.timeline['updates']):
+            delay = update['t'] / self.args.velocidad - (time.perf_counter() - self.started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # En vuelo desde que llega, aunque el event loop todavía no lo haya tomado
+            self.in_flight += 1
+            data = callback_update(index, update['chat_id'], update['data'])
+            task = asyncio.create_task(self._handle(app, bot, data, time.perf_counter()))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _sample(self, monitor):
+        from metrics import MESSAGES_SENT
+        
+        last_api, last_telegram = 0, 0
+        while True:
+            await asyncio.sleep(self.args.muestreo)
+            window, self._window = self._window, []
+            api_total = self.api_mock.requests
+            telegram_total = sum(count for method, count in self.telegram.calls.items() if method != '429')
+            self.samples.append({
+                't_jornada': round(self.sim_time(), 1),
+                't_real': round(time.perf_counter() - self.started, 2),
+                'cola_alertas': monitor.pending_alerts(),
+                'callbacks_en_vuelo': self.in_flight,
+                'callbacks_completados': len(window),
+                'p50_ms': round(percentile(window, 0.50) * 1000, 1),
+                'p99_ms': round(percentile(window, 0.99) * 1000, 1),
+                'api_requests': api_total - last_api,
+                'telegram_requests': telegram_total - last_telegram,
+                'alertas_enviadas': int(MESSAGES_SENT.values().get(('alert', 'sent'), 0)),
+                'telegram_429': self.telegram.calls.get('429', 0),
+                'timeouts_cliente': self.api_mock.client_timeouts + self.telegram.client_timeouts
+            })
+            last_api, last_telegram = api_total, telegram_total
+    
+    async def run(self, app, bot):
+        from config import MONITOREO_CONFIG
+        from monitor import LiveMonitor
+        from runtime_config import runtime
+        
+        # El monitoreo consulta live=all con el intervalo de la jornada comprimido (es el valor
+        # por defecto de la configuración en caliente: se recarga para que lo tome)
+        MONITOREO_CONFIG['intervalo_segundos'] = MONITOREO_CONFIG['intervalo_segundos'] / self.args.velocidad
+        runtime.refresh(force=True)
+        monitor = LiveMonitor(app)
+        
+        self.started = time.perf_counter()
+        background = [
+            asyncio.create_task(self._feed_live()),
+            asyncio.create_task(monitor.run()),
+            asyncio.create_task(self._sample(monitor))
+        ]
+        try:
+            await self._dispatch_updates(app, bot)
+            remaining = self.timeline['duracion'] / self.args.velocidad - (time.perf_counter() - self.started)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            
+            # Vaciar colas: callbacks pendientes y alertas encoladas
+            deadline = time.perf_counter() + self.args.espera_final
+            while (self._tasks or monitor.pending_alerts()) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.1)
+        finally:
+            # Lo que no terminó a tiempo se cancela antes de cerrar la Application
+            self.unfinished = len(self._tasks)
+            for task in background + list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*background, *self._tasks, return_exceptions=True)
+    
+    def summary(self) -> Dict:
+        def peak(column: str):
+            return max((sample[column] for sample in self.samples), default=0)
+        
+        wall = time.perf_counter() - self.started
+        return {
+            'duracion_jornada_s': self.timeline['duracion'],
+            'duracion_real_s': round(wall, 1),
+            'velocidad': self.args.velocidad,
+            'callbacks': len(self.latencies),
+            'errores': self.errors,
+            'sin_terminar': self.unfinished,
+            'p50_ms': round(percentile(self.latencies, 0.50) * 1000, 1),
+            'p99_ms': round(percentile(self.latencies, 0.99) * 1000, 1),
+            'pico_cola_alertas': peak('cola_alertas'),
+            'pico_callbacks_en_vuelo': peak('callbacks_en_vuelo'),
+            'pico_api_por_muestra': peak('api_requests'),
+            'pico_telegram_por_muestra': peak('telegram_requests'),
+            'api_requests': self.api_mock.requests,
+            'alertas_enviadas': self.samples[-1]['alertas_enviadas'] if self.samples else 0
+        }
+
+def load_timeline(path: str) -> Dict:
+    with open(path, encoding='utf-8') as f:
+        timeline = json.load(f)
+    timeline['updates'].sort(key=lambda update: update['t'])
+    timeline.setdefault('duracion', max((update['t'] for update in timeline['updates']), default=0))
+    return timeline
+
+async def replay(args, api_mock, telegram, timeline: Optional[Dict]) -> Replay:
+    from bot import bot, build_application
+    from database import db
+    
+    rng = random.Random(args.seed)
+    chat_ids = seed_users(db, args.usuarios, args.premium, rng)
+    if timeline is None:
+        timeline = synthesize_timeline(args, chat_ids)
+    else:
+        # Los chat_id grabados se registran para que tengan plan y contexto
+        for chat_id in {update['chat_id'] for update in timeline['updates']} - set(chat_ids):
+            db.add_user(chat_id)
+    if args.guardar_timeline:
+        with open(args.guardar_timeline, 'w', encoding='utf-8') as f:
+            json.dump(timeline, f)
+    
+    session = Replay(args, timeline, api_mock, telegram)
+    app = build_application(updater=False)
+    async with app:
+        await session.run(app, bot)
+    return session
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    
+    timeline = load_timeline(args.timeline) if args.timeline else None
+    api_mock, telegram = start_stand_ins(args)
+    session = asyncio.run(replay(args, api_mock, telegram, timeline))
+    
+    summary = session.summary()
+    print('\n'.join(f"{key:>28}: {value}" for key, value in summary.items()))
+    if args.csv and session.samples:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(session.samples[0]))
+            writer.writeheader()
+            writer.writerows(session.samples)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'resumen': summary, 'serie': session.samples}, f, indent=2)
+    
+    api_mock.stop()
+    telegram.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
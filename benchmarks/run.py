@@ -0,0 +1,247 @@
+"""Benchmark reproducible sin red: levanta API-Football y la Bot API de Telegram en local,
+crea usuarios sintéticos en una base temporal y mide los caminos calientes del bot.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.run --usuarios 200 --callbacks 2000 --concurrencia 50
+    python -m benchmarks.run --escenarios monitor --latencia-api 0.2 --json resultado.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.mock_api import MockApiFootball
+
+ESCENARIOS = ('callbacks', 'monitor', 'broadcast')
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def summarize(name: str, latencies: List[float], wall: float, errors: int = 0, **extra) -> Dict:
+    return dict(
+        escenario=name,
+        operaciones=len(latencies),
+        errores=errors,
+        segundos=round(wall, 3),
+        ops_por_segundo=round(len(latencies) / wall, 1) if wall else 0.0,
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 1),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 1),
+        **extra
+    )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark del bot contra servicios simulados')
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS),
+                        help=f"Lista separada por comas de: {', '.join(ESCENARIOS)}")
+    parser.add_argument('--usuarios', type=int, default=200, help='Usuarios sintéticos en la base')
+    parser.add_argument('--premium', type=float, default=0.3, help='Fracción de usuarios premium')
+    parser.add_argument('--callbacks', type=int, default=1000, help='Callbacks a procesar')
+    parser.add_argument('--concurrencia', type=int, default=20, help='Callbacks en vuelo a la vez')
+    parser.add_argument('--ciclos-monitor', type=int, default=20, help='Vueltas de detección de eventos')
+    parser.add_argument('--alertas', type=int, default=1, help='Alertas a enviar a todos los usuarios')
+    parser.add_argument('--broadcasts', type=int, default=1, help='Envíos masivos a todos los usuarios')
+    parser.add_argument('--procesos-broadcast', type=int, default=1,
+                        help='Procesos del envío masivo (BROADCAST_PROCESOS)')
+    parser.add_argument('--latencia-api', type=float, default=0.05, help='Latencia de API-Football (s)')
+    parser.add_argument('--latencia-telegram', type=float, default=0.03, help='Latencia de Telegram (s)')
+    parser.add_argument('--errores-api', type=float, default=0.0, help='Fracción de respuestas 500')
+    parser.add_argument('--flood-telegram', type=float, default=0.0, help='Fracción de envíos con 429')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Guarda los resultados en este archivo')
+    return parser.parse_args(argv)
+
+def callback_update(update_id: int, chat_id: int, data: str) -> Dict:
+    """Update de Telegram con un callback_query sobre un mensaje del bot"""
+    user = {'id': chat_id, 'is_bot': False, 'first_name': f"Usuario {chat_id}"}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': user,
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': 1, 'is_bot': True, 'first_name': 'Benchmark'},
+                'text': 'menu'
+            }
+        }
+    }
+
+def callback_mix(leagues: List[int]) -> List[str]:
+    """callback_data con el peso aproximado del uso real: muchos menús y consultas de liga"""
+    mix = ['partidos', 'tabla', 'goleadores', 'back', 'back', 'ayuda', 'premium_info']
+    for league in leagues:
+        mix += [f"liga_partidos_{league}", f"liga_tabla_{league}", f"liga_goleadores_{league}",
+                f"liga_estadisticas_avanzadas_{league}"]
+    return mix
+
+def seed_users(db, count: int, premium_fraction: float, rng: random.Random) -> List[int]:
+    chat_ids = [100000 + index for index in range(count)]
+    expires = datetime.now() + timedelta(days=30)
+    for chat_id in chat_ids:
+        db.add_user(chat_id, f"user{chat_id}", 'Usuario', str(chat_id))
+        if rng.random() < premium_fraction:
+            db.update_user_plan(chat_id, 'premium', expires)
+    return chat_ids
+
+async def bench_callbacks(app, bot, chat_ids: List[int], leagues: List[int], args, rng) -> Dict:
+    from telegram import Update
+    
+    mix = callback_mix(leagues)
+    slots = asyncio.Semaphore(args.concurrencia)
+    latencies, errors = [], 0
+    
+    async def one(update_id: int):
+        nonlocal errors
+        data = callback_update(update_id, rng.choice(chat_ids), rng.choice(mix))
+        async with slots:
+            update = Update.de_json(data, app.bot)
+            start = time.perf_counter()
+            try:
+                await bot.handle_callback(update, None)
+            except Exception as e:
+                errors += 1
+                logging.debug(f"Callback {data['callback_query']['data']} falló: {e}")
+            latencies.append(time.perf_counter() - start)
+    
+    wall = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.callbacks)))
+    return summarize('callbacks (handle_callback)', latencies, time.perf_counter() - wall, errors)
+
+async def bench_monitor(app, args) -> List[Dict]:
+    from monitor import LiveMonitor
+    
+    monitor = LiveMonitor(app)
+    latencies = []
+    wall = time.perf_counter()
+    for _ in range(args.ciclos_monitor):
+        start = time.perf_counter()
+        await monitor.detect_events()
+        latencies.append(time.perf_counter() - start)
+    results = [summarize('monitor (detect_events)', latencies, time.perf_counter() - wall,
+                         alertas_encoladas=monitor.queue.qsize())]
+    
+    fanout = []
+    wall = time.perf_counter()
+    for _ in range(min(args.alertas, monitor.queue.qsize())):
+        mensaje = monitor.queue.get_nowait()
+        start = time.perf_counter()
+        await monitor.send_alert_to_users(mensaje)
+        fanout.append(time.perf_counter() - start)
+    if fanout:
+        elapsed = time.perf_counter() - wall
+        results.append(summarize('monitor (send_alert_to_users)', fanout, elapsed,
+                                 mensajes_por_segundo=round(len(fanout) * args.usuarios / elapsed, 1)))
+    return results
+
+async def bench_broadcast(app, args) -> Dict:
+    from admin_panel import admin_panel
+    
+    context = SimpleNamespace(bot=app.bot)
+    durations, sent, failed = [], 0, 0
+    wall = time.perf_counter()
+    for index in range(args.broadcasts):
+        start = time.perf_counter()
+        counts = await admin_panel.send_broadcast(f"Mensaje de prueba {index}", 'all', context)
+        durations.append(time.perf_counter() - start)
+        sent += counts['sent']
+        failed += counts['failed']
+    elapsed = time.perf_counter() - wall
+    return summarize('broadcast (send_broadcast)', durations, elapsed, failed,
+                     enviados=sent, mensajes_por_segundo=round(sent / elapsed, 1) if elapsed else 0.0)
+
+async def run(args, leagues: List[int]) -> List[Dict]:
+    from bot import bot, build_application
+    from database import db
+    
+    rng = random.Random(args.seed)
+    chat_ids = seed_users(db, args.usuarios, args.premium, rng)
+    escenarios = [name.strip() for name in args.escenarios.split(',') if name.strip()]
+    
+    results = []
+    app = build_application(updater=False)
+    async with app:
+        if 'callbacks' in escenarios:
+            results.append(await bench_callbacks(app, bot, chat_ids, leagues, args, rng))
+        if 'monitor' in escenarios:
+            results.extend(await bench_monitor(app, args))
+        if 'broadcast' in escenarios:
+            results.append(await bench_broadcast(app, args))
+    return results
+
+def print_table(results: List[Dict]):
+    columns = ('operaciones', 'errores', 'segundos', 'ops_por_segundo', 'p50_ms', 'p99_ms')
+    print(f"\n{'escenario':<34}" + ''.join(f"{column:>16}" for column in columns))
+    for result in results:
+        print(f"{result['escenario']:<34}" + ''.join(f"{result[column]:>16}" for column in columns))
+        extra = {key: value for key, value in result.items() if key not in columns and key != 'escenario'}
+        if extra:
+            print('    ' + ', '.join(f"{key}={value}" for key, value in extra.items()))
+
+LEAGUES = [39, 140, 135, 78, 61]
+
+def start_stand_ins(args, leagues: List[int] = LEAGUES) -> Tuple[MockApiFootball, FakeTelegram]:
+    """Levanta los servicios simulados y apunta el bot a ellos con una base temporal.
+    Tiene que llamarse antes de importar los módulos del bot: config lee las URLs del entorno"""
+    api_mock = MockApiFootball(leagues, latency=args.latencia_api, error_rate=args.errores_api, seed=args.seed)
+    telegram = FakeTelegram(latency=args.latencia_telegram, flood_rate=args.flood_telegram, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix='bench-bot-')
+    os.environ.update(
+        API_FOOTBALL_URL=api_mock.start(),
+        TELEGRAM_API_URL=telegram.start(),
+        TELEGRAM_TOKEN='123456:benchmark',
+        API_FOOTBALL_TOKEN='benchmark',
+        DATABASE_FILE=os.path.join(workdir, 'bench.db'),
+        DATABASE_BACKEND='sqlite',
+        BROADCAST_PROCESOS=str(args.procesos_broadcast),
+        METRICS_ENABLED='0',
+        LOG_FILE=''
+    )
+    
+    import config
+    # Cuota holgada desde el inicio: los headers del mock la confirman en la primera respuesta
+    config.API_QUOTA_CONFIG.update(limite_diario=1_000_000, limite_por_minuto=100_000)
+    config.BROADCAST_CONFIG['procesos'] = args.procesos_broadcast
+    return api_mock, telegram
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    
+    leagues = LEAGUES
+    api_mock, telegram = start_stand_ins(args, leagues)
+    
+    results = asyncio.run(run(args, leagues))
+    
+    print_table(results)
+    print(f"\nAPI-Football: {api_mock.requests} requests; Telegram: {dict(telegram.calls)}")
+    if api_mock.client_timeouts or telegram.client_timeouts:
+        print(f"Respuestas abandonadas por el cliente: API-Football {api_mock.client_timeouts}, "
+              f"Telegram {telegram.client_timeouts}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'resultados': results}, f, indent=2)
+    
+    api_mock.stop()
+    telegram.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
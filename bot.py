@@ -1,54 +1,81 @@
+# Primero: mide el tiempo de importación de todo lo demás (telegram incluido)
+from startup import Lazy, mark_imports, phase, report as report_startup, warm_up
+import argparse
 import logging
-import os
 import asyncio
-import requests
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, ContextTypes, CallbackQueryHandler, 
-    MessageHandler, filters, ConversationHandler
+    MessageHandler, TypeHandler, filters
 )
 from telegram.error import BadRequest
 from typing import List
 
 # Importar módulos personalizados
-from config import *
+from config import (
+    LIGAS_PERMITIDAS, MENSAJES, PRECIOS, TELEGRAM_API_URL, TELEGRAM_TOKEN, WEBHOOK_CONFIG
+)
 from database import db
 from premium_features import premium
 from admin_panel import admin_panel
+from api_client import api, PRIORIDAD_USUARIO, PRIORIDAD_BAJA
+from models import StandingRow, UserContext
+from jobs import schedule_jobs
+from logging_setup import correlation_id, setup_logging
+from metrics import start_metrics_server
+from loop_watchdog import watchdog
+from profiler import profiler
+from monitor import LiveMonitor
+from router import CallbackRouter, TIER_ADMIN, TIER_FREE, TIER_PREMIUM, parse_int
+from runtime_config import runtime
 
-# Configuración de logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Vistas por liga: nivel requerido de cada una
+VISTAS_LIGA = {
+    'partidos': TIER_FREE,
+    'tabla': TIER_FREE,
+    'goleadores': TIER_FREE,
+    'estadisticas_basicas': TIER_FREE,
+    'estadisticas_avanzadas': TIER_PREMIUM,
+    'resumen_semanal': TIER_PREMIUM,
+    'predicciones': TIER_PREMIUM
+}
 
-# Estados para conversaciones
-WAITING_BROADCAST_MESSAGE = 1
+# Botones del menú premium sin implementación todavía: responden "próximamente"
+FUNCIONES_PROXIMAMENTE = ('h2h', 'alertas_personalizadas')
 
 class BotFutbolPremium:
     def __init__(self):
-        self.api_token = API_FOOTBALL_TOKEN
-        self.headers = {'x-apisports-key': self.api_token}
-        self.base_url = 'https://v3.football.api-sports.io'
-        
-        # Sets para evitar notificaciones duplicadas
-        self.goles_notificados = set()
-        self.finales_notificados = set()
-        self.rojass_notificadas = set()
+        self.router = self.build_router()
+    
+    def build_router(self) -> CallbackRouter:
+        """Tabla de rutas de los botones del bot"""
+        router = CallbackRouter()
+        for tipo, tier in VISTAS_LIGA.items():
+            # Menú de ligas (sin costo) y consulta de una liga (una consulta del plan gratuito)
+            router.exact(tipo, self.show_ligas_menu, tier, with_user=True, tipo=tipo)
+            router.prefix(f"liga_{tipo}_", self.handle_liga_callback, tier, cost=1,
+                          parse=parse_int('liga_id'), with_user=True, tipo=tipo)
+        for tipo in FUNCIONES_PROXIMAMENTE:
+            router.exact(tipo, self.show_coming_soon, TIER_PREMIUM)
+        router.exact('premium_info', self.show_premium_info)
+        router.exact('ayuda', self.show_help)
+        router.exact('back', self.show_main_menu, with_user=True)
+        router.prefix('admin_', admin_panel.handle_admin_callback, TIER_ADMIN,
+                      parse=lambda rest: {'data': f"admin_{rest}"}, with_context=True)
+        return router
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /start - Menú principal"""
         chat_id = update.effective_chat.id
         user = update.effective_user
         
-        # Registrar usuario en la base de datos
-        db.add_user(chat_id, user.username, user.first_name, user.last_name)
-        db.update_user_activity(chat_id)
+        # Registrar usuario en la base de datos (fuera del event loop, como toda escritura)
+        await asyncio.to_thread(db.add_user, chat_id, user.username, user.first_name, user.last_name)
         
         # Determinar mensaje según el plan
-        is_premium = db.is_premium(chat_id)
-        mensaje = MENSAJES['bienvenida_premium'] if is_premium else MENSAJES['bienvenida_gratuito']
+        is_premium = (await asyncio.to_thread(db.load_user_context, chat_id)).is_premium
+        mensaje = self.welcome_message(is_premium)
         
         # Crear teclado según el plan
         keyboard = self.create_main_keyboard(is_premium)
@@ -59,6 +86,12 @@ class BotFutbolPremium:
             parse_mode='Markdown'
         )
     
+    def welcome_message(self, is_premium: bool) -> str:
+        """Bienvenida según el plan, con el límite gratuito vigente"""
+        if is_premium:
+            return MENSAJES['bienvenida_premium']
+        return MENSAJES['bienvenida_gratuito'].format(consultas_diarias=runtime.get('consultas_diarias'))
+    
     def create_main_keyboard(self, is_premium: bool) -> List[List[InlineKeyboardButton]]:
         """Crea el teclado principal según el plan del usuario"""
         keyboard = [
@@ -88,80 +121,36 @@ class BotFutbolPremium:
         return keyboard
     
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Maneja todos los callbacks de botones"""
+        """Maneja todos los callbacks de botones a través de la tabla de rutas"""
         query = update.callback_query
         await query.answer()
         
         chat_id = query.message.chat_id
-        data = query.data
+        route, params = self.router.resolve(query.data)
+        if route is None:
+            logging.warning(f"Callback sin ruta: {query.data}")
+            return
         
-        # Actualizar actividad del usuario
-        db.update_user_activity(chat_id)
+        # Un único acceso a la base: actividad, plan y consultas de hoy
+        user = await asyncio.to_thread(db.load_user_context, chat_id)
         
-        # Verificar límites para usuarios gratuitos
-        if not db.is_premium(chat_id) and not db.can_make_query(chat_id):
+        # Permisos y límites se evalúan una sola vez según lo que declara la ruta
+        if route.tier == TIER_ADMIN and not admin_panel.is_admin(chat_id):
+            await query.edit_message_text("❌ No tienes permisos de administrador.")
+            return
+        if route.tier == TIER_PREMIUM and not user.is_premium:
+            await self.show_premium_required(query)
+            return
+        if not user.can_query(route.cost):
             await query.edit_message_text(MENSAJES['limite_alcanzado'], parse_mode='Markdown')
             return
         
-        # Manejar diferentes tipos de callbacks
-        if data == 'partidos':
-            await self.show_ligas_menu(query, 'partidos')
-        elif data == 'tabla':
-            await self.show_ligas_menu(query, 'tabla')
-        elif data == 'goleadores':
-            await self.show_ligas_menu(query, 'goleadores')
-        elif data == 'estadisticas_avanzadas':
-            if db.is_premium(chat_id):
-                await self.show_ligas_menu(query, 'estadisticas_avanzadas')
-            else:
-                await self.show_premium_required(query)
-        elif data == 'estadisticas_basicas':
-            await self.show_ligas_menu(query, 'estadisticas_basicas')
-        elif data == 'resumen_semanal':
-            if db.is_premium(chat_id):
-                await self.show_ligas_menu(query, 'resumen_semanal')
-            else:
-                await self.show_premium_required(query)
-        elif data == 'h2h':
-            if db.is_premium(chat_id):
-                await self.show_h2h_menu(query)
-            else:
-                await self.show_premium_required(query)
-        elif data == 'predicciones':
-            if db.is_premium(chat_id):
-                await self.show_ligas_menu(query, 'predicciones')
-            else:
-                await self.show_premium_required(query)
-        elif data == 'alertas_personalizadas':
-            if db.is_premium(chat_id):
-                await self.show_alerts_menu(query)
-            else:
-                await self.show_premium_required(query)
-        elif data == 'premium_info':
-            await self.show_premium_info(query)
-        elif data == 'ayuda':
-            await self.show_help(query)
-        elif data.startswith('liga_'):
-            await self.handle_liga_callback(query, data)
-        elif data.startswith('partido_'):
-            await self.handle_partido_callback(query, data)
-        elif data.startswith('admin_'):
-            await admin_panel.admin_callback(update, context)
-        elif data == 'back':
-            await self.show_main_menu(query)
+        await self.router.call(route, query, params, user, context)
     
-    async def show_ligas_menu(self, query, tipo: str):
+    async def show_ligas_menu(self, query, tipo: str, user: UserContext):
         """Muestra menú de ligas disponibles según el plan"""
-        chat_id = query.message.chat_id
-        is_premium = db.is_premium(chat_id)
-        
-        if is_premium:
-            # Todas las ligas para premium
-            ligas_disponibles = LIGAS_PERMITIDAS
-        else:
-            # Solo ligas gratuitas
-            ligas_disponibles = {k: v for k, v in LIGAS_PERMITIDAS.items() 
-                               if k in LIMITES_GRATUITO['ligas_disponibles']}
+        # Todas las ligas habilitadas para premium; para el plan gratuito, solo las incluidas
+        ligas_disponibles = runtime.leagues(free_only=not user.is_premium)
         
         keyboard = [
             [InlineKeyboardButton(nombre, callback_data=f"liga_{tipo}_{lid}")]
@@ -180,21 +169,28 @@ class BotFutbolPremium:
             if "Message is not modified" not in str(e):
                 raise
     
-    async def handle_liga_callback(self, query, data: str):
+    async def handle_liga_callback(self, query, tipo: str, liga_id: int, user: UserContext):
         """Maneja callbacks de ligas específicas"""
-        _, tipo, liga_id = data.split('_')
-        liga_id = int(liga_id)
-        chat_id = query.message.chat_id
+        # El callback_data puede venir de un menú viejo o armado a mano: la liga tiene que
+        # estar habilitada para el plan antes de contar la consulta
+        if liga_id not in runtime.leagues(free_only=not user.is_premium):
+            keyboard = [[InlineKeyboardButton('🔙 Volver', callback_data='back')]]
+            await query.edit_message_text(MENSAJES['liga_no_disponible'], reply_markup=InlineKeyboardMarkup(keyboard))
+            return
         
         # Registrar consulta
-        db.log_query(chat_id, tipo, liga_id)
+        await asyncio.to_thread(db.log_query, user.chat_id, tipo, liga_id)
+        user.queries_today += 1
+        
+        # Las vistas gratuitas se degradan primero cuando queda poca cuota de API
+        prioridad = PRIORIDAD_USUARIO if user.is_premium else PRIORIDAD_BAJA
         
         if tipo == 'partidos':
-            await self.get_partidos_hoy(query, liga_id)
+            await self.get_partidos_hoy(query, liga_id, prioridad)
         elif tipo == 'tabla':
-            await self.get_tabla_posiciones(query, liga_id)
+            await self.get_tabla_posiciones(query, liga_id, prioridad)
         elif tipo == 'goleadores':
-            await self.get_goleadores(query, liga_id)
+            await self.get_goleadores(query, liga_id, prioridad)
         elif tipo == 'estadisticas_avanzadas':
             await self.get_estadisticas_avanzadas(query, liga_id)
         elif tipo == 'estadisticas_basicas':
@@ -204,29 +200,31 @@ class BotFutbolPremium:
         elif tipo == 'predicciones':
             await self.get_predicciones(query, liga_id)
     
-    async def get_partidos_hoy(self, query, liga_id: int):
+    def texto_actualizado(self, as_of: datetime) -> str:
+        """Pie con la hora de los datos mostrados (pueden venir de la caché)"""
+        return f"\n\n🕐 Datos al {as_of.strftime('%d/%m %H:%M')}"
+    
+    async def get_partidos_hoy(self, query, liga_id: int, prioridad: str = PRIORIDAD_USUARIO):
         """Obtiene partidos del día para una liga"""
         today = datetime.now().date()
         date_str = today.strftime('%Y-%m-%d')
         
-        url = f"{self.base_url}/fixtures"
         params = {
             'league': liga_id,
             'date': date_str,
             'season': datetime.now().year
         }
         
-        response = requests.get(url, headers=self.headers, params=params)
+        fixtures, as_of = await asyncio.to_thread(api.get_fixtures_with_age, params, prioridad)
         
-        if response.status_code == 200:
-            data = response.json()
+        if fixtures is not None:
             partidos = []
             
-            if data['response']:
-                for fixture in data['response']:
-                    home = fixture['teams']['home']['name']
-                    away = fixture['teams']['away']['name']
-                    utc_time = datetime.fromisoformat(fixture['fixture']['date'].replace('Z', '+00:00'))
+            if fixtures:
+                for fixture in fixtures:
+                    home = fixture.home_name
+                    away = fixture.away_name
+                    utc_time = datetime.fromisoformat(fixture.date.replace('Z', '+00:00'))
                     arg_time = utc_time - timedelta(hours=3)
                     hora = arg_time.strftime('%H:%M')
                     partidos.append(f"{hora} - {home} vs {away}")
@@ -234,6 +232,7 @@ class BotFutbolPremium:
                 mensaje = f"📅 Partidos de hoy en {LIGAS_PERMITIDAS[liga_id]}:\n\n" + "\n".join(partidos)
             else:
                 mensaje = f"No hay partidos programados para hoy en {LIGAS_PERMITIDAS[liga_id]}."
+            mensaje += self.texto_actualizado(as_of)
         else:
             mensaje = "No se pudo obtener la información de partidos."
         
@@ -248,30 +247,26 @@ class BotFutbolPremium:
             if "Message is not modified" not in str(e):
                 raise
     
-    async def get_tabla_posiciones(self, query, liga_id: int):
+    async def get_tabla_posiciones(self, query, liga_id: int, prioridad: str = PRIORIDAD_USUARIO):
         """Obtiene tabla de posiciones"""
-        url = f"{self.base_url}/standings"
         params = {
             'league': liga_id,
             'season': datetime.now().year
         }
         
-        response = requests.get(url, headers=self.headers, params=params)
+        data, as_of = await asyncio.to_thread(api.get_with_age, '/standings', params, prioridad)
         
-        if response.status_code == 200:
-            data = response.json()
+        if data is not None:
             tabla = []
             
             if data['response']:
                 league_data = data['response'][0]
                 for team in league_data['league']['standings'][0]:
-                    pos = team['rank']
-                    nombre = team['team']['name']
-                    pts = team['points']
-                    pj = team['all']['played']
-                    tabla.append(f"{pos}. {nombre} ({pts} pts, {pj} PJ)")
+                    row = StandingRow.from_api(team)
+                    tabla.append(f"{row.position}. {row.team_name} ({row.points} pts, {row.games_played} PJ)")
                 
                 mensaje = f"🏆 Tabla de posiciones - {LIGAS_PERMITIDAS[liga_id]}:\n\n" + "\n".join(tabla)
+                mensaje += self.texto_actualizado(as_of)
             else:
                 mensaje = f"No se pudo obtener la tabla de {LIGAS_PERMITIDAS[liga_id]}."
         else:
@@ -288,18 +283,16 @@ class BotFutbolPremium:
             if "Message is not modified" not in str(e):
                 raise
     
-    async def get_goleadores(self, query, liga_id: int):
+    async def get_goleadores(self, query, liga_id: int, prioridad: str = PRIORIDAD_USUARIO):
         """Obtiene goleadores de una liga"""
-        url = f"{self.base_url}/players/topscorers"
         params = {
             'league': liga_id,
             'season': datetime.now().year
         }
         
-        response = requests.get(url, headers=self.headers, params=params)
+        data, as_of = await asyncio.to_thread(api.get_with_age, '/players/topscorers', params, prioridad)
         
-        if response.status_code == 200:
-            data = response.json()
+        if data is not None:
             goleadores = []
             
             if data['response']:
@@ -310,6 +303,7 @@ class BotFutbolPremium:
                     goleadores.append(f"{nombre} ({equipo}) - {goles} goles")
                 
                 mensaje = f"🥅 Goleadores - {LIGAS_PERMITIDAS[liga_id]}:\n\n" + "\n".join(goleadores)
+                mensaje += self.texto_actualizado(as_of)
             else:
                 mensaje = f"No se pudo obtener los goleadores de {LIGAS_PERMITIDAS[liga_id]}."
         else:
@@ -332,21 +326,19 @@ class BotFutbolPremium:
         today = datetime.now().date()
         date_str = today.strftime('%Y-%m-%d')
         
-        url = f"{self.base_url}/fixtures"
         params = {
             'league': liga_id,
             'date': date_str,
             'season': datetime.now().year
         }
         
-        response = requests.get(url, headers=self.headers, params=params)
+        fixtures = await asyncio.to_thread(api.get_fixtures, params, PRIORIDAD_USUARIO)
         
-        if response.status_code == 200:
-            data = response.json()
-            if data['response']:
+        if fixtures is not None:
+            if fixtures:
                 # Tomar el primer partido para estadísticas
-                fixture_id = data['response'][0]['fixture']['id']
-                stats = premium.get_advanced_stats(fixture_id)
+                fixture_id = fixtures[0].fixture_id
+                stats = await asyncio.to_thread(premium.get_advanced_stats, fixture_id)
                 
                 mensaje = f"📊 Estadísticas Avanzadas - {LIGAS_PERMITIDAS[liga_id]}:\n\n"
                 
@@ -401,7 +393,7 @@ class BotFutbolPremium:
     
     async def get_resumen_semanal(self, query, liga_id: int):
         """Obtiene resumen semanal (solo premium)"""
-        summary = premium.get_weekly_summary(liga_id)
+        summary = await asyncio.to_thread(premium.get_weekly_summary, liga_id)
         
         if summary:
             mensaje = (
@@ -435,21 +427,19 @@ class BotFutbolPremium:
         today = datetime.now().date()
         date_str = today.strftime('%Y-%m-%d')
         
-        url = f"{self.base_url}/fixtures"
         params = {
             'league': liga_id,
             'date': date_str,
             'season': datetime.now().year
         }
         
-        response = requests.get(url, headers=self.headers, params=params)
+        fixtures = await asyncio.to_thread(api.get_fixtures, params, PRIORIDAD_BAJA)
         
-        if response.status_code == 200:
-            data = response.json()
-            if data['response']:
+        if fixtures is not None:
+            if fixtures:
                 # Tomar el primer partido para predicción
-                fixture_id = data['response'][0]['fixture']['id']
-                prediction = premium.get_match_prediction(fixture_id)
+                fixture_id = fixtures[0].fixture_id
+                prediction = await asyncio.to_thread(premium.get_match_prediction, fixture_id)
                 
                 if prediction:
                     pred = prediction['prediction']
@@ -564,7 +554,7 @@ class BotFutbolPremium:
             "• Tabla de posiciones\n"
             "• Goleadores\n"
             "• Estadísticas básicas\n"
-            "• 10 consultas diarias\n\n"
+            f"• {runtime.get('consultas_diarias')} consultas diarias\n\n"
             "**Funciones Premium:**\n"
             "• Todas las ligas\n"
             "• Consultas ilimitadas\n"
@@ -588,13 +578,15 @@ class BotFutbolPremium:
             if "Message is not modified" not in str(e):
                 raise
     
-    async def show_main_menu(self, query):
+    async def show_coming_soon(self, query):
+        """Respuesta de los botones de funciones que todavía no están implementadas"""
+        keyboard = [[InlineKeyboardButton('🔙 Volver', callback_data='back')]]
+        await query.edit_message_text(MENSAJES['proximamente'], reply_markup=InlineKeyboardMarkup(keyboard))
+    
+    async def show_main_menu(self, query, user: UserContext):
         """Muestra el menú principal"""
-        chat_id = query.message.chat_id
-        is_premium = db.is_premium(chat_id)
-        
-        mensaje = MENSAJES['bienvenida_premium'] if is_premium else MENSAJES['bienvenida_gratuito']
-        keyboard = self.create_main_keyboard(is_premium)
+        mensaje = self.welcome_message(user.is_premium)
+        keyboard = self.create_main_keyboard(user.is_premium)
         
         try:
             await query.edit_message_text(
@@ -605,86 +597,9 @@ class BotFutbolPremium:
         except BadRequest as e:
             if "Message is not modified" not in str(e):
                 raise
-    
-    async def monitorear_eventos(self, application):
-        """Monitorea eventos en vivo y envía alertas"""
-        while True:
-            try:
-                # Obtener partidos en vivo
-                url = f"{self.base_url}/fixtures"
-                params = {'live': 'all'}
-                response = requests.get(url, headers=self.headers, params=params)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    for fixture in data['response']:
-                        league_id = fixture['league']['id']
-                        if league_id not in LIGAS_PERMITIDAS:
-                            continue
-                        
-                        fixture_id = fixture['fixture']['id']
-                        league = LIGAS_PERMITIDAS[league_id]
-                        home = fixture['teams']['home']['name']
-                        away = fixture['teams']['away']['name']
-                        goals_home = fixture['goals']['home']
-                        goals_away = fixture['goals']['away']
-                        status = fixture['fixture']['status']['short']
-                        
-                        # Verificar goles nuevos
-                        if status == 'LIVE' and (goals_home > 0 or goals_away > 0):
-                            key = (fixture_id, goals_home, goals_away)
-                            if key not in self.goles_notificados:
-                                self.goles_notificados.add(key)
-                                
-                                mensaje = (
-                                    f"⚽️ ¡GOL EN VIVO! ⚽️\n"
-                                    f"🏆 {league}\n"
-                                    f"🔔 {home} {goals_home} - {goals_away} {away}\n"
-                                    f"-----------------------------"
-                                )
-                                
-                                await self.send_alert_to_users(mensaje, application)
-                        
-                        # Verificar final de partido
-                        if status == 'FT' and fixture_id not in self.finales_notificados:
-                            self.finales_notificados.add(fixture_id)
-                            
-                            utc_time = datetime.fromisoformat(fixture['fixture']['date'].replace('Z', '+00:00'))
-                            arg_time = utc_time - timedelta(hours=3)
-                            hora = arg_time.strftime('%H:%M')
-                            
-                            mensaje = (
-                                f"🏁 FINAL DEL PARTIDO 🏁\n"
-                                f"🏆 {league}\n"
-                                f"{hora} - {home} {goals_home}-{goals_away} {away}\n"
-                                f"-----------------------------"
-                            )
-                            
-                            await self.send_alert_to_users(mensaje, application)
-                
-                await asyncio.sleep(60)  # Esperar 1 minuto
-                
-            except Exception as e:
-                logging.error(f"Error en monitoreo de eventos: {e}")
-                await asyncio.sleep(60)
-    
-    async def send_alert_to_users(self, mensaje: str, application):
-        """Envía alerta a todos los usuarios activos"""
-        users = db.get_all_users()
-        
-        for user in users:
-            try:
-                await application.bot.send_message(
-                    chat_id=user['chat_id'],
-                    text=mensaje
-                )
-                await asyncio.sleep(0.1)  # Pequeña pausa
-            except Exception as e:
-                logging.error(f"Error enviando alerta a {user['chat_id']}: {e}")
 
-# Instancia global del bot
-bot = BotFutbolPremium()
+# Instancia global del bot (arma las rutas, y con ellas el panel de administración, en el primer uso)
+bot = Lazy('bot', BotFutbolPremium)
 
 # Handlers
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -696,23 +611,115 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await admin_panel.admin_menu(update, context)
 
-# Main
-if __name__ == '__main__':
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+async def cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await admin_panel.cancel_broadcast_command(update, context)
+
+async def broadcast_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await admin_panel.receive_broadcast_message(update, context)
+
+async def bind_correlation_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    correlation_id.set(f"update-{update.update_id}")
+
+def attach_loop_tools(app):
+    """Profiler y watchdog del event loop del proceso y recarga de la configuración en caliente;
+    se llama con el loop ya corriendo, cuando el proceso terminó de arrancar, así que también
+    reporta los tiempos del arranque"""
+    profiler.attach()
+    watchdog.start(app.bot)
+    runtime.start()
+    report_startup()
+
+async def on_startup(app):
+    attach_loop_tools(app)
+
+def build_application(updater: bool = True):
+    """Crea la Application con todos los handlers.
+    Sin updater, los updates se entregan con process_update (modo webhook)"""
+    # La base y las rutas se construyen antes de recibir updates y no en el primero
+    warm_up(db, bot)
+    
+    with phase('application'):
+        builder = ApplicationBuilder().token(TELEGRAM_TOKEN).base_url(TELEGRAM_API_URL)
+        if updater:
+            # Polling: el event loop recién existe al arrancar la Application
+            builder = builder.post_init(on_startup)
+        else:
+            builder = builder.updater(None)
+        app = builder.build()
+    
+    # Antes que los demás handlers: id de correlación del update para todos sus logs
+    app.add_handler(TypeHandler(Update, bind_correlation_id), group=-1)
     
     # Handlers principales
     app.add_handler(CommandHandler('start', start_handler))
     app.add_handler(CommandHandler('admin', admin_handler))
+    app.add_handler(CommandHandler('cancel', cancel_handler))
     app.add_handler(CallbackQueryHandler(callback_handler))
     
+    # Texto de un administrador con un mensaje masivo pendiente. Si no lo es, el update
+    # sigue al grupo siguiente (en un mismo grupo solo se ejecuta el primer handler que coincide)
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, broadcast_message_handler))
+    
     # Handler para mensajes de texto (bienvenida automática)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, start_handler))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, start_handler), group=1)
+    return app
+
+def start_background_tasks(app) -> LiveMonitor:
+    """Monitoreo de eventos en vivo y tareas periódicas"""
+    monitor = LiveMonitor(app)
+    asyncio.get_event_loop().create_task(monitor.run())
+    schedule_jobs(app)
+    return monitor
+
+async def run_monitor():
+    """Rol monitor: monitoreo en vivo y tareas periódicas sin atender usuarios,
+    así la latencia del monitoreo no depende del tráfico de callbacks"""
+    app = build_application(updater=False)
+    async with app:
+        attach_loop_tools(app)
+        start_background_tasks(app)
+        await asyncio.Event().wait()
+
+# Main
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bot de fútbol premium')
+    parser.add_argument(
+        '--role', choices=('all', 'bot', 'monitor'), default='all',
+        help='all: atiende usuarios y monitorea; bot: solo atiende usuarios; '
+             'monitor: solo monitoreo en vivo y tareas periódicas'
+    )
+    parser.add_argument(
+        '--migrar-vacuum', action='store_true',
+        help='convierte la base SQLite a auto_vacuum incremental y termina (con el bot detenido)'
+    )
+    args = parser.parse_args()
+    
+    if args.migrar_vacuum:
+        # Paso offline: VACUUM reescribe la base completa y la bloquea mientras dura
+        if db.backend.convert_to_incremental_vacuum():
+            parser.exit(0, 'Base convertida a auto_vacuum incremental\n')
+        parser.exit(0, 'La base ya usa auto_vacuum incremental (o el backend no lo necesita)\n')
+    mark_imports()
+    
+    # Logging en cola con archivo JSON rotado (el rol monitor escribe su propio archivo)
+    setup_logging('monitor' if args.role == 'monitor' else None)
     
     print('Bot Premium iniciado. Esperando mensajes...')
     print('Desarrollado por Valentín Olivero')
     
-    # Iniciar monitoreo de eventos
-    asyncio.get_event_loop().create_task(bot.monitorear_eventos(app))
-    
-    # Ejecutar el bot
-    app.run_polling() 
\ No newline at end of file
+    if args.role == 'monitor':
+        start_metrics_server()
+        asyncio.run(run_monitor())
+    elif WEBHOOK_CONFIG['modo'] == 'webhook':
+        from webhook_server import run_webhook
+        run_webhook(background_tasks=args.role == 'all')
+    else:
+        start_metrics_server()
+        app = build_application()
+        
+        # Iniciar monitoreo de eventos y tareas periódicas (vencimiento de planes)
+        if args.role == 'all':
+            start_background_tasks(app)
+        
+        # Ejecutar el bot
+        app.run_polling()
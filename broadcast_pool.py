@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from config import BROADCAST_CONFIG, TELEGRAM_API_URL, TELEGRAM_TOKEN
+from database import db
+from logging_setup import LogSampler, correlation_id, setup_logging
+from metrics import MESSAGES_SENT, SEND_RATE
+
+# Los fallos por usuario de un envío masivo se muestrean: con miles de bloqueos el log no frena el envío
+_failure_sampler = LogSampler()
+
+async def send_shard(bot, message_text: str, segment: str, value=None,
+                     shard: Optional[Tuple[int, int]] = None, rate: float = None) -> Dict[str, int]:
+    """Envía el mensaje a los usuarios del segmento (o de una partición suya) a `rate` mensajes/s,
+    con varios envíos en vuelo para que la latencia de Telegram no limite el ritmo"""
+    from telegram.error import RetryAfter
+    
+    rate = rate or BROADCAST_CONFIG['mensajes_por_segundo']
+    interval = 1.0 / rate
+    slots = asyncio.Semaphore(BROADCAST_CONFIG['envios_concurrentes'])
+    counts = {'sent': 0, 'failed': 0}
+    tasks = set()
+    sample_key = f"{correlation_id.get()}:{shard}"
+    
+    async def send(chat_id: int):
+        try:
+            try:
+                await bot.send_message(chat_id=chat_id, text=message_text)
+            except RetryAfter as e:
+                # Telegram pide esperar: se reintenta una vez
+                await asyncio.sleep(e.retry_after)
+                await bot.send_message(chat_id=chat_id, text=message_text)
+            counts['sent'] += 1
+        except Exception as e:
+            counts['failed'] += 1
+            log, skipped = _failure_sampler.check(sample_key)
+            if log:
+                logging.error("Error sending broadcast to %s: %s", chat_id, e,
+                              extra={'chat_id': chat_id, 'omitidos': skipped})
+        finally:
+            slots.release()
+    
+    next_slot = time.monotonic()
+    async for user in db.aiter_users(segment, value, shard=shard):
+        delay = next_slot - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_slot = max(next_slot, time.monotonic()) + interval
+        
+        await slots.acquire()
+        task = asyncio.create_task(send(user.chat_id))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    if tasks:
+        await asyncio.wait(tasks)
+    _failure_sampler.pop(sample_key)
+    if counts['failed'] > _failure_sampler.first:
+        logging.error("Broadcast: %d envíos fallidos de %d", counts['failed'], counts['sent'] + counts['failed'])
+    return counts
+
+async def _send_shard_with_own_bot(message_text: str, segment: str, value, shard: Tuple[int, int],
+                                   rate: float) -> Dict[str, int]:
+    from telegram import Bot
+    
+    # Cada proceso usa su propio Bot y su propia sesión HTTP
+    async with Bot(TELEGRAM_TOKEN, base_url=TELEGRAM_API_URL) as bot:
+        return await send_shard(bot, message_text, segment, value, shard, rate)
+
+def _run_shard(message_text: str, segment: str, value, shard: Tuple[int, int], rate: float,
+               parent_id: str = '-') -> Dict[str, int]:
+    """Punto de entrada de cada proceso del pool"""
+    setup_logging(f"broadcast-{shard[0]}")
+    correlation_id.set(f"{parent_id}/shard-{shard[0]}")
+    return asyncio.run(_send_shard_with_own_bot(message_text, segment, value, shard, rate))
+
+async def broadcast(bot, message_text: str, segment: str, value=None) -> Dict[str, int]:
+    """Envía un mensaje masivo repartiendo los destinatarios (chat_id % N) entre N procesos,
+    cada uno con 1/N del presupuesto global de mensajes por segundo"""
+    start = time.perf_counter()
+    processes = BROADCAST_CONFIG['procesos'] or os.cpu_count() or 1
+    if processes == 1:
+        counts = await send_shard(bot, message_text, segment, value)
+        counts['total'] = counts['sent'] + counts['failed']
+        _record(counts, time.perf_counter() - start)
+        return counts
+    
+    rate = BROADCAST_CONFIG['mensajes_por_segundo'] / processes
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, _run_shard, message_text, segment, value, (index, processes), rate,
+                                   correlation_id.get())
+              for index in range(processes)),
+            return_exceptions=True
+        )
+    
+    counts = {'sent': 0, 'failed': 0}
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            logging.error(f"Error en el shard {index} del envío masivo: {result}")
+            continue
+        counts['sent'] += result['sent']
+        counts['failed'] += result['failed']
+    counts['total'] = counts['sent'] + counts['failed']
+    _record(counts, time.perf_counter() - start)
+    return counts
+
+def _record(counts: Dict[str, int], elapsed: float):
+    """Registra en las métricas del proceso el resultado agregado de un envío masivo"""
+    MESSAGES_SENT.inc(counts['sent'], kind='broadcast', result='sent')
+    MESSAGES_SENT.inc(counts['failed'], kind='broadcast', result='failed')
+    if elapsed > 0:
+        SEND_RATE.set(counts['sent'] / elapsed, kind='broadcast')
@@ -5,6 +5,10 @@ from datetime import datetime
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN', 'AQUI_VA_TU_TOKEN')
 API_FOOTBALL_TOKEN = os.getenv('API_FOOTBALL_TOKEN', 'AQUI_TU_API_FOOTBALL_TOKEN')
 
+# URLs base de las APIs externas (benchmarks/ las apunta a servidores locales)
+API_FOOTBALL_URL = os.getenv('API_FOOTBALL_URL', 'https://v3.football.api-sports.io')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+
 # Configuración de ligas
 LIGAS_PERMITIDAS = {
     128: 'Liga Argentina',
@@ -55,13 +59,156 @@ MONITOREO_CONFIG = {
         'inicio': '08:00',
         'fin': '02:00'  # Hora argentina
     },
-    'eventos_monitoreados': ['goles', 'tarjetas_rojas', 'finales', 'inicio_partido']
+    'eventos_monitoreados': ['goles', 'tarjetas_rojas', 'finales', 'inicio_partido'],
+    'senders': 2,  # Tareas que envían las alertas; cada una atiende a los usuarios con chat_id % senders
+    # Sin renovar el lock en este tiempo, otra instancia toma el monitoreo. El líder lo renueva
+    # también mientras espera el intervalo, que por eso puede ser más largo que el TTL
+    'lock_ttl_segundos': 180
+}
+
+# Cuota de API-Football
+API_QUOTA_CONFIG = {
+    'limite_diario': 100,  # Se ajusta con los headers x-ratelimit-requests-*
+    'limite_por_minuto': 10,  # Se ajusta con los headers X-RateLimit-*
+    'reserva_monitoreo': 30,  # Requests diarios reservados para monitorear_eventos
+    'umbral_bajo': 20,  # Margen extra antes de degradar llamadas de baja prioridad
+    'reserva_minuto': 2,  # Requests por minuto reservados para el monitoreo
+    # Las llamadas se cuentan en la base (tabla api_usage) para que los workers del modo webhook
+    # y los roles bot/monitor descuenten del mismo presupuesto. Limitaciones: allow() y el registro
+    # de la llamada no son atómicos, así que procesos simultáneos pueden pasarse por las llamadas
+    # en vuelo, y el límite por minuto compartido es por minuto calendario. Con False cada proceso
+    # asume para sí la cuota diaria completa y la reserva_monitoreo
+    'compartida': True
+}
+
+# Cliente HTTP (timeouts, reintentos, circuit breaker y hedging)
+HTTP_CONFIG = {
+    'timeout_conexion': 3.05,  # segundos
+    'timeout_lectura': 10,
+    'reintentos': 2,  # Reintentos ante 5xx, timeouts y errores de conexión
+    'backoff_base': 0.5,  # segundos, con jitter completo
+    'backoff_max': 4,
+    'breaker_fallos': 5,  # Fallos consecutivos que abren el circuito de un endpoint
+    'breaker_reset_segundos': 30,
+    'hedge_delay': 1.5,  # Espera antes de lanzar la request duplicada (solo monitoreo)
+    'workers_hedge': 4
+}
+
+# Caché de respuestas de la API (stale-while-revalidate)
+CACHE_CONFIG = {
+    'ttl_segundos': {
+        '/fixtures': 60,
+        '/standings': 900,
+        '/players/topscorers': 1800
+    },
+    'ttl_default': 300,
+    'max_stale_horas': 24,  # Pasado este tiempo la copia en caché se descarta
+    'workers_refresco': 2,
+    # En modo webhook hay varios procesos: comparten la caché a través de la base
+    'compartida': os.getenv('BOT_MODE', 'polling') == 'webhook'
+}
+
+# Modo webhook: un ingreso HTTP reparte los updates entre procesos worker por chat_id
+WEBHOOK_CONFIG = {
+    'modo': os.getenv('BOT_MODE', 'polling'),  # 'polling' o 'webhook'
+    'url': os.getenv('WEBHOOK_URL'),  # URL pública registrada en Telegram
+    'path': '/telegram',
+    'host': '0.0.0.0',
+    'port': int(os.getenv('PORT', 8443)),
+    'secret': os.getenv('WEBHOOK_SECRET'),  # Obligatorio: se valida en el header X-Telegram-Bot-Api-Secret-Token
+    'workers': int(os.getenv('BOT_WORKERS', 0)),  # 0 = uno por núcleo
+    'cola_max': 1000,  # Updates pendientes por worker antes de frenar el ingreso
+    'espera_cola_segundos': 2,  # Espera con la cola llena antes de responder 503 (Telegram reintenta)
+    'updates_concurrentes': 32,  # Updates procesados a la vez por worker
+    'dias_eventos_notificados': 2  # Retención de la deduplicación de alertas en vivo
+}
+
+# Envíos masivos: los destinatarios se reparten por chat_id entre procesos
+BROADCAST_CONFIG = {
+    'procesos': int(os.getenv('BROADCAST_PROCESOS', 0)),  # 0 = uno por núcleo; 1 = en el proceso del bot
+    'mensajes_por_segundo': 25,  # Presupuesto global; Telegram admite ~30 mensajes/s por bot
+    'envios_concurrentes': 10  # Requests en vuelo por proceso
+}
+
+# Logging: cola en memoria, JSON y archivo rotado por proceso
+LOGGING_CONFIG = {
+    'nivel': os.getenv('LOG_LEVEL', 'INFO'),
+    'json': os.getenv('LOG_JSON', '0') == '1',  # Formato de la consola; el archivo siempre es JSON
+    'archivo': os.getenv('LOG_FILE', 'logs/bot.log'),  # Vacío = solo consola
+    'max_bytes': 10 * 1024 * 1024,
+    'backups': 5,
+    'cola_max': 10000,  # Registros pendientes antes de descartar
+    'muestreo_primeros': 10,  # Eventos de alto volumen: se registran los primeros N por clave...
+    'muestreo_cada': 100  # ...y después uno de cada N
+}
+
+# Endpoint local de métricas (formato Prometheus)
+METRICS_CONFIG = {
+    'habilitado': os.getenv('METRICS_ENABLED', '1') == '1',
+    'host': '127.0.0.1',
+    'port': int(os.getenv('METRICS_PORT', 9108))  # Los workers del modo webhook usan port + 1 + índice
+}
+
+# Perfiles bajo demanda (panel de administración o GET /debug/profile en el endpoint de métricas)
+PROFILING_CONFIG = {
+    'directorio': 'profiles',
+    'segundos': 30,  # Duración por defecto de una captura
+    'segundos_max': 300,
+    'intervalo_ms': 10  # Período de muestreo de las pilas (los bloqueos los mide WATCHDOG_CONFIG)
+}
+
+# Watchdog del event loop: mide su atraso y reporta los bloqueos
+WATCHDOG_CONFIG = {
+    'habilitado': True,
+    'intervalo_ms': 100,  # Período del latido
+    'umbral_bloqueo_ms': 250,  # Latido más atrasado que esto = bloqueo (se loguea con la pila)
+    'umbral_alerta_ms': 2000,  # Bloqueos más largos se avisan al log_channel
+    'alerta_cada_segundos': 300,  # Como mucho una alerta por período
+    'frames_reporte': 12  # Frames de la pila incluidos en el log
+}
+
+# Configuración ajustable en caliente desde el panel (runtime_config): los valores de arriba
+# son los por defecto y los cambios del panel se guardan versionados en la base
+RUNTIME_CONFIG = {
+    'refresco_segundos': 5,  # Cada proceso busca una versión nueva con este período
+    'intervalo_monitoreo_min': 10,
+    'intervalo_monitoreo_max': 600,
+    'consultas_diarias_max': 100
 }
 
 # Configuración de base de datos
 DATABASE_CONFIG = {
-    'file': 'users.db',
-    'backup_interval': 24  # horas
+    'backend': os.getenv('DATABASE_BACKEND', 'sqlite'),  # 'sqlite' o 'postgres'
+    'file': os.getenv('DATABASE_FILE', 'users.db'),
+    'postgres_dsn': os.getenv('DATABASE_URL'),  # Solo con backend 'postgres'
+    'pool_min': 1,
+    'pool_max': 10,
+    # Modo webhook: varios workers escriben la misma base SQLite
+    'sqlite_wal': WEBHOOK_CONFIG['modo'] == 'webhook',
+    'sqlite_busy_timeout': 10,  # Segundos que una conexión espera un lock de escritura
+    'backup_interval': 24,  # horas
+    'backup_dir': 'backups',
+    'backup_keep': 7,  # Cantidad de backups que se conservan
+    'backup_compress': True,  # gzip
+    'backup_pages_por_paso': 256,  # Páginas copiadas por paso de la API de backup
+    'backup_pausa_segundos': 0.01  # Pausa entre pasos para dejar escribir al bot
+}
+
+# Retención de daily_queries
+RETENTION_CONFIG = {
+    'dias_daily_queries': 30,  # Las consultas más viejas se resumen en usage_stats
+    'archivar': False,  # Copiar las filas a daily_queries_archive antes de borrarlas
+    'paginas_vacuum': 1000,  # Páginas liberadas por corrida de incremental_vacuum
+    'intervalo_horas': 24
+}
+
+# Tareas periódicas
+JOBS_CONFIG = {
+    'vencimiento_planes_minutos': 5,  # Barrido de planes vencidos y recordatorios
+    'metricas_diarias_minutos': 30,  # Foto de las métricas del panel en daily_metrics
+    # Cada job corre en una sola instancia: la que tiene su lock, que renueva en cada corrida.
+    # El lock vence un intervalo más este margen después, que debe superar lo que dura el job
+    'lock_margen_segundos': 900
 }
 
 # Mensajes del bot
@@ -70,7 +217,7 @@ MENSAJES = {
         "¡Bienvenido al Bot de Fútbol Premium! ⚽️\n\n"
         "🔹 Plan Gratuito activo\n"
         "🔹 Ligas disponibles: Premier League, La Liga, Serie A, Bundesliga, Ligue 1\n"
-        "🔹 10 consultas diarias\n"
+        "🔹 {consultas_diarias} consultas diarias\n"
         "🔹 Alertas básicas de goles\n\n"
         "💎 Actualiza a Premium para:\n"
         "• Todas las ligas (Argentina, Libertadores, etc.)\n"
@@ -99,6 +246,20 @@ MENSAJES = {
         "• Alertas personalizadas\n"
         "• Sin publicidad\n\n"
         "Usa /premium para más información."
+    ),
+    'plan_vencido': (
+        "⏰ Tu plan Premium ha vencido.\n\n"
+        "Tu cuenta volvió al plan gratuito. "
+        "Renueva para seguir disfrutando de todas las funciones.\n\n"
+        "Usa /premium para más información."
+    ),
+    'proximamente': (
+        "🚧 Esta función estará disponible próximamente.\n\n"
+        "Te avisaremos cuando esté lista."
+    ),
+    'liga_no_disponible': (
+        "⚠️ Esa liga no está disponible para tu plan.\n\n"
+        "Elige otra desde el menú."
     )
 }
 
@@ -0,0 +1,3 @@
+# test_api.py es una prueba manual contra la API real (consume cuota): pytest no la recolecta.
+# Las pruebas automáticas están en tests/
+collect_ignore = ['test_api.py']
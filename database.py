@@ -1,21 +1,56 @@
-import sqlite3
-import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import asyncio
+import gzip
+import os
+import shutil
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 import logging
+import threading
+import time
+from models import User, UserContext, UserRef
+from config import DATABASE_CONFIG
+from metrics import DB_SECONDS, PLAN_CACHE, timed_methods
+from runtime_config import runtime
+from startup import Lazy
+from storage import SQLiteBackend, StorageBackend, create_backend
 
+# Paginación de usuarios para envíos masivos
+USERS_CHUNK_SIZE = 500
+MIN_CHAT_ID = -2 ** 63  # Los chats de grupos tienen chat_id negativo
+
+# Segundos que se reutiliza el plan leído de un usuario (otros procesos pueden modificarlo)
+PLAN_CACHE_TTL = 60
+
+# Formato de CURRENT_TIMESTAMP, con el que se guardan created_at y last_activity
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def utc_now() -> datetime:
+    """Reloj de las fechas guardadas en la base: UTC, el mismo de CURRENT_TIMESTAMP y
+    CURRENT_DATE, así los días de las consultas y de los contadores cambian a la vez"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def utc_today() -> date:
+    return utc_now().date()
+
+@timed_methods(DB_SECONDS, include=('_get_users_chunk',))
 class Database:
-    def __init__(self, db_file: str = 'users.db'):
+    def __init__(self, db_file: str = 'users.db', backend: StorageBackend = None):
         self.db_file = db_file
+        self.backend = backend or SQLiteBackend(db_file)
+        # chat_id -> (plan, plan_expires_at, momento de lectura)
+        self._plan_cache: Dict[int, Tuple[str, Optional[str], float]] = {}
+        self._plan_cache_lock = threading.Lock()
         self.init_database()
     
     def init_database(self):
         """Inicializa la base de datos con todas las tablas necesarias"""
-        with sqlite3.connect(self.db_file) as conn:
+        with self.backend.connect() as conn:
             cursor = conn.cursor()
             
+            self.backend.prepare(cursor)
+            
             # Tabla de usuarios
-            cursor.execute('''
+            cursor.execute(self.backend.translate_ddl('''
                 CREATE TABLE IF NOT EXISTS users (
                     chat_id INTEGER PRIMARY KEY,
                     username TEXT,
@@ -27,10 +62,10 @@ class Database:
                     last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     is_active BOOLEAN DEFAULT 1
                 )
-            ''')
+            '''))
             
             # Tabla de consultas diarias
-            cursor.execute('''
+            cursor.execute(self.backend.translate_ddl('''
                 CREATE TABLE IF NOT EXISTS daily_queries (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     chat_id INTEGER,
@@ -40,10 +75,10 @@ class Database:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (chat_id) REFERENCES users (chat_id)
                 )
-            ''')
+            '''))
             
             # Tabla de alertas personalizadas
-            cursor.execute('''
+            cursor.execute(self.backend.translate_ddl('''
                 CREATE TABLE IF NOT EXISTS user_alerts (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     chat_id INTEGER,
@@ -54,10 +89,10 @@ class Database:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (chat_id) REFERENCES users (chat_id)
                 )
-            ''')
+            '''))
             
             # Tabla de estadísticas de uso
-            cursor.execute('''
+            cursor.execute(self.backend.translate_ddl('''
                 CREATE TABLE IF NOT EXISTS usage_stats (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     chat_id INTEGER,
@@ -66,10 +101,10 @@ class Database:
                     alerts_received INTEGER DEFAULT 0,
                     FOREIGN KEY (chat_id) REFERENCES users (chat_id)
                 )
-            ''')
+            '''))
             
             # Tabla de pagos (para futuras integraciones)
-            cursor.execute('''
+            cursor.execute(self.backend.translate_ddl('''
                 CREATE TABLE IF NOT EXISTS payments (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     chat_id INTEGER,
@@ -81,48 +116,203 @@ class Database:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (chat_id) REFERENCES users (chat_id)
                 )
+            '''))
+            
+            # Eventos de planes (vencimientos) para recordatorios de renovación
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS plan_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER,
+                    event_type TEXT,
+                    plan TEXT,
+                    notified BOOLEAN DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (chat_id) REFERENCES users (chat_id)
+                )
+            '''))
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_plan_events_pending ON plan_events (notified, id)')
+            
+            # Contadores de métricas del panel (se actualizan en cada escritura)
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS metrics_counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER DEFAULT 0
+                )
+            '''))
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS daily_counters (
+                    date DATE,
+                    name TEXT,
+                    value INTEGER DEFAULT 0,
+                    PRIMARY KEY (date, name)
+                )
+            '''))
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS daily_active_users (
+                    date DATE,
+                    chat_id INTEGER,
+                    PRIMARY KEY (date, chat_id)
+                )
+            '''))
+            
+            # Foto diaria de las métricas del panel
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS daily_metrics (
+                    date DATE PRIMARY KEY,
+                    total_users INTEGER,
+                    premium_users INTEGER,
+                    queries INTEGER,
+                    active_users INTEGER
+                )
+            '''))
+            
+            cursor.execute("SELECT 1 FROM metrics_counters WHERE name = 'total_users'")
+            if cursor.fetchone() is None:
+                self._rebuild_counters(cursor)
+            
+            # Consultas ya compactadas en usage_stats (si RETENTION_CONFIG['archivar'])
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS daily_queries_archive (
+                    id INTEGER PRIMARY KEY,
+                    chat_id INTEGER,
+                    query_type TEXT,
+                    league_id INTEGER,
+                    query_date DATE,
+                    created_at TIMESTAMP
+                )
+            '''))
+            
+            # Estado compartido entre procesos del bot: alertas ya enviadas y respuestas de la API
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS notified_events (
+                    event_key TEXT PRIMARY KEY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            '''))
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS api_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT,
+                    fetched_at TIMESTAMP
+                )
+            '''))
+            # Llamadas a la API por día ('YYYY-MM-DD') y por minuto ('YYYY-MM-DDTHH:MM')
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS api_usage (
+                    period TEXT PRIMARY KEY,
+                    used INTEGER DEFAULT 0
+                )
+            '''))
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS leader_locks (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT,
+                    expires_at TIMESTAMP
+                )
+            '''))
+            
+            # Configuración en caliente: cada cambio es una fila nueva y su id es la versión
+            cursor.execute(self.backend.translate_ddl('''
+                CREATE TABLE IF NOT EXISTS runtime_config (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_by INTEGER,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            '''))
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_runtime_config_key ON runtime_config (key, version)')
+            
+            # usage_stats guarda el resumen diario por liga de daily_queries
+            if 'league_id' not in self.backend.column_names(cursor, 'usage_stats'):
+                cursor.execute('ALTER TABLE usage_stats ADD COLUMN league_id INTEGER')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_usage_stats_chat_date ON usage_stats (chat_id, date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_queries_chat_date ON daily_queries (chat_id, query_date)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_queries_date ON daily_queries (query_date)')
+            
+            # Índices para la resolución de segmentos
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_plan ON users (plan, plan_expires_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_last_activity ON users (last_activity)')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_user_alerts_league
+                ON user_alerts (league_id, is_active, chat_id)
             ''')
             
             conn.commit()
     
+    def _rebuild_counters(self, cursor):
+        """Recalcula los contadores desde las tablas (solo al crearlos por primera vez)"""
+        today = utc_today().isoformat()
+        cursor.execute('''
+            INSERT INTO metrics_counters (name, value)
+            SELECT 'total_users', COUNT(*) FROM users WHERE is_active = 1
+            ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        ''')
+        cursor.execute('''
+            INSERT INTO metrics_counters (name, value)
+            SELECT 'premium_users', COUNT(*) FROM users WHERE plan != 'gratuito' AND is_active = 1
+            ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        ''')
+        cursor.execute('''
+            INSERT INTO daily_active_users (date, chat_id)
+            SELECT DISTINCT ?, chat_id FROM daily_queries WHERE query_date = ?
+            ON CONFLICT DO NOTHING
+        ''', (today, today))
+        cursor.execute('''
+            INSERT INTO daily_counters (date, name, value)
+            SELECT ?, 'queries', COUNT(*) FROM daily_queries WHERE query_date = ?
+            ON CONFLICT (date, name) DO UPDATE SET value = excluded.value
+        ''', (today, today))
+        cursor.execute('''
+            INSERT INTO daily_counters (date, name, value)
+            SELECT ?, 'active_users', COUNT(*) FROM daily_active_users WHERE date = ?
+            ON CONFLICT (date, name) DO UPDATE SET value = excluded.value
+        ''', (today, today))
+    
+    def _bump(self, cursor, name: str, delta: int = 1):
+        """Suma delta a un contador global"""
+        cursor.execute('''
+            INSERT INTO metrics_counters (name, value) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET value = metrics_counters.value + excluded.value
+        ''', (name, delta))
+    
+    def _bump_daily(self, cursor, name: str, delta: int = 1):
+        """Suma delta al contador del día; el cambio de fecha inicia un contador nuevo"""
+        cursor.execute('''
+            INSERT INTO daily_counters (date, name, value) VALUES (?, ?, ?)
+            ON CONFLICT (date, name) DO UPDATE SET value = daily_counters.value + excluded.value
+        ''', (utc_today().isoformat(), name, delta))
+    
     def add_user(self, chat_id: int, username: str = None, first_name: str = None, last_name: str = None) -> bool:
         """Agrega un nuevo usuario a la base de datos"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT OR IGNORE INTO users (chat_id, username, first_name, last_name)
+                    INSERT INTO users (chat_id, username, first_name, last_name)
                     VALUES (?, ?, ?, ?)
+                    ON CONFLICT DO NOTHING
                 ''', (chat_id, username, first_name, last_name))
+                if cursor.rowcount:
+                    self._bump(cursor, 'total_users')
                 conn.commit()
                 return True
         except Exception as e:
             logging.error(f"Error adding user {chat_id}: {e}")
             return False
     
-    def get_user(self, chat_id: int) -> Optional[Dict]:
+    def get_user(self, chat_id: int) -> Optional[User]:
         """Obtiene información de un usuario"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT chat_id, username, first_name, last_name, plan, plan_expires_at, 
-                           created_at, last_activity, is_active
+                cursor.execute(f'''
+                    SELECT {User.COLUMNS}
                     FROM users WHERE chat_id = ?
                 ''', (chat_id,))
                 row = cursor.fetchone()
                 if row:
-                    return {
-                        'chat_id': row[0],
-                        'username': row[1],
-                        'first_name': row[2],
-                        'last_name': row[3],
-                        'plan': row[4],
-                        'plan_expires_at': row[5],
-                        'created_at': row[6],
-                        'last_activity': row[7],
-                        'is_active': bool(row[8])
-                    }
+                    return User.from_row(row)
                 return None
         except Exception as e:
             logging.error(f"Error getting user {chat_id}: {e}")
@@ -131,46 +321,108 @@ class Database:
     def update_user_activity(self, chat_id: int):
         """Actualiza la última actividad del usuario"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    UPDATE users SET last_activity = CURRENT_TIMESTAMP
+                    UPDATE users SET last_activity = ?
                     WHERE chat_id = ?
-                ''', (chat_id,))
+                ''', (utc_now().strftime(TIMESTAMP_FORMAT), chat_id))
                 conn.commit()
         except Exception as e:
             logging.error(f"Error updating user activity {chat_id}: {e}")
     
+    def load_user_context(self, chat_id: int) -> UserContext:
+        """Registra la actividad del usuario y trae su plan y sus consultas de hoy en una sola query"""
+        now = utc_now()
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE users SET last_activity = ?
+                    WHERE chat_id = ?
+                    RETURNING plan, plan_expires_at, (
+                        SELECT COUNT(*) FROM daily_queries WHERE chat_id = ? AND query_date = ?
+                    )
+                ''', (now.strftime(TIMESTAMP_FORMAT), chat_id, chat_id, now.date().isoformat()))
+                row = cursor.fetchone()
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error loading user context {chat_id}: {e}")
+            row = None
+        
+        if row is None:
+            # Usuario sin registrar (o error): se trata como gratuito sin consultas
+            return UserContext(chat_id, 'gratuito', None, 0, runtime.get('consultas_diarias'))
+        with self._plan_cache_lock:
+            self._plan_cache[chat_id] = (row[0], row[1], time.monotonic())
+        return UserContext(chat_id, row[0], row[1], row[2], runtime.get('consultas_diarias'))
+    
+    def get_plan(self, chat_id: int) -> Optional[Tuple[str, Optional[str]]]:
+        """Obtiene (plan, plan_expires_at) de un usuario, usando la caché de planes"""
+        with self._plan_cache_lock:
+            cached = self._plan_cache.get(chat_id)
+        if cached and time.monotonic() - cached[2] < PLAN_CACHE_TTL:
+            PLAN_CACHE.inc(result='hit')
+            return cached[0], cached[1]
+        PLAN_CACHE.inc(result='miss')
+        
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT plan, plan_expires_at FROM users WHERE chat_id = ?', (chat_id,))
+                row = cursor.fetchone()
+        except Exception as e:
+            logging.error(f"Error getting user plan {chat_id}: {e}")
+            return None
+        
+        if not row:
+            return None
+        with self._plan_cache_lock:
+            self._plan_cache[chat_id] = (row[0], row[1], time.monotonic())
+        return row[0], row[1]
+    
     def is_premium(self, chat_id: int) -> bool:
-        """Verifica si un usuario tiene plan premium activo"""
-        user = self.get_user(chat_id)
-        if not user:
+        """Verifica si un usuario tiene plan premium activo.
+        No escribe: los planes vencidos los baja expire_lapsed_plans"""
+        plan = self.get_plan(chat_id)
+        if not plan or plan[0] == 'gratuito':
             return False
         
-        if user['plan'] == 'gratuito':
+        if plan[1] and datetime.fromisoformat(plan[1]) < datetime.now():
             return False
         
-        if user['plan_expires_at']:
-            expires_at = datetime.fromisoformat(user['plan_expires_at'])
-            if expires_at < datetime.now():
-                # Plan expirado, cambiar a gratuito
-                self.update_user_plan(chat_id, 'gratuito')
-                return False
-        
         return True
     
     def update_user_plan(self, chat_id: int, plan: str, expires_at: datetime = None):
-        """Actualiza el plan de un usuario"""
+        """Actualiza el plan de un usuario.
+        El UPDATE solo se aplica si el plan leído sigue siendo el vigente; si otro proceso lo cambió
+        en el medio, se vuelve a leer. Así el ajuste del contador sale de la fila que se reemplazó"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE users SET plan = ?, plan_expires_at = ?
-                    WHERE chat_id = ?
-                ''', (plan, expires_at.isoformat() if expires_at else None, chat_id))
+                while True:
+                    cursor.execute("SELECT COALESCE(plan, 'gratuito'), is_active FROM users WHERE chat_id = ?", (chat_id,))
+                    previous = cursor.fetchone()
+                    if previous is None:
+                        return
+                    cursor.execute('''
+                        UPDATE users SET plan = ?, plan_expires_at = ?
+                        WHERE chat_id = ? AND COALESCE(plan, 'gratuito') = ? AND is_active = ?
+                    ''', (plan, expires_at.isoformat() if expires_at else None, chat_id, previous[0], previous[1]))
+                    if cursor.rowcount:
+                        break
+                
+                # Ajustar el contador de premium si el usuario cambió de gratuito a pago o viceversa
+                if previous[1]:
+                    delta = (plan != 'gratuito') - (previous[0] != 'gratuito')
+                    if delta:
+                        self._bump(cursor, 'premium_users', delta)
                 conn.commit()
         except Exception as e:
             logging.error(f"Error updating user plan {chat_id}: {e}")
+        finally:
+            with self._plan_cache_lock:
+                self._plan_cache.pop(chat_id, None)
     
     def can_make_query(self, chat_id: int) -> bool:
         """Verifica si un usuario puede hacer una consulta (límites del plan gratuito)"""
@@ -178,19 +430,29 @@ class Database:
             return True
         
         # Verificar límite diario para usuarios gratuitos
-        today = datetime.now().date()
-        daily_queries = self.get_daily_queries_count(chat_id, today)
-        return daily_queries < 10  # Límite del plan gratuito
+        daily_queries = self.get_daily_queries_count(chat_id, utc_today())
+        return daily_queries < runtime.get('consultas_diarias')
     
     def log_query(self, chat_id: int, query_type: str, league_id: int = None):
         """Registra una consulta del usuario"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
+                # La fecha se escribe explícita (no CURRENT_DATE) para que coincida con la de los contadores
+                today = utc_today().isoformat()
+                cursor.execute('''
+                    INSERT INTO daily_queries (chat_id, query_type, league_id, query_date)
+                    VALUES (?, ?, ?, ?)
+                ''', (chat_id, query_type, league_id, today))
+                self._bump_daily(cursor, 'queries')
+                
+                # Primer consulta del día del usuario: cuenta como activo
                 cursor.execute('''
-                    INSERT INTO daily_queries (chat_id, query_type, league_id)
-                    VALUES (?, ?, ?)
-                ''', (chat_id, query_type, league_id))
+                    INSERT INTO daily_active_users (date, chat_id) VALUES (?, ?)
+                    ON CONFLICT DO NOTHING
+                ''', (today, chat_id))
+                if cursor.rowcount:
+                    self._bump_daily(cursor, 'active_users')
                 conn.commit()
         except Exception as e:
             logging.error(f"Error logging query {chat_id}: {e}")
@@ -198,7 +460,7 @@ class Database:
     def get_daily_queries_count(self, chat_id: int, date: datetime.date) -> int:
         """Obtiene el número de consultas de un usuario en una fecha específica"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT COUNT(*) FROM daily_queries 
@@ -212,7 +474,7 @@ class Database:
     def add_user_alert(self, chat_id: int, alert_type: str, team_id: int = None, league_id: int = None) -> bool:
         """Agrega una alerta personalizada para un usuario"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO user_alerts (chat_id, alert_type, team_id, league_id)
@@ -227,7 +489,7 @@ class Database:
     def get_user_alerts(self, chat_id: int) -> List[Dict]:
         """Obtiene las alertas personalizadas de un usuario"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT alert_type, team_id, league_id FROM user_alerts
@@ -245,78 +507,479 @@ class Database:
             logging.error(f"Error getting user alerts {chat_id}: {e}")
             return []
     
-    def get_all_users(self) -> List[Dict]:
+    def get_all_users(self) -> List[User]:
         """Obtiene todos los usuarios activos"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT chat_id, username, first_name, plan, created_at, last_activity
+                cursor.execute(f'''
+                    SELECT {User.COLUMNS}
                     FROM users WHERE is_active = 1
                     ORDER BY last_activity DESC
                 ''')
+                return [User.from_row(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error getting all users: {e}")
+            return []
+    
+    def _segment_condition(self, segment: str, value=None) -> Tuple[str, List]:
+        """Condición SQL (sobre users) y parámetros de un segmento de usuarios"""
+        now = datetime.now().isoformat()
+        if segment == 'all':
+            return '', []
+        if segment == 'premium':
+            return "AND plan != 'gratuito' AND (plan_expires_at IS NULL OR plan_expires_at > ?)", [now]
+        if segment == 'free':
+            return "AND (plan = 'gratuito' OR plan_expires_at <= ?)", [now]
+        if segment == 'league':
+            # Seguidores de una liga: usuarios con alertas activas de esa liga
+            return '''AND chat_id IN (
+                SELECT chat_id FROM user_alerts WHERE league_id = ? AND is_active = 1
+            )''', [int(value)]
+        if segment == 'inactive':
+            # Usuarios sin actividad en los últimos `value` días
+            since = utc_now() - timedelta(days=int(value))
+            return 'AND last_activity < ?', [since.strftime(TIMESTAMP_FORMAT)]
+        raise ValueError(f"Segmento desconocido: {segment}")
+    
+    def _get_users_chunk(self, after_chat_id: int, segment: str, value, limit: int,
+                         shard: Tuple[int, int] = None) -> List[UserRef]:
+        """Trae el siguiente bloque de usuarios activos del segmento con chat_id mayor a after_chat_id.
+        Con shard=(índice, total) solo devuelve los usuarios de esa partición"""
+        try:
+            condition, params = self._segment_condition(segment, value)
+            if shard:
+                condition += ' AND ABS(chat_id) % ? = ?'
+                params = params + [shard[1], shard[0]]
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT chat_id, plan FROM users
+                    WHERE is_active = 1 AND chat_id > ? {condition}
+                    ORDER BY chat_id
+                    LIMIT ?
+                ''', [after_chat_id] + params + [limit])
+                return [UserRef(row[0], row[1]) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"Error getting users chunk ({segment}) after {after_chat_id}: {e}")
+            return []
+    
+    def iter_users(self, segment: str = 'all', value=None, chunk_size: int = USERS_CHUNK_SIZE,
+                   shard: Tuple[int, int] = None) -> Iterator[UserRef]:
+        """Recorre los usuarios activos de un segmento en bloques paginados por chat_id (keyset).
+        Segmentos: 'all', 'premium', 'free', 'league' (value=league_id), 'inactive' (value=días)"""
+        after = MIN_CHAT_ID
+        while True:
+            chunk = self._get_users_chunk(after, segment, value, chunk_size, shard)
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1].chat_id
+    
+    async def aiter_users(self, segment: str = 'all', value=None, chunk_size: int = USERS_CHUNK_SIZE,
+                          shard: Tuple[int, int] = None) -> AsyncIterator[UserRef]:
+        """Versión asíncrona de iter_users: cada bloque se lee en un hilo sin bloquear el event loop"""
+        after = MIN_CHAT_ID
+        while True:
+            chunk = await asyncio.to_thread(self._get_users_chunk, after, segment, value, chunk_size, shard)
+            for user in chunk:
+                yield user
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1].chat_id
+    
+    def expire_lapsed_plans(self) -> int:
+        """Pasa a gratuito todos los planes vencidos con un único UPDATE
+        y registra un evento 'expired' por cada uno.
+        Los eventos y el contador salen de las filas que devuelve el UPDATE: si dos procesos
+        barren a la vez, cada plan vencido lo cambia (y lo cuenta) uno solo"""
+        now = datetime.now().isoformat()
+        lapsed = "plan != 'gratuito' AND plan_expires_at IS NOT NULL AND plan_expires_at < ?"
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                # Solo para el plan anterior del evento (RETURNING devuelve el valor nuevo)
+                cursor.execute(f'SELECT chat_id, plan FROM users WHERE {lapsed}', (now,))
+                previous_plans = dict(cursor.fetchall())
+                cursor.execute(f'''
+                    UPDATE users SET plan = 'gratuito', plan_expires_at = NULL
+                    WHERE {lapsed}
+                    RETURNING chat_id, is_active
+                ''', (now,))
+                changed = cursor.fetchall()
+                expired = len(changed)
+                if changed:
+                    cursor.executemany(
+                        "INSERT INTO plan_events (chat_id, event_type, plan) VALUES (?, 'expired', ?)",
+                        [(chat_id, previous_plans.get(chat_id, 'premium')) for chat_id, _ in changed]
+                    )
+                active_expired = sum(1 for _, is_active in changed if is_active)
+                if active_expired:
+                    self._bump(cursor, 'premium_users', -active_expired)
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error expiring lapsed plans: {e}")
+            return 0
+        
+        # Mantener la caché coherente: descartar los planes que ya vencieron
+        with self._plan_cache_lock:
+            for chat_id, (plan, expires_at, _) in list(self._plan_cache.items()):
+                if plan != 'gratuito' and expires_at and expires_at < now:
+                    del self._plan_cache[chat_id]
+        
+        return expired
+    
+    def get_pending_plan_events(self, limit: int = 500) -> List[Dict]:
+        """Obtiene los eventos de planes que todavía no se notificaron"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, chat_id, event_type, plan FROM plan_events
+                    WHERE notified = 0
+                    ORDER BY id
+                    LIMIT ?
+                ''', (limit,))
                 return [
                     {
-                        'chat_id': row[0],
-                        'username': row[1],
-                        'first_name': row[2],
-                        'plan': row[3],
-                        'created_at': row[4],
-                        'last_activity': row[5]
+                        'id': row[0],
+                        'chat_id': row[1],
+                        'event_type': row[2],
+                        'plan': row[3]
                     }
                     for row in cursor.fetchall()
                 ]
         except Exception as e:
-            logging.error(f"Error getting all users: {e}")
+            logging.error(f"Error getting pending plan events: {e}")
+            return []
+    
+    def mark_plan_events_notified(self, event_ids: List[int]):
+        """Marca eventos de planes como notificados"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('UPDATE plan_events SET notified = 1 WHERE id = ?',
+                                   [(event_id,) for event_id in event_ids])
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error marking plan events notified: {e}")
+    
+    def mark_event_notified(self, event_key: str) -> bool:
+        """Registra un evento en vivo como notificado.
+        Devuelve False si otro proceso ya lo había notificado"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO notified_events (event_key) VALUES (?)
+                    ON CONFLICT DO NOTHING
+                ''', (event_key,))
+                conn.commit()
+                return cursor.rowcount == 1
+        except Exception as e:
+            logging.error(f"Error marking event {event_key} notified: {e}")
+            return False
+    
+    def acquire_leader_lock(self, name: str, holder: str, ttl_seconds: int) -> bool:
+        """Toma o renueva un lock con vencimiento entre procesos.
+        Devuelve True si holder queda como líder por ttl_seconds más"""
+        now = datetime.now()
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO leader_locks (name, holder, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET
+                        holder = excluded.holder,
+                        expires_at = excluded.expires_at
+                    WHERE leader_locks.holder = excluded.holder OR leader_locks.expires_at < ?
+                ''', (name, holder, (now + timedelta(seconds=ttl_seconds)).isoformat(), now.isoformat()))
+                conn.commit()
+                return cursor.rowcount == 1
+        except Exception as e:
+            logging.error(f"Error acquiring leader lock {name}: {e}")
+            return False
+    
+    def release_leader_lock(self, name: str, holder: str):
+        """Libera el lock si todavía pertenece a holder"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM leader_locks WHERE name = ? AND holder = ?', (name, holder))
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error releasing leader lock {name}: {e}")
+    
+    def get_runtime_config_version(self) -> Optional[int]:
+        """Última versión de la configuración en caliente (0 si nunca se cambió)"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COALESCE(MAX(version), 0) FROM runtime_config')
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logging.error(f"Error reading runtime config version: {e}")
+            return None
+    
+    def get_runtime_config(self) -> Optional[Tuple[int, Dict[str, str]]]:
+        """(última versión, valor JSON vigente de cada clave)"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT key, value, version FROM runtime_config
+                    WHERE version IN (SELECT MAX(version) FROM runtime_config GROUP BY key)
+                ''')
+                rows = cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Error reading runtime config: {e}")
+            return None
+        return max((row[2] for row in rows), default=0), {row[0]: row[1] for row in rows}
+    
+    def set_runtime_config(self, key: str, value: str, updated_by: int = None) -> Optional[int]:
+        """Guarda un valor nuevo de la configuración en caliente y devuelve su versión"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO runtime_config (key, value, updated_by) VALUES (?, ?, ?)
+                    RETURNING version
+                ''', (key, value, updated_by))
+                version = cursor.fetchone()[0]
+                conn.commit()
+                return version
+        except Exception as e:
+            logging.error(f"Error saving runtime config {key}: {e}")
+            return None
+    
+    def get_runtime_config_history(self, limit: int = 10) -> List[Dict]:
+        """Últimos cambios de la configuración en caliente"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT version, key, value, updated_by, updated_at FROM runtime_config
+                    ORDER BY version DESC LIMIT ?
+                ''', (limit,))
+                rows = cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Error reading runtime config history: {e}")
             return []
+        return [
+            {'version': row[0], 'key': row[1], 'value': row[2], 'updated_by': row[3], 'updated_at': row[4]}
+            for row in rows
+        ]
+    
+    def get_cached_response(self, cache_key: str) -> Optional[Tuple[str, str]]:
+        """Obtiene una respuesta de la API guardada por cualquier proceso: (payload JSON, fetched_at)"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT payload, fetched_at FROM api_cache WHERE cache_key = ?', (cache_key,))
+                return cursor.fetchone()
+        except Exception as e:
+            logging.error(f"Error reading cached response: {e}")
+            return None
+    
+    def set_cached_response(self, cache_key: str, payload: str, fetched_at: datetime):
+        """Guarda la última respuesta válida de la API para el resto de los procesos"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO api_cache (cache_key, payload, fetched_at) VALUES (?, ?, ?)
+                    ON CONFLICT (cache_key) DO UPDATE SET
+                        payload = excluded.payload,
+                        fetched_at = excluded.fetched_at
+                ''', (cache_key, payload, fetched_at.isoformat()))
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error saving cached response: {e}")
+    
+    def record_api_request(self, day: str, minute: str) -> Optional[Tuple[int, int]]:
+        """Cuenta una llamada a la API y devuelve las de todos los procesos: (del día, del minuto)"""
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO api_usage (period, used) VALUES (?, 1)
+                    ON CONFLICT (period) DO UPDATE SET used = api_usage.used + 1
+                ''', [(day,), (minute,)])
+                conn.commit()
+                return self._api_usage(cursor, day, minute)
+        except Exception as e:
+            logging.error(f"Error recording API usage: {e}")
+            return None
+    
+    def get_api_usage(self, day: str, minute: str) -> Optional[Tuple[int, int]]:
+        """Llamadas a la API de todos los procesos: (del día, del minuto)"""
+        try:
+            with self.backend.connect() as conn:
+                return self._api_usage(conn.cursor(), day, minute)
+        except Exception as e:
+            logging.error(f"Error reading API usage: {e}")
+            return None
+    
+    @staticmethod
+    def _api_usage(cursor, day: str, minute: str) -> Tuple[int, int]:
+        cursor.execute('SELECT period, used FROM api_usage WHERE period IN (?, ?)', (day, minute))
+        used = dict(cursor.fetchall())
+        return used.get(day, 0), used.get(minute, 0)
+    
+    def prune_shared_state(self, events_days: int, cache_hours: int):
+        """Borra los eventos notificados, las respuestas en caché y la cuenta de llamadas a la
+        API que ya no se usan"""
+        now = datetime.now()
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                # created_at usa el formato de CURRENT_TIMESTAMP (UTC)
+                cursor.execute('DELETE FROM notified_events WHERE created_at < ?',
+                               ((utc_now() - timedelta(days=events_days)).strftime(TIMESTAMP_FORMAT),))
+                cursor.execute('DELETE FROM api_cache WHERE fetched_at < ?',
+                               ((now - timedelta(hours=cache_hours)).isoformat(),))
+                # Los minutos de hoy ('YYYY-MM-DDTHH:MM') quedan después de la fecha de hoy
+                cursor.execute('DELETE FROM api_usage WHERE period < ?', (utc_today().isoformat(),))
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error pruning shared state: {e}")
     
     def get_stats(self) -> Dict:
-        """Obtiene estadísticas generales del bot"""
+        """Obtiene estadísticas generales del bot desde los contadores incrementales"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
+            with self.backend.connect() as conn:
                 cursor = conn.cursor()
+                today = utc_today().isoformat()
                 
-                # Total usuarios
-                cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 1')
-                total_users = cursor.fetchone()[0]
-                
-                # Usuarios premium
-                cursor.execute('SELECT COUNT(*) FROM users WHERE plan != "gratuito" AND is_active = 1')
-                premium_users = cursor.fetchone()[0]
-                
-                # Consultas hoy
-                today = datetime.now().date()
-                cursor.execute('SELECT COUNT(*) FROM daily_queries WHERE query_date = ?', (today.isoformat(),))
-                queries_today = cursor.fetchone()[0]
-                
-                # Usuarios activos hoy
                 cursor.execute('''
-                    SELECT COUNT(DISTINCT chat_id) FROM daily_queries 
-                    WHERE query_date = ?
-                ''', (today.isoformat(),))
-                active_today = cursor.fetchone()[0]
+                    SELECT name, value FROM metrics_counters
+                    UNION ALL
+                    SELECT name, value FROM daily_counters WHERE date = ?
+                ''', (today,))
+                counters = dict(cursor.fetchall())
+                
+                total_users = counters.get('total_users', 0)
+                premium_users = counters.get('premium_users', 0)
                 
                 return {
                     'total_users': total_users,
                     'premium_users': premium_users,
-                    'queries_today': queries_today,
-                    'active_today': active_today,
+                    'queries_today': counters.get('queries', 0),
+                    'active_today': counters.get('active_users', 0),
                     'premium_percentage': (premium_users / total_users * 100) if total_users > 0 else 0
                 }
         except Exception as e:
             logging.error(f"Error getting stats: {e}")
             return {}
     
-    def backup_database(self):
-        """Crea un backup de la base de datos"""
+    def snapshot_daily_metrics(self):
+        """Guarda la foto del día en daily_metrics y cierra con los contadores finales la de ayer"""
+        today = utc_today()
+        yesterday = (today - timedelta(days=1)).isoformat()
         try:
-            import shutil
-            from datetime import datetime
-            backup_file = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-            shutil.copy2(self.db_file, backup_file)
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO daily_metrics (date, total_users, premium_users, queries, active_users)
+                    SELECT ?,
+                        (SELECT value FROM metrics_counters WHERE name = 'total_users'),
+                        (SELECT value FROM metrics_counters WHERE name = 'premium_users'),
+                        COALESCE((SELECT value FROM daily_counters WHERE date = ? AND name = 'queries'), 0),
+                        COALESCE((SELECT value FROM daily_counters WHERE date = ? AND name = 'active_users'), 0)
+                    WHERE true
+                    ON CONFLICT (date) DO UPDATE SET
+                        total_users = excluded.total_users,
+                        premium_users = excluded.premium_users,
+                        queries = excluded.queries,
+                        active_users = excluded.active_users
+                ''', (today.isoformat(), today.isoformat(), today.isoformat()))
+                cursor.execute('''
+                    UPDATE daily_metrics SET
+                        queries = COALESCE((SELECT value FROM daily_counters WHERE date = ? AND name = 'queries'), queries),
+                        active_users = COALESCE((SELECT value FROM daily_counters WHERE date = ? AND name = 'active_users'), active_users)
+                    WHERE date = ?
+                ''', (yesterday, yesterday, yesterday))
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Error saving daily metrics snapshot: {e}")
+    
+    def compact_daily_queries(self, retention_days: int, archive: bool = False) -> int:
+        """Resume en usage_stats (por usuario, día y liga) las consultas con más de
+        retention_days días y las borra de daily_queries. Procesa un día por transacción"""
+        cutoff = (utc_today() - timedelta(days=retention_days)).isoformat()
+        compacted = 0
+        try:
+            with self.backend.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT DISTINCT query_date FROM daily_queries
+                    WHERE query_date < ? ORDER BY query_date
+                ''', (cutoff,))
+                dates = [row[0] for row in cursor.fetchall()]
+                
+                for date in dates:
+                    cursor.execute('''
+                        INSERT INTO usage_stats (chat_id, date, league_id, queries_count)
+                        SELECT chat_id, query_date, league_id, COUNT(*) FROM daily_queries
+                        WHERE query_date = ?
+                        GROUP BY chat_id, league_id
+                    ''', (date,))
+                    if archive:
+                        cursor.execute('''
+                            INSERT INTO daily_queries_archive
+                            SELECT * FROM daily_queries WHERE query_date = ?
+                        ''', (date,))
+                    cursor.execute('DELETE FROM daily_queries WHERE query_date = ?', (date,))
+                    compacted += cursor.rowcount
+                    cursor.execute('DELETE FROM daily_active_users WHERE date = ?', (date,))
+                    conn.commit()
+        except Exception as e:
+            logging.error(f"Error compacting daily queries: {e}")
+        return compacted
+    
+    def incremental_vacuum(self, pages: int):
+        """Devuelve al sistema hasta `pages` páginas libres del archivo"""
+        try:
+            self.backend.incremental_vacuum(pages)
+        except Exception as e:
+            logging.error(f"Error running incremental vacuum: {e}")
+    
+    def backup_database(self, backup_dir: str = '.', compress: bool = False, keep: int = 0,
+                        pages_per_step: int = 256, step_pause: float = 0.01) -> Optional[str]:
+        """Crea un backup consistente con el backup online del backend (API de backup de SQLite).
+        Copia pages_per_step páginas por paso con una pausa entre pasos para no frenar las escrituras;
+        opcionalmente lo comprime con gzip y conserva solo los últimos `keep` backups"""
+        try:
+            os.makedirs(backup_dir, exist_ok=True)
+            backup_file = os.path.join(backup_dir, f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+            
+            self.backend.backup(backup_file, pages_per_step, step_pause)
+            
+            if compress:
+                with open(backup_file, 'rb') as raw, gzip.open(f"{backup_file}.gz", 'wb') as packed:
+                    shutil.copyfileobj(raw, packed)
+                os.remove(backup_file)
+                backup_file = f"{backup_file}.gz"
+            
             logging.info(f"Database backup created: {backup_file}")
+            if keep:
+                self._rotate_backups(backup_dir, keep)
+            return backup_file
         except Exception as e:
             logging.error(f"Error creating backup: {e}")
+            return None
+    
+    def _rotate_backups(self, backup_dir: str, keep: int):
+        """Borra los backups más viejos dejando los últimos `keep`"""
+        backups = sorted(
+            name for name in os.listdir(backup_dir)
+            if name.startswith('backup_') and (name.endswith('.db') or name.endswith('.db.gz'))
+        )
+        for name in backups[:-keep]:
+            try:
+                os.remove(os.path.join(backup_dir, name))
+            except OSError as e:
+                logging.error(f"Error removing old backup {name}: {e}")
 
-# Instancia global de la base de datos
-db = Database() 
\ No newline at end of file
+# Instancia global de la base de datos: se conecta y crea las tablas en el primer uso
+db = Lazy('db', lambda: Database(DATABASE_CONFIG['file'], create_backend(DATABASE_CONFIG)))
@@ -0,0 +1,51 @@
+import json
+from typing import List
+from models import Fixture
+
+try:
+    import ijson  # Parser incremental opcional (pip install ijson)
+except ImportError:
+    ijson = None
+
+# Ruta en el JSON de cada campo que se extrae
+_PREFIJOS = {
+    'response.item.fixture.id': 'fixture_id',
+    'response.item.fixture.date': 'date',
+    'response.item.fixture.status.short': 'status',
+    'response.item.league.id': 'league_id',
+    'response.item.teams.home.id': 'home_id',
+    'response.item.teams.home.name': 'home_name',
+    'response.item.teams.away.id': 'away_id',
+    'response.item.teams.away.name': 'away_name',
+    'response.item.goals.home': 'goals_home',
+    'response.item.goals.away': 'goals_away'
+}
+_CAMPOS_SIN_VALOR = dict.fromkeys(Fixture.__slots__)
+
+def parse_fixtures_stream(stream) -> List[Fixture]:
+    """Recorre los eventos de ijson y arma un Fixture por partido sin decodificar el resto"""
+    fixtures = []
+    current = None
+
+    for prefix, event, value in ijson.parse(stream):
+        if prefix == 'response.item':
+            if event == 'start_map':
+                current = dict(_CAMPOS_SIN_VALOR)
+            elif event == 'end_map':
+                fixtures.append(Fixture(**current))
+                current = None
+        elif current is not None:
+            field = _PREFIJOS.get(prefix)
+            if field:
+                current[field] = value
+
+    return fixtures
+
+def parse_fixtures_response(response) -> List[Fixture]:
+    """Parser de respuestas de /fixtures para ApiFootballClient"""
+    if ijson is not None:
+        response.raw.decode_content = True
+        return parse_fixtures_stream(response.raw)
+
+    # Sin ijson: decodificar y descartar el payload completo en cuanto se compacta
+    return [Fixture.from_api(fixture) for fixture in json.loads(response.content)['response']]
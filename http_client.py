@@ -0,0 +1,207 @@
+import asyncio
+import requests
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Optional
+from config import HTTP_CONFIG
+from metrics import API_RESPONSES, API_SECONDS
+from startup import Lazy
+
+# Estados del circuit breaker
+CIRCUITO_CERRADO = 'closed'
+CIRCUITO_ABIERTO = 'open'
+CIRCUITO_SEMIABIERTO = 'half_open'
+
+class CircuitBreaker:
+    """Corta las llamadas a un endpoint tras varios fallos consecutivos"""
+
+    def __init__(self, max_failures: int, reset_seconds: float):
+        self.max_failures = max_failures
+        self.reset_seconds = reset_seconds
+        self.state = CIRCUITO_CERRADO
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Indica si se puede intentar una llamada; tras el reset deja pasar una de prueba"""
+        with self._lock:
+            if self.state == CIRCUITO_ABIERTO:
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    return False
+                self.state = CIRCUITO_SEMIABIERTO
+                return True
+            if self.state == CIRCUITO_SEMIABIERTO:
+                # Solo una llamada de prueba a la vez
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CIRCUITO_CERRADO
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == CIRCUITO_SEMIABIERTO or self.failures >= self.max_failures:
+                if self.state != CIRCUITO_ABIERTO:
+                    logging.warning(f"Circuito abierto tras {self.failures} fallos")
+                self.state = CIRCUITO_ABIERTO
+                self.opened_at = time.monotonic()
+
+class ResilientHttpClient:
+    """Cliente HTTP síncrono: bloquea el hilo que lo llama durante los timeouts y las esperas
+    entre reintentos (time.sleep). Nunca se llama desde el hilo de un event loop: el código async
+    lo usa con asyncio.to_thread (o run_in_executor)"""
+    
+    def __init__(self, config: Dict = None):
+        self.config = config or HTTP_CONFIG
+        self.session = requests.Session()
+        self.timeout = (self.config['timeout_conexion'], self.config['timeout_lectura'])
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.metrics: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=self.config['workers_hedge'],
+            thread_name_prefix='http-hedge'
+        )
+        self._loop_warned = set()
+    
+    def _check_not_on_loop(self, endpoint: str):
+        """Avisa (una vez por endpoint, con la pila) si se lo llama desde un event loop"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if endpoint not in self._loop_warned:
+            self._loop_warned.add(endpoint)
+            logging.error("GET %s llamado desde el event loop: lo bloquea; usar asyncio.to_thread",
+                          endpoint, stack_info=True)
+
+    def _breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(
+                    self.config['breaker_fallos'],
+                    self.config['breaker_reset_segundos']
+                )
+            return self.breakers[endpoint]
+
+    def _count(self, endpoint: str, outcome: str):
+        with self._lock:
+            self.metrics[endpoint][outcome] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial con jitter completo"""
+        cap = min(self.config['backoff_max'], self.config['backoff_base'] * 2 ** attempt)
+        return random.uniform(0, cap)
+
+    def _send(self, url: str, headers: Dict, params: Dict, stream: bool,
+              on_attempt: Optional[Callable]) -> requests.Response:
+        if on_attempt:
+            on_attempt()
+        return self.session.get(url, headers=headers, params=params, timeout=self.timeout, stream=stream)
+
+    def _send_hedged(self, endpoint: str, url: str, headers: Dict, params: Dict, stream: bool,
+                     on_attempt: Optional[Callable]) -> requests.Response:
+        """Lanza una segunda request si la primera tarda más que hedge_delay y usa la primera en responder"""
+        primary = self._hedge_executor.submit(self._send, url, headers, params, stream, on_attempt)
+        done, _ = wait([primary], timeout=self.config['hedge_delay'])
+        if done:
+            return primary.result()
+
+        self._count(endpoint, 'hedged')
+        secondary = self._hedge_executor.submit(self._send, url, headers, params, stream, on_attempt)
+        pending = {primary, secondary}
+        error = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except requests.RequestException as e:
+                    error = e
+                    continue
+                if future is secondary:
+                    self._count(endpoint, 'hedge_won')
+                # Cerrar la respuesta perdedora cuando termine
+                for other in pending:
+                    other.add_done_callback(
+                        lambda f: f.exception() is None and f.result().close()
+                    )
+                return response
+
+        raise error
+
+    def get(self, url: str, endpoint: str, headers: Dict = None, params: Dict = None,
+            hedge: bool = False, stream: bool = False,
+            on_attempt: Callable = None) -> Optional[requests.Response]:
+        """GET con timeouts, reintentos con jitter y circuit breaker por endpoint.
+        Devuelve None si el circuito está abierto o se agotaron los reintentos"""
+        self._check_not_on_loop(endpoint)
+        breaker = self._breaker(endpoint)
+        retries = self.config['reintentos']
+
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                self._count(endpoint, 'circuit_open')
+                return None
+
+            if attempt > 0:
+                self._count(endpoint, 'retry')
+                time.sleep(self._backoff(attempt))
+
+            start = time.perf_counter()
+            try:
+                if hedge:
+                    response = self._send_hedged(endpoint, url, headers, params, stream, on_attempt)
+                else:
+                    response = self._send(url, headers, params, stream, on_attempt)
+            except requests.Timeout as e:
+                API_RESPONSES.inc(endpoint=endpoint, status='timeout')
+                breaker.record_failure()
+                self._count(endpoint, 'timeout')
+                logging.warning("Timeout en %s (intento %d): %s", endpoint, attempt + 1, e)
+                continue
+            except requests.ConnectionError as e:
+                API_RESPONSES.inc(endpoint=endpoint, status='connection_error')
+                breaker.record_failure()
+                self._count(endpoint, 'connection_error')
+                logging.warning("Error de conexión en %s (intento %d): %s", endpoint, attempt + 1, e)
+                continue
+            finally:
+                API_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            API_RESPONSES.inc(endpoint=endpoint, status=response.status_code)
+
+            if response.status_code >= 500:
+                breaker.record_failure()
+                self._count(endpoint, 'server_error')
+                if attempt < retries:
+                    response.close()
+                    continue
+                return response
+
+            breaker.record_success()
+            self._count(endpoint, 'ok' if response.status_code < 400 else 'client_error')
+            return response
+
+        self._count(endpoint, 'gave_up')
+        return None
+
+    def get_metrics(self) -> Dict[str, Dict[str, int]]:
+        """Contadores de resultados por endpoint y estado de cada circuito"""
+        with self._lock:
+            return {
+                endpoint: dict(counts, circuit=self.breakers[endpoint].state
+                               if endpoint in self.breakers else CIRCUITO_CERRADO)
+                for endpoint, counts in self.metrics.items()
+            }
+
+# Instancia global del cliente HTTP
+http = Lazy('http', ResilientHttpClient)
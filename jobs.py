@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from config import CACHE_CONFIG, DATABASE_CONFIG, JOBS_CONFIG, MENSAJES, RETENTION_CONFIG, WEBHOOK_CONFIG
+from database import db
+
+# Identidad de esta instancia en los locks de los jobs
+_HOLDER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def run_periodic(name: str, job, interval_seconds: float, *args, first_delay: float = 0):
+    """Ejecuta un job cada interval_seconds; los jobs síncronos corren en un hilo.
+    Con varias instancias (--role all|monitor), solo corre en la que tiene el lock job:<name>:
+    la que lo tiene lo renueva en cada corrida y otra lo toma si deja de renovarlo"""
+    await asyncio.sleep(first_delay)
+    ttl = interval_seconds + JOBS_CONFIG['lock_margen_segundos']
+    while True:
+        try:
+            if not await asyncio.to_thread(db.acquire_leader_lock, f"job:{name}", _HOLDER, ttl):
+                logging.debug(f"Job {name}: lo corre otra instancia")
+            elif asyncio.iscoroutinefunction(job):
+                await job(*args)
+            else:
+                await asyncio.to_thread(job, *args)
+        except Exception as e:
+            logging.error(f"Error en job {name}: {e}")
+        await asyncio.sleep(interval_seconds)
+
+async def sweep_expired_plans(application):
+    """Vence en bloque los planes expirados y envía los recordatorios de renovación"""
+    expired = await asyncio.to_thread(db.expire_lapsed_plans)
+    if expired:
+        logging.info(f"Planes vencidos: {expired}")
+
+    events = await asyncio.to_thread(db.get_pending_plan_events)
+    notified = []
+    for event in events:
+        if event['event_type'] == 'expired':
+            try:
+                await application.bot.send_message(
+                    chat_id=event['chat_id'],
+                    text=MENSAJES['plan_vencido']
+                )
+                await asyncio.sleep(0.1)
+            except Exception as e:
+                logging.error(f"Error enviando recordatorio de renovación a {event['chat_id']}: {e}")
+        notified.append(event['id'])
+
+    if notified:
+        await asyncio.to_thread(db.mark_plan_events_notified, notified)
+
+def compact_usage_data():
+    """Resume y borra las consultas viejas de daily_queries y libera espacio del archivo"""
+    compacted = db.compact_daily_queries(
+        RETENTION_CONFIG['dias_daily_queries'],
+        RETENTION_CONFIG['archivar']
+    )
+    if compacted:
+        logging.info(f"Consultas compactadas en usage_stats: {compacted}")
+    db.prune_shared_state(WEBHOOK_CONFIG['dias_eventos_notificados'], CACHE_CONFIG['max_stale_horas'])
+    db.incremental_vacuum(RETENTION_CONFIG['paginas_vacuum'])
+
+def backup_database():
+    """Backup online de la base con rotación según DATABASE_CONFIG"""
+    db.backup_database(
+        DATABASE_CONFIG['backup_dir'],
+        compress=DATABASE_CONFIG['backup_compress'],
+        keep=DATABASE_CONFIG['backup_keep'],
+        pages_per_step=DATABASE_CONFIG['backup_pages_por_paso'],
+        step_pause=DATABASE_CONFIG['backup_pausa_segundos']
+    )
+
+def next_backup_delay(interval_seconds: float) -> float:
+    """Segundos hasta el próximo backup según el más nuevo de backup_dir: si ya venció (o no
+    hay ninguno) se hace al arrancar, así los reinicios frecuentes no lo postergan"""
+    backup_dir = DATABASE_CONFIG['backup_dir']
+    try:
+        newest = max(
+            (entry.stat().st_mtime for entry in os.scandir(backup_dir)
+             if entry.name.startswith('backup_') and (entry.name.endswith('.db') or entry.name.endswith('.db.gz'))),
+            default=None
+        )
+    except OSError:
+        newest = None
+    if newest is None:
+        return 0
+    return max(interval_seconds - (time.time() - newest), 0)
+
+def schedule_jobs(application):
+    """Programa las tareas periódicas del bot en el event loop actual"""
+    loop = asyncio.get_event_loop()
+    loop.create_task(run_periodic(
+        'vencimiento_planes', sweep_expired_plans,
+        JOBS_CONFIG['vencimiento_planes_minutos'] * 60, application
+    ))
+    loop.create_task(run_periodic(
+        'metricas_diarias', db.snapshot_daily_metrics,
+        JOBS_CONFIG['metricas_diarias_minutos'] * 60
+    ))
+    loop.create_task(run_periodic(
+        'retencion_consultas', compact_usage_data,
+        RETENTION_CONFIG['intervalo_horas'] * 3600
+    ))
+    # PostgreSQL no tiene backup desde el bot (se respalda con las herramientas del servidor)
+    if db.backend.supports_backup:
+        backup_interval = DATABASE_CONFIG['backup_interval'] * 3600
+        loop.create_task(run_periodic(
+            'backup', backup_database, backup_interval, first_delay=next_backup_delay(backup_interval)
+        ))
+    else:
+        logging.info(f"Backup periódico deshabilitado: el backend {db.backend.name} no lo soporta")
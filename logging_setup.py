@@ -0,0 +1,150 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from config import LOGGING_CONFIG
+from metrics import LOG_DROPPED
+
+# Id de correlación del update (o del envío masivo) que se está procesando
+correlation_id: contextvars.ContextVar = contextvars.ContextVar('correlation_id', default='-')
+
+# Atributos estándar de LogRecord: el resto son campos extra del registro
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'correlation_id'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+class _CorrelationFilter(logging.Filter):
+    """Copia el id de correlación al registro en el hilo que loguea"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea con los campos extra del registro"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+            'process': record.processName,
+            'pid': record.process
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo que loguea: el mensaje se arma en el listener.
+    Los argumentos se conservan tal cual, así que no deben mutarse después de loguear"""
+    
+    def enqueue(self, record: logging.LogRecord):
+        # Con la cola llena se descarta el registro antes que frenar al event loop
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # El traceback referencia frames vivos: se convierte a texto antes de encolarlo
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def _log_file(process_name: Optional[str]) -> str:
+    """Archivo por proceso: la rotación no es segura con varios procesos escribiendo el mismo"""
+    path = LOGGING_CONFIG['archivo']
+    if not process_name:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}-{process_name}{ext}"
+
+def setup_logging(process_name: Optional[str] = None):
+    """Configura el logging del proceso: los handlers de consola y archivo rotado corren en un
+    hilo aparte y el código que loguea solo encola el registro"""
+    global _listener
+    if _listener is not None:
+        return
+    
+    handlers = []
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(JsonFormatter() if LOGGING_CONFIG['json'] else logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+    ))
+    handlers.append(console)
+    
+    if LOGGING_CONFIG['archivo']:
+        path = _log_file(process_name)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        rotating = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOGGING_CONFIG['max_bytes'], backupCount=LOGGING_CONFIG['backups'], encoding='utf-8'
+        )
+        rotating.setFormatter(JsonFormatter())
+        handlers.append(rotating)
+    
+    log_queue = queue.Queue(LOGGING_CONFIG['cola_max'])
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(_CorrelationFilter())
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOGGING_CONFIG['nivel'])
+    # httpx loguea cada request a Telegram en INFO
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Vacía la cola y detiene el hilo de escritura"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class LogSampler:
+    """Muestreo de eventos de alto volumen: registra los primeros `first` de cada clave y
+    después uno de cada `every`, informando cuántos se omitieron desde el último"""
+    
+    def __init__(self, first: int = None, every: int = None):
+        self.first = first if first is not None else LOGGING_CONFIG['muestreo_primeros']
+        self.every = every if every is not None else LOGGING_CONFIG['muestreo_cada']
+        self._counts = {}
+        self._lock = threading.Lock()
+    
+    def check(self, key: str) -> Tuple[bool, int]:
+        """(si hay que loguear, eventos omitidos desde el último registrado)"""
+        with self._lock:
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+        if count <= self.first:
+            return True, 0
+        if (count - self.first) % self.every == 0:
+            return True, self.every - 1
+        return False, 0
+    
+    def pop(self, key: str) -> int:
+        """Cierra la clave (p. ej. al terminar un envío) y devuelve cuántos eventos tuvo"""
+        with self._lock:
+            return self._counts.pop(key, 0)
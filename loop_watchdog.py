@@ -0,0 +1,144 @@
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+from config import ADMIN_CONFIG, WATCHDOG_CONFIG
+from metrics import LOOP_LAG, LOOP_STALLS
+
+class LoopWatchdog:
+    """Mide continuamente el atraso del event loop y reporta los bloqueos.
+    Una tarea del loop marca un latido cada `intervalo_ms` y registra cuánto tardó en despertar
+    (event_loop_lag_seconds). Un hilo aparte vigila el latido: si se atrasa más que el umbral,
+    toma la pila del hilo del loop para saber qué corrutina lo está bloqueando, y al terminar el
+    bloqueo lo loguea, lo cuenta por corrutina y, si supera el umbral de alerta, avisa al log_channel.
+    Es la única medición de bloqueos del proceso: el profiler toma los suyos de subscribe()"""
+    
+    def __init__(self, config: Dict = None):
+        self.config = config or WATCHDOG_CONFIG
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._bot = None
+        self._beat = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._last_alert = 0.0
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._listeners_lock = threading.Lock()
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+    
+    def subscribe(self, listener: Callable[[Dict], None]):
+        """Registra un callback que recibe cada bloqueo terminado (desde el hilo del watchdog):
+        corrutina, bloqueando, pila, inicio (time.monotonic) y duracion en segundos"""
+        with self._listeners_lock:
+            self._listeners.append(listener)
+    
+    def unsubscribe(self, listener: Callable[[Dict], None]):
+        with self._listeners_lock:
+            self._listeners.remove(listener)
+    
+    def start(self, bot=None):
+        """Arranca el watchdog en el event loop actual; bot se usa para las alertas"""
+        if not self.config['habilitado'] or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._bot = bot
+        self._beat = time.monotonic()
+        self._task = self._loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _heartbeat(self):
+        interval = self.config['intervalo_ms'] / 1000
+        while True:
+            self._beat = expected = time.monotonic()
+            await asyncio.sleep(interval)
+            LOOP_LAG.observe(max(0.0, time.monotonic() - expected - interval))
+    
+    def _watch(self):
+        interval = self.config['intervalo_ms'] / 1000
+        threshold = self.config['umbral_bloqueo_ms'] / 1000
+        stall = None
+        while not self._stop.wait(min(interval, threshold) / 2):
+            age = time.monotonic() - self._beat - interval
+            if age > threshold:
+                if stall is None:
+                    stall = self._describe_stall()
+                    stall['inicio'] = self._beat + interval
+                stall['duracion'] = age
+            elif stall is not None:
+                self._report(stall)
+                stall = None
+    
+    def _describe_stall(self) -> Dict:
+        """Corrutina en ejecución y pila del hilo del loop mientras está bloqueado"""
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return {'corrutina': 'desconocida', 'bloqueando': '', 'pila': ''}
+        
+        coroutine = None
+        current = frame
+        while current is not None:
+            code = current.f_code
+            if code.co_flags & inspect.CO_COROUTINE:
+                coroutine = getattr(code, 'co_qualname', code.co_name)
+                break
+            current = current.f_back
+        innermost = frame.f_code
+        return {
+            'corrutina': coroutine or 'callback sin corrutina',
+            'bloqueando': f"{innermost.co_name} ({innermost.co_filename}:{frame.f_lineno})",
+            'pila': ''.join(traceback.format_stack(frame)[-self.config['frames_reporte']:])
+        }
+    
+    def _report(self, stall: Dict):
+        duration = stall['duracion']
+        LOOP_STALLS.inc(coroutine=stall['corrutina'])
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(stall)
+            except Exception as e:
+                logging.error(f"Error entregando un bloqueo del loop: {e}")
+        logging.warning(
+            "Event loop bloqueado %.0f ms en %s (%s)", duration * 1000, stall['corrutina'], stall['bloqueando'],
+            extra={'bloqueo_ms': round(duration * 1000), 'corrutina': stall['corrutina'], 'pila': stall['pila']}
+        )
+        
+        log_channel = ADMIN_CONFIG['log_channel']
+        now = time.monotonic()
+        if (self._bot is None or not log_channel
+                or duration * 1000 < self.config['umbral_alerta_ms']
+                or now - self._last_alert < self.config['alerta_cada_segundos']):
+            return
+        self._last_alert = now
+        mensaje = (
+            f"⚠️ Event loop bloqueado {duration:.1f} s\n"
+            f"Corrutina: {stall['corrutina']}\n"
+            f"Bloqueando en: {stall['bloqueando']}"
+        )
+        future = asyncio.run_coroutine_threadsafe(
+            self._bot.send_message(chat_id=log_channel, text=mensaje), self._loop
+        )
+        future.add_done_callback(self._alert_done)
+    
+    @staticmethod
+    def _alert_done(future):
+        if future.exception():
+            logging.error(f"Error enviando alerta de bloqueo del loop: {future.exception()}")
+
+# Instancia global del watchdog del proceso
+watchdog = LoopWatchdog()
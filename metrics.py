@@ -0,0 +1,256 @@
+import bisect
+import functools
+import inspect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+from config import METRICS_CONFIG
+
+# Límites de los buckets de latencia en segundos
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    kind = ''
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_value(key, value))
+        return lines
+    
+    def _render_value(self, key: Tuple, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def values(self) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def values(self) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+class Histogram(_Metric):
+    """Histograma acumulativo: conteo por bucket, suma y cantidad por combinación de labels"""
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry['buckets'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+    
+    def time(self, **labels):
+        """Context manager que observa la duración del bloque"""
+        return _Timer(self, labels)
+    
+    def _render_value(self, key: Tuple, value) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, value['buckets']):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {value['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {value['sum']}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {value['count']}")
+        return lines
+    
+    def summary(self) -> Dict[Tuple, Dict]:
+        """Cantidad, promedio y p95 aproximado (límite del bucket) por combinación de labels"""
+        with self._lock:
+            items = [(key, dict(value, buckets=list(value['buckets']))) for key, value in self._values.items()]
+        result = {}
+        for key, value in items:
+            count = value['count']
+            result[key] = {
+                'count': count,
+                'avg': value['sum'] / count if count else 0.0,
+                'p95': self._quantile(value, 0.95)
+            }
+        return result
+    
+    def _quantile(self, value: Dict, q: float) -> Optional[float]:
+        target = value['count'] * q
+        cumulative = 0
+        for bound, count in zip(self.buckets, value['buckets']):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return None  # Por encima del último bucket
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+    
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+    
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+    
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+    
+    def render(self) -> str:
+        """Todas las métricas en el formato de texto de Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# Registro global del proceso
+registry = Registry()
+
+# Métricas del camino caliente
+CALLBACK_SECONDS = registry.histogram('bot_callback_seconds', 'Duración de los handlers por ruta', ('route',))
+CALLBACK_ERRORS = registry.counter('bot_callback_errors_total', 'Handlers que terminaron con error', ('route',))
+API_SECONDS = registry.histogram('api_request_seconds', 'Latencia de API-Football por endpoint', ('endpoint',))
+API_RESPONSES = registry.counter('api_responses_total', 'Respuestas de API-Football por endpoint y estado',
+                                 ('endpoint', 'status'))
+API_CACHE = registry.counter('api_cache_requests_total', 'Lecturas de la caché de API por resultado',
+                             ('endpoint', 'result'))
+PLAN_CACHE = registry.counter('plan_cache_requests_total', 'Lecturas de la caché de planes', ('result',))
+DB_SECONDS = registry.histogram('db_query_seconds', 'Duración de los métodos de Database', ('method',))
+FANOUT_SECONDS = registry.histogram('alert_fanout_seconds', 'Duración del envío de una alerta a todos',
+                                    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+MESSAGES_SENT = registry.counter('messages_sent_total', 'Mensajes enviados por tipo y resultado',
+                                 ('kind', 'result'))
+SEND_RATE = registry.gauge('send_rate_per_second', 'Mensajes por segundo del último envío masivo', ('kind',))
+LOOP_LAG = registry.histogram('event_loop_lag_seconds', 'Atraso del event loop al despertar el latido',
+                              buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+LOOP_STALLS = registry.counter('event_loop_stalls_total', 'Bloqueos del event loop por corrutina', ('coroutine',))
+LOG_DROPPED = registry.counter('log_records_dropped_total', 'Registros de log descartados con la cola llena')
+STARTUP_SECONDS = registry.gauge('startup_phase_seconds', 'Duración de cada fase del arranque del proceso', ('phase',))
+
+def timed_methods(histogram: Histogram, include: Tuple[str, ...] = ()):
+    """Decorador de clase: mide cada método público (y los de include) con histogram{method}.
+    Los generadores se dejan sin medir porque su trabajo ocurre al iterarlos"""
+    def decorate(cls):
+        for name, function in list(vars(cls).items()):
+            if not inspect.isfunction(function):
+                continue
+            if name.startswith('_') and name not in include:
+                continue
+            if inspect.isgeneratorfunction(function) or inspect.isasyncgenfunction(function):
+                continue
+            setattr(cls, name, _timed(histogram, name, function))
+        return cls
+    return decorate
+
+def _timed(histogram: Histogram, name: str, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start, method=name)
+    return wrapper
+
+# Endpoints de control adicionales del servidor local: path -> handler(query) -> (status, content_type, body)
+_ROUTES: Dict[str, Callable[[Dict[str, str]], Tuple[int, str, bytes]]] = {}
+
+def add_route(path: str, handler: Callable[[Dict[str, str]], Tuple[int, str, bytes]]):
+    """Agrega un endpoint al servidor de métricas (solo escucha en la interfaz local)"""
+    _ROUTES[path] = handler
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/metrics':
+            status, content_type = 200, 'text/plain; version=0.0.4; charset=utf-8'
+            body = registry.render().encode('utf-8')
+        elif url.path in _ROUTES:
+            status, content_type, body = _ROUTES[url.path](dict(parse_qsl(url.query)))
+        else:
+            self.send_error(404)
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port_offset: int = 0) -> Optional[ThreadingHTTPServer]:
+    """Expone /metrics en un hilo. Cada proceso usa el puerto base + port_offset"""
+    if not METRICS_CONFIG['habilitado']:
+        return None
+    port = METRICS_CONFIG['port'] + port_offset
+    try:
+        server = ThreadingHTTPServer((METRICS_CONFIG['host'], port), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"No se pudo iniciar el endpoint de métricas en el puerto {port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logging.info(f"Métricas en http://{METRICS_CONFIG['host']}:{port}/metrics")
+    return server
@@ -0,0 +1,221 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+class Record:
+    """Base para registros con __slots__: repr, igualdad y conversión a dict"""
+    __slots__ = ()
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+class Fixture(Record):
+    """Campos de un partido que usa el bot, sin el resto del payload"""
+    __slots__ = ('fixture_id', 'date', 'status', 'league_id', 'home_id', 'home_name',
+                 'away_id', 'away_name', 'goals_home', 'goals_away')
+
+    def __init__(self, fixture_id: int, date: str, status: str, league_id: int,
+                 home_id: int, home_name: str, away_id: int, away_name: str,
+                 goals_home: Optional[int], goals_away: Optional[int]):
+        self.fixture_id = fixture_id
+        self.date = date
+        self.status = status
+        self.league_id = league_id
+        self.home_id = home_id
+        self.home_name = home_name
+        self.away_id = away_id
+        self.away_name = away_name
+        self.goals_home = goals_home
+        self.goals_away = goals_away
+
+    @classmethod
+    def from_api(cls, fixture: Dict) -> 'Fixture':
+        """Crea un Fixture a partir de un partido ya decodificado de la API"""
+        teams = fixture['teams']
+        return cls(
+            fixture['fixture']['id'],
+            fixture['fixture']['date'],
+            fixture['fixture']['status']['short'],
+            fixture['league']['id'],
+            teams['home']['id'],
+            teams['home']['name'],
+            teams['away']['id'],
+            teams['away']['name'],
+            fixture['goals']['home'],
+            fixture['goals']['away']
+        )
+
+class StandingRow(Record):
+    """Fila de la tabla de posiciones"""
+    __slots__ = ('position', 'team_name', 'team_logo', 'points', 'games_played', 'wins', 'draws',
+                 'losses', 'goals_for', 'goals_against', 'goal_difference', 'form')
+
+    def __init__(self, position: int, team_name: str, team_logo: str, points: int,
+                 games_played: int, wins: int, draws: int, losses: int,
+                 goals_for: int, goals_against: int, goal_difference: int, form: Optional[str]):
+        self.position = position
+        self.team_name = team_name
+        self.team_logo = team_logo
+        self.points = points
+        self.games_played = games_played
+        self.wins = wins
+        self.draws = draws
+        self.losses = losses
+        self.goals_for = goals_for
+        self.goals_against = goals_against
+        self.goal_difference = goal_difference
+        self.form = form
+
+    @property
+    def last_5(self) -> List[str]:
+        """Resultados de los últimos 5 partidos (W/D/L)"""
+        return list(self.form)[-5:] if self.form else []
+
+    @classmethod
+    def from_api(cls, team: Dict) -> 'StandingRow':
+        """Crea una fila a partir de un elemento de /standings"""
+        all_games = team['all']
+        return cls(
+            team['rank'],
+            team['team']['name'],
+            team['team']['logo'],
+            team['points'],
+            all_games['played'],
+            all_games['win'],
+            all_games['draw'],
+            all_games['lose'],
+            all_games['goals']['for'],
+            all_games['goals']['against'],
+            team['goalsDiff'],
+            team['form']
+        )
+
+class FormMatch(Record):
+    """Partido reciente de un equipo visto desde ese equipo"""
+    __slots__ = ('home_team', 'away_team', 'status', 'team_score', 'opponent_score', 'home_score', 'away_score')
+
+    def __init__(self, home_team: str, away_team: str, status: str, team_score: Optional[int],
+                 opponent_score: Optional[int], home_score: Optional[int], away_score: Optional[int]):
+        self.home_team = home_team
+        self.away_team = away_team
+        self.status = status
+        self.team_score = team_score
+        self.opponent_score = opponent_score
+        self.home_score = home_score
+        self.away_score = away_score
+
+    @property
+    def score(self) -> str:
+        return f"{self.home_score}-{self.away_score}"
+
+class TeamForm(Record):
+    """Forma reciente de un equipo"""
+    __slots__ = ('matches', 'wins', 'draws', 'losses', 'goals_for', 'goals_against')
+
+    def __init__(self):
+        self.matches: List[FormMatch] = []
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.goals_for = 0
+        self.goals_against = 0
+
+    @classmethod
+    def from_fixtures(cls, team_id: int, fixtures: List[Fixture]) -> 'TeamForm':
+        """Calcula la forma de un equipo a partir de sus últimos partidos"""
+        form = cls()
+        for match in fixtures:
+            is_home = match.home_id == team_id
+            team_score = match.goals_home if is_home else match.goals_away
+            opponent_score = match.goals_away if is_home else match.goals_home
+
+            if match.status == 'FT':
+                if team_score > opponent_score:
+                    form.wins += 1
+                elif team_score < opponent_score:
+                    form.losses += 1
+                else:
+                    form.draws += 1
+
+            # Partidos sin empezar no suman goles
+            form.goals_for += team_score or 0
+            form.goals_against += opponent_score or 0
+
+            form.matches.append(FormMatch(
+                match.home_name, match.away_name, match.status, team_score, opponent_score,
+                match.goals_home, match.goals_away
+            ))
+        return form
+
+class User(Record):
+    """Usuario del bot tal como está en la tabla users"""
+    __slots__ = ('chat_id', 'username', 'first_name', 'last_name', 'plan', 'plan_expires_at',
+                 'created_at', 'last_activity', 'is_active')
+
+    # Columnas en el orden que espera from_row
+    COLUMNS = ('chat_id, username, first_name, last_name, plan, plan_expires_at, '
+               'created_at, last_activity, is_active')
+
+    def __init__(self, chat_id: int, username: Optional[str], first_name: Optional[str],
+                 last_name: Optional[str], plan: str, plan_expires_at: Optional[str],
+                 created_at: Optional[str], last_activity: Optional[str], is_active: bool):
+        self.chat_id = chat_id
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.plan = plan
+        self.plan_expires_at = plan_expires_at
+        self.created_at = created_at
+        self.last_activity = last_activity
+        self.is_active = is_active
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'User':
+        """Crea un User a partir de una fila con las columnas de User.COLUMNS"""
+        return cls(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], bool(row[8]))
+
+class UserRef(Record):
+    """Lo mínimo de un usuario para enviarle mensajes"""
+    __slots__ = ('chat_id', 'plan')
+
+    def __init__(self, chat_id: int, plan: str):
+        self.chat_id = chat_id
+        self.plan = plan
+
+class UserContext(Record):
+    """Plan y consultas del día de un usuario, leídos una vez al empezar a procesar un update
+    y compartidos por los handlers de ese update"""
+    __slots__ = ('chat_id', 'plan', 'plan_expires_at', 'queries_today', 'daily_limit')
+    
+    def __init__(self, chat_id: int, plan: str, plan_expires_at: Optional[str],
+                 queries_today: int, daily_limit: int):
+        self.chat_id = chat_id
+        self.plan = plan
+        self.plan_expires_at = plan_expires_at
+        self.queries_today = queries_today
+        self.daily_limit = daily_limit
+    
+    @property
+    def is_premium(self) -> bool:
+        if not self.plan or self.plan == 'gratuito':
+            return False
+        return not self.plan_expires_at or datetime.fromisoformat(self.plan_expires_at) >= datetime.now()
+    
+    @property
+    def queries_remaining(self) -> Optional[int]:
+        """Consultas que le quedan hoy (None: sin límite)"""
+        if self.is_premium:
+            return None
+        return max(self.daily_limit - self.queries_today, 0)
+    
+    def can_query(self, cost: int = 1) -> bool:
+        """Verifica si puede hacer consultas que cuestan `cost` del límite diario"""
+        return not cost or self.is_premium or self.queries_today + cost <= self.daily_limit
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Tuple
+from config import MONITOREO_CONFIG
+from database import db
+from api_client import api, PRIORIDAD_LIVE
+from logging_setup import LogSampler, correlation_id
+from metrics import FANOUT_SECONDS, MESSAGES_SENT, SEND_RATE
+from runtime_config import runtime
+
+# Nombre del lock que elige al único proceso que consulta los partidos en vivo
+LEADER_LOCK = 'monitor'
+
+# Fallos de envío por usuario: se muestrean por alerta
+_failure_sampler = LogSampler()
+
+class LiveMonitor:
+    """Detecta eventos en vivo y los publica en una cola local que consumen los senders.
+    Con varias instancias del bot, solo la que tiene el lock de líder consulta la API.
+    Cada sender atiende una partición fija de usuarios (chat_id % senders) y recibe todas las
+    alertas en el orden en que se detectaron: un usuario nunca las recibe desordenadas"""
+    
+    def __init__(self, application):
+        self.application = application
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._shard_queues: List[asyncio.Queue] = []
+        self._tasks = []
+    
+    async def run(self):
+        """Renueva el lock de líder en cada vuelta y, si lo tiene, busca eventos nuevos"""
+        self.start_senders(MONITOREO_CONFIG['senders'])
+        try:
+            while True:
+                try:
+                    if await self._renew_leadership():
+                        await self.detect_events()
+                except Exception as e:
+                    logging.error(f"Error en monitoreo de eventos: {e}")
+                await self._wait_interval()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            if self.is_leader:
+                await asyncio.to_thread(db.release_leader_lock, LEADER_LOCK, self.holder)
+    
+    def pending_alerts(self) -> int:
+        """Alertas detectadas que todavía no terminó de enviar algún sender"""
+        return self.queue.qsize() + sum(queue.qsize() for queue in self._shard_queues)
+    
+    def start_senders(self, count: int):
+        """Crea la tarea que reparte las alertas y un sender con su cola por partición"""
+        self._shard_queues = [asyncio.Queue() for _ in range(count)]
+        self._tasks = [asyncio.create_task(self._distribute())] + [
+            asyncio.create_task(self._sender(index, count)) for index in range(count)
+        ]
+    
+    async def _renew_leadership(self) -> bool:
+        """Toma o renueva el lock de líder; True si este proceso es el líder"""
+        leader = await asyncio.to_thread(
+            db.acquire_leader_lock, LEADER_LOCK, self.holder, MONITOREO_CONFIG['lock_ttl_segundos']
+        )
+        if leader != self.is_leader:
+            logging.info(f"Monitor {self.holder}: {'líder' if leader else 'en espera'}")
+            self.is_leader = leader
+        return leader
+    
+    async def _wait_interval(self):
+        """Espera el intervalo de monitoreo vigente. Se revisa en pasos cortos para que un
+        cambio desde el panel aplique sin esperar a que termine el intervalo anterior.
+        El líder renueva el lock durante la espera (cada tercio del TTL): con un intervalo más
+        largo que el TTL, otra instancia no toma el monitoreo mientras este proceso sigue vivo"""
+        renew_every = MONITOREO_CONFIG['lock_ttl_segundos'] / 3
+        started = renewed = time.monotonic()
+        while True:
+            now = time.monotonic()
+            remaining = runtime.get('intervalo_monitoreo') - (now - started)
+            if remaining <= 0:
+                return
+            if self.is_leader and now - renewed >= renew_every:
+                renewed = now
+                try:
+                    await self._renew_leadership()
+                except Exception as e:
+                    logging.error(f"Error renovando el lock del monitoreo: {e}")
+            await asyncio.sleep(min(remaining, 1.0))
+    
+    async def detect_events(self):
+        """Consulta los partidos en vivo y encola una alerta por cada evento nuevo"""
+        fixtures = await asyncio.to_thread(api.get_fixtures, {'live': 'all'}, PRIORIDAD_LIVE)
+        if fixtures is None:
+            return
+        
+        # Ligas habilitadas en este momento (se pueden apagar desde el panel)
+        leagues = runtime.leagues()
+        for fixture in fixtures:
+            league_id = fixture.league_id
+            if league_id not in leagues:
+                continue
+            
+            fixture_id = fixture.fixture_id
+            league = leagues[league_id]
+            home = fixture.home_name
+            away = fixture.away_name
+            goals_home = fixture.goals_home
+            goals_away = fixture.goals_away
+            status = fixture.status
+            
+            # Verificar goles nuevos (la deduplicación vive en la base para que la compartan todos los procesos)
+            if status == 'LIVE' and (goals_home > 0 or goals_away > 0):
+                key = f"gol:{fixture_id}:{goals_home}:{goals_away}"
+                if await asyncio.to_thread(db.mark_event_notified, key):
+                    await self.queue.put(
+                        f"⚽️ ¡GOL EN VIVO! ⚽️\n"
+                        f"🏆 {league}\n"
+                        f"🔔 {home} {goals_home} - {goals_away} {away}\n"
+                        f"-----------------------------"
+                    )
+            
+            # Verificar final de partido
+            if status == 'FT' and await asyncio.to_thread(db.mark_event_notified, f"final:{fixture_id}"):
+                utc_time = datetime.fromisoformat(fixture.date.replace('Z', '+00:00'))
+                arg_time = utc_time - timedelta(hours=3)
+                hora = arg_time.strftime('%H:%M')
+                
+                await self.queue.put(
+                    f"🏁 FINAL DEL PARTIDO 🏁\n"
+                    f"🏆 {league}\n"
+                    f"{hora} - {home} {goals_home}-{goals_away} {away}\n"
+                    f"-----------------------------"
+                )
+    
+    async def _distribute(self):
+        """Copia cada alerta detectada en la cola de cada sender, en el orden de detección"""
+        while True:
+            mensaje = await self.queue.get()
+            alert_id = f"alerta-{uuid.uuid4().hex[:8]}"
+            for queue in self._shard_queues:
+                queue.put_nowait((alert_id, mensaje))
+            self.queue.task_done()
+    
+    async def _sender(self, index: int, count: int):
+        """Envía las alertas a los usuarios de su partición, de a una y en orden, sin frenar la detección"""
+        queue = self._shard_queues[index]
+        shard = (index, count) if count > 1 else None
+        while True:
+            alert_id, mensaje = await queue.get()
+            correlation_id.set(alert_id if shard is None else f"{alert_id}/shard-{index}")
+            try:
+                await self.send_alert_to_users(mensaje, shard)
+            except Exception as e:
+                logging.error(f"Error enviando alerta en vivo: {e}")
+            finally:
+                queue.task_done()
+    
+    async def send_alert_to_users(self, mensaje: str, shard: Tuple[int, int] = None):
+        """Envía alerta a todos los usuarios activos (o a los de una partición chat_id % N)"""
+        start = time.perf_counter()
+        sent = 0
+        sample_key = correlation_id.get()
+        async for user in db.aiter_users(shard=shard):
+            try:
+                await self.application.bot.send_message(
+                    chat_id=user.chat_id,
+                    text=mensaje
+                )
+                sent += 1
+                MESSAGES_SENT.inc(kind='alert', result='sent')
+                await asyncio.sleep(0.1)  # Pequeña pausa
+            except Exception as e:
+                MESSAGES_SENT.inc(kind='alert', result='failed')
+                log, skipped = _failure_sampler.check(sample_key)
+                if log:
+                    logging.error("Error enviando alerta a %s: %s", user.chat_id, e,
+                                  extra={'chat_id': user.chat_id, 'omitidos': skipped})
+        _failure_sampler.pop(sample_key)
+        
+        elapsed = time.perf_counter() - start
+        FANOUT_SECONDS.observe(elapsed)
+        if elapsed > 0:
+            SEND_RATE.set(sent / elapsed, kind='alert')
@@ -1,26 +1,19 @@
-import requests
-import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import logging
-from config import API_FOOTBALL_TOKEN, LIGAS_PERMITIDAS, FUNCIONES_PREMIUM
-from database import db
+from config import LIGAS_PERMITIDAS
+from api_client import api, PRIORIDAD_USUARIO, PRIORIDAD_BAJA
+from models import StandingRow, TeamForm
+from startup import Lazy
 
 class PremiumFeatures:
-    def __init__(self):
-        self.api_token = API_FOOTBALL_TOKEN
-        self.headers = {'x-apisports-key': self.api_token}
-        self.base_url = 'https://v3.football.api-sports.io'
-    
     def get_advanced_stats(self, fixture_id: int) -> Dict:
         """Obtiene estadísticas avanzadas de un partido"""
         try:
-            url = f"{self.base_url}/fixtures/statistics"
             params = {'fixture': fixture_id}
-            response = requests.get(url, headers=self.headers, params=params)
+            data = api.get('/fixtures/statistics', params, PRIORIDAD_USUARIO)
             
-            if response.status_code == 200:
-                data = response.json()
+            if data is not None:
                 if data['response']:
                     stats = data['response']
                     advanced_stats = {}
@@ -45,15 +38,13 @@ class PremiumFeatures:
     def get_head_to_head(self, team1_id: int, team2_id: int, limit: int = 5) -> List[Dict]:
         """Obtiene historial de enfrentamientos entre dos equipos"""
         try:
-            url = f"{self.base_url}/fixtures/headtohead"
             params = {
                 'h2h': f"{team1_id}-{team2_id}",
                 'last': limit
             }
-            response = requests.get(url, headers=self.headers, params=params)
+            data = api.get('/fixtures/headtohead', params, PRIORIDAD_BAJA)
             
-            if response.status_code == 200:
-                data = response.json()
+            if data is not None:
                 if data['response']:
                     h2h_matches = []
                     for match in data['response']:
@@ -72,78 +63,32 @@ class PremiumFeatures:
             logging.error(f"Error getting head to head: {e}")
             return []
     
-    def get_team_form(self, team_id: int, last_matches: int = 5) -> Dict:
+    def get_team_form(self, team_id: int, last_matches: int = 5) -> Optional[TeamForm]:
         """Obtiene la forma reciente de un equipo"""
         try:
-            url = f"{self.base_url}/fixtures"
             params = {
                 'team': team_id,
                 'last': last_matches
             }
-            response = requests.get(url, headers=self.headers, params=params)
+            fixtures = api.get_fixtures(params, PRIORIDAD_BAJA)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data['response']:
-                    form_data = {
-                        'matches': [],
-                        'wins': 0,
-                        'draws': 0,
-                        'losses': 0,
-                        'goals_for': 0,
-                        'goals_against': 0
-                    }
-                    
-                    for match in data['response']:
-                        home_team = match['teams']['home']['name']
-                        away_team = match['teams']['away']['name']
-                        home_score = match['goals']['home']
-                        away_score = match['goals']['away']
-                        status = match['fixture']['status']['short']
-                        
-                        # Determinar resultado para el equipo
-                        is_home = match['teams']['home']['id'] == team_id
-                        team_score = home_score if is_home else away_score
-                        opponent_score = away_score if is_home else home_score
-                        
-                        if status == 'FT':
-                            if team_score > opponent_score:
-                                form_data['wins'] += 1
-                            elif team_score < opponent_score:
-                                form_data['losses'] += 1
-                            else:
-                                form_data['draws'] += 1
-                        
-                        form_data['goals_for'] += team_score
-                        form_data['goals_against'] += opponent_score
-                        
-                        form_data['matches'].append({
-                            'home_team': home_team,
-                            'away_team': away_team,
-                            'score': f"{home_score}-{away_score}",
-                            'status': status,
-                            'team_score': team_score,
-                            'opponent_score': opponent_score
-                        })
-                    
-                    return form_data
-            return {}
+            if fixtures:
+                return TeamForm.from_fixtures(team_id, fixtures)
+            return None
         except Exception as e:
             logging.error(f"Error getting team form: {e}")
-            return {}
+            return None
     
     def get_player_stats(self, player_id: int) -> Dict:
         """Obtiene estadísticas detalladas de un jugador"""
         try:
-            url = f"{self.base_url}/players"
             params = {
                 'id': player_id,
                 'season': datetime.now().year
             }
-            response = requests.get(url, headers=self.headers, params=params)
+            data = api.get('/players', params, PRIORIDAD_USUARIO)
             
-            if response.status_code == 200:
-                data = response.json()
+            if data is not None:
                 if data['response']:
                     player = data['response'][0]
                     stats = player['statistics'][0] if player['statistics'] else {}
@@ -172,35 +117,16 @@ class PremiumFeatures:
     def get_league_standings_detailed(self, league_id: int) -> Dict:
         """Obtiene tabla de posiciones detallada con estadísticas"""
         try:
-            url = f"{self.base_url}/standings"
             params = {
                 'league': league_id,
                 'season': datetime.now().year
             }
-            response = requests.get(url, headers=self.headers, params=params)
+            data = api.get('/standings', params, PRIORIDAD_USUARIO)
             
-            if response.status_code == 200:
-                data = response.json()
+            if data is not None:
                 if data['response']:
                     league_data = data['response'][0]
-                    standings = []
-                    
-                    for team in league_data['league']['standings'][0]:
-                        standings.append({
-                            'position': team['rank'],
-                            'team_name': team['team']['name'],
-                            'team_logo': team['team']['logo'],
-                            'points': team['points'],
-                            'games_played': team['all']['played'],
-                            'wins': team['all']['win'],
-                            'draws': team['all']['draw'],
-                            'losses': team['all']['lose'],
-                            'goals_for': team['all']['goals']['for'],
-                            'goals_against': team['all']['goals']['against'],
-                            'goal_difference': team['goalsDiff'],
-                            'form': team['form'],
-                            'last_5': team['form'].split('')[-5:] if team['form'] else []
-                        })
+                    standings = [StandingRow.from_api(team) for team in league_data['league']['standings'][0]]
                     
                     return {
                         'league_name': league_data['league']['name'],
@@ -220,22 +146,20 @@ class PremiumFeatures:
             end_date = datetime.now().date()
             start_date = end_date - timedelta(days=7)
             
-            url = f"{self.base_url}/fixtures"
             params = {
                 'league': league_id,
                 'season': datetime.now().year,
                 'from': start_date.isoformat(),
                 'to': end_date.isoformat()
             }
-            response = requests.get(url, headers=self.headers, params=params)
+            fixtures = api.get_fixtures(params, PRIORIDAD_USUARIO)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data['response']:
+            if fixtures is not None:
+                if fixtures:
                     summary = {
                         'league_name': LIGAS_PERMITIDAS.get(league_id, 'Unknown League'),
                         'period': f"{start_date.strftime('%d/%m')} - {end_date.strftime('%d/%m')}",
-                        'total_matches': len(data['response']),
+                        'total_matches': len(fixtures),
                         'matches': [],
                         'top_scorers': [],
                         'biggest_wins': [],
@@ -243,13 +167,13 @@ class PremiumFeatures:
                     }
                     
                     total_goals = 0
-                    for match in data['response']:
-                        home_team = match['teams']['home']['name']
-                        away_team = match['teams']['away']['name']
-                        home_score = match['goals']['home']
-                        away_score = match['goals']['away']
-                        status = match['fixture']['status']['short']
-                        date = match['fixture']['date']
+                    for match in fixtures:
+                        home_team = match.home_name
+                        away_team = match.away_name
+                        home_score = match.goals_home
+                        away_score = match.goals_away
+                        status = match.status
+                        date = match.date
                         
                         if status == 'FT':
                             total_goals += home_score + away_score
@@ -289,16 +213,14 @@ class PremiumFeatures:
         """Genera predicción básica para un partido"""
         try:
             # Obtener información del partido
-            url = f"{self.base_url}/fixtures"
             params = {'id': fixture_id}
-            response = requests.get(url, headers=self.headers, params=params)
+            fixtures = api.get_fixtures(params, PRIORIDAD_BAJA)
             
-            if response.status_code == 200:
-                data = response.json()
-                if data['response']:
-                    match = data['response'][0]
-                    home_team_id = match['teams']['home']['id']
-                    away_team_id = match['teams']['away']['id']
+            if fixtures is not None:
+                if fixtures:
+                    match = fixtures[0]
+                    home_team_id = match.home_id
+                    away_team_id = match.away_id
                     
                     # Obtener forma de ambos equipos
                     home_form = self.get_team_form(home_team_id)
@@ -309,8 +231,8 @@ class PremiumFeatures:
                     
                     # Calcular predicción básica
                     prediction = {
-                        'home_team': match['teams']['home']['name'],
-                        'away_team': match['teams']['away']['name'],
+                        'home_team': match.home_name,
+                        'away_team': match.away_name,
                         'home_form': home_form,
                         'away_form': away_form,
                         'head_to_head': h2h,
@@ -323,12 +245,12 @@ class PremiumFeatures:
             logging.error(f"Error getting match prediction: {e}")
             return {}
     
-    def _calculate_prediction(self, home_form: Dict, away_form: Dict, h2h: List) -> Dict:
+    def _calculate_prediction(self, home_form: Optional[TeamForm], away_form: Optional[TeamForm], h2h: List) -> Dict:
         """Calcula predicción basada en forma y H2H"""
         try:
             # Puntos de forma
-            home_points = home_form.get('wins', 0) * 3 + home_form.get('draws', 0)
-            away_points = away_form.get('wins', 0) * 3 + away_form.get('draws', 0)
+            home_points = home_form.wins * 3 + home_form.draws if home_form else 0
+            away_points = away_form.wins * 3 + away_form.draws if away_form else 0
             
             # Ventaja local (30% más puntos)
             home_points = int(home_points * 1.3)
@@ -397,4 +319,4 @@ class PremiumFeatures:
             return "Baja"
 
 # Instancia global de funciones premium
-premium = PremiumFeatures() 
\ No newline at end of file
+premium = Lazy('premium', PremiumFeatures)
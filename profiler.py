@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from config import PROFILING_CONFIG
+from loop_watchdog import watchdog
+from metrics import add_route
+
+def _folded(frame) -> str:
+    """Pila en formato "folded" (de la raíz a la hoja, separada por ;) para flamegraphs"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class SamplingProfiler:
+    """Profiler por muestreo: cada pocos milisegundos toma la pila de todos los hilos con
+    sys._current_frames(), sin instrumentar el código. Los bloqueos del event loop del perfil
+    son los que el watchdog detecta durante la captura (un solo latido y un solo umbral)"""
+    
+    def __init__(self, config: Dict = None):
+        self.config = config or PROFILING_CONFIG
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._busy = threading.Lock()
+    
+    @property
+    def running(self) -> bool:
+        return self._busy.locked()
+    
+    def attach(self, loop: asyncio.AbstractEventLoop = None):
+        """Registra el event loop del proceso; se llama desde el hilo del loop.
+        Habilita GET /debug/profile?segundos=N en el servidor local de métricas"""
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        add_route('/debug/profile', self._http_capture)
+    
+    def _http_capture(self, query: Dict[str, str]):
+        try:
+            summary = self.capture_threadsafe(float(query.get('segundos', 0)) or None)
+        except RuntimeError as e:
+            return 409, 'text/plain; charset=utf-8', str(e).encode('utf-8')
+        except ValueError:
+            return 400, 'text/plain; charset=utf-8', b'segundos invalido'
+        return 200, 'application/json', json.dumps(summary, ensure_ascii=False, indent=2).encode('utf-8')
+    
+    async def capture(self, seconds: float = None) -> Dict:
+        """Captura un perfil de `seconds` segundos sin bloquear el loop y lo guarda en disco"""
+        seconds = min(seconds or self.config['segundos'], self.config['segundos_max'])
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError('Ya hay una captura en curso')
+        try:
+            if self._loop is None:
+                self.attach()
+            stalls: List[Dict] = []
+            record = stalls.append
+            watchdog.subscribe(record)
+            try:
+                result = await asyncio.to_thread(self._sample, seconds)
+            finally:
+                watchdog.unsubscribe(record)
+            result['bloqueos'] = [self._stall(stall, result['inicio']) for stall in stalls]
+            result['watchdog'] = watchdog.running
+            return await asyncio.to_thread(self._save, result)
+        finally:
+            self._busy.release()
+    
+    def capture_threadsafe(self, seconds: float = None) -> Dict:
+        """capture() desde otro hilo (p. ej. el endpoint HTTP local)"""
+        if self._loop is None:
+            raise RuntimeError('El event loop no está registrado')
+        future = asyncio.run_coroutine_threadsafe(self.capture(seconds), self._loop)
+        return future.result(timeout=self.config['segundos_max'] + 30)
+    
+    @staticmethod
+    def _stall(stall: Dict, started: float) -> Dict:
+        """Bloqueo reportado por el watchdog, con el inicio relativo al de la captura"""
+        return {
+            'inicio_s': round(stall['inicio'] - started, 3),
+            'duracion_ms': round(stall['duracion'] * 1000, 1),
+            'corrutina': stall['corrutina'],
+            'bloqueando': stall['bloqueando'],
+            'pila': stall['pila']
+        }
+    
+    def _sample(self, seconds: float) -> Dict:
+        interval = self.config['intervalo_ms'] / 1000
+        own = threading.get_ident()
+        stacks = Counter()
+        loop_stacks = Counter()
+        samples = 0
+        
+        started = time.monotonic()
+        while time.monotonic() - started < seconds:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = _folded(frame)
+                stacks[f"{names.get(ident, ident)};{stack}"] += 1
+                if ident == self._loop_thread:
+                    loop_stacks[stack] += 1
+            samples += 1
+            time.sleep(interval)
+        
+        return {
+            'segundos': seconds,
+            'inicio': started,
+            'muestras': samples,
+            'stacks': stacks,
+            'loop_stacks': loop_stacks
+        }
+    
+    @staticmethod
+    def _top_self(stacks: Counter, limit: int = 10) -> List[Dict]:
+        """Funciones donde más muestras terminan (tiempo propio)"""
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(stacks.values()) or 1
+        return [{'funcion': name, 'muestras': count, 'porcentaje': round(100 * count / total, 1)}
+                for name, count in leaves.most_common(limit)]
+    
+    def _save(self, result: Dict) -> Dict:
+        """Escribe el perfil folded (para flamegraph.pl / speedscope) y el resumen JSON"""
+        directory = self.config['directorio']
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        
+        with open(f"{base}.folded", 'w', encoding='utf-8') as f:
+            for stack, count in result['stacks'].most_common():
+                f.write(f"{stack} {count}\n")
+        
+        stalls = sorted(result['bloqueos'], key=lambda stall: stall['duracion_ms'], reverse=True)
+        summary = {
+            'pid': os.getpid(),
+            'segundos': result['segundos'],
+            'muestras': result['muestras'],
+            'top_loop': self._top_self(result['loop_stacks']),
+            'top_todos': self._top_self(result['stacks']),
+            # Sin watchdog no hay medición de bloqueos: 0 no significaría que no los hubo
+            'bloqueos': len(stalls) if result['watchdog'] else None,
+            'bloqueo_max_ms': stalls[0]['duracion_ms'] if stalls else 0,
+            'detalle_bloqueos': stalls,
+            'archivo_folded': f"{base}.folded",
+            'archivo_resumen': f"{base}.json"
+        }
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        logging.info(
+            "Perfil guardado en %s: %d muestras, %d bloqueos del loop", base, result['muestras'], len(stalls)
+        )
+        return summary
+
+# Instancia global del profiler del proceso
+profiler = SamplingProfiler()
@@ -0,0 +1,95 @@
+import logging
+from typing import Callable, Dict, Optional, Tuple
+from metrics import CALLBACK_ERRORS, CALLBACK_SECONDS
+
+# Nivel requerido por cada ruta
+TIER_FREE = 'free'
+TIER_PREMIUM = 'premium'
+TIER_ADMIN = 'admin'
+
+class Route:
+    """Ruta de callback_data: handler, nivel requerido y consultas que consume del plan gratuito.
+    Con with_user, el handler recibe el contexto del usuario como `user`; con with_context,
+    el contexto de telegram.ext como `context` (chat_data, bot)"""
+    __slots__ = ('name', 'handler', 'tier', 'cost', 'kwargs', 'parse', 'with_user', 'with_context')
+    
+    def __init__(self, name: str, handler: Callable, tier: str, cost: int, kwargs: Dict,
+                 parse: Callable = None, with_user: bool = False, with_context: bool = False):
+        self.name = name
+        self.handler = handler
+        self.tier = tier
+        self.cost = cost
+        self.kwargs = kwargs
+        self.parse = parse
+        self.with_user = with_user
+        self.with_context = with_context
+
+class _TrieNode:
+    __slots__ = ('children', 'route')
+    
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.route: Optional[Route] = None
+
+class CallbackRouter:
+    """Tabla de rutas compilada: dict de coincidencias exactas y trie de prefijos.
+    En las rutas por prefijo, el resto del callback_data se convierte en parámetros con parse"""
+    
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        self._root = _TrieNode()
+    
+    def exact(self, data: str, handler: Callable, tier: str = TIER_FREE, cost: int = 0,
+              with_user: bool = False, with_context: bool = False, **kwargs):
+        """Registra una ruta para un callback_data fijo; kwargs se pasan al handler"""
+        self._exact[data] = Route(data, handler, tier, cost, kwargs, with_user=with_user, with_context=with_context)
+    
+    def prefix(self, prefix: str, handler: Callable, tier: str = TIER_FREE, cost: int = 0,
+               parse: Callable[[str], Dict] = None, with_user: bool = False, with_context: bool = False,
+               **kwargs):
+        """Registra una ruta para los callback_data que empiezan con prefix.
+        parse recibe el resto y devuelve los parámetros del handler (ValueError si no es válido)"""
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.route = Route(f"{prefix}*", handler, tier, cost, kwargs, parse, with_user, with_context)
+    
+    def resolve(self, data: str) -> Tuple[Optional[Route], Dict]:
+        """Busca la ruta de un callback_data: primero exacta, después el prefijo más largo"""
+        route = self._exact.get(data)
+        if route:
+            return route, {}
+        
+        node, match, end = self._root, None, 0
+        for index, char in enumerate(data):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.route:
+                match, end = node.route, index + 1
+        if match is None:
+            return None, {}
+        
+        try:
+            params = match.parse(data[end:]) if match.parse else {}
+        except (TypeError, ValueError):
+            logging.warning(f"Parámetros inválidos en callback {data}")
+            return None, {}
+        return match, params
+    
+    async def call(self, route: Route, query, params: Dict, user=None, context=None):
+        """Ejecuta el handler de la ruta midiendo su duración en bot_callback_seconds"""
+        if route.with_user:
+            params = dict(params, user=user)
+        if route.with_context:
+            params = dict(params, context=context)
+        try:
+            with CALLBACK_SECONDS.time(route=route.name):
+                await route.handler(query, **route.kwargs, **params)
+        except Exception:
+            CALLBACK_ERRORS.inc(route=route.name)
+            raise
+
+def parse_int(name: str) -> Callable[[str], Dict]:
+    """parse para rutas cuyo resto es un entero, pasado al handler como `name`"""
+    return lambda rest: {name: int(rest)}
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+from config import API_QUOTA_CONFIG, CACHE_CONFIG, LIGAS_PERMITIDAS, LIMITES_GRATUITO, MONITOREO_CONFIG, RUNTIME_CONFIG
+from startup import Lazy
+
+def _defaults() -> Dict:
+    """Valores por defecto de cada clave, tomados de config.py en cada recarga"""
+    return {
+        'consultas_diarias': LIMITES_GRATUITO['consultas_diarias'],
+        'ligas_gratuitas': sorted(LIMITES_GRATUITO['ligas_disponibles']),
+        'ligas_activas': sorted(LIGAS_PERMITIDAS),
+        'intervalo_monitoreo': MONITOREO_CONFIG['intervalo_segundos'],
+        'reserva_monitoreo': API_QUOTA_CONFIG['reserva_monitoreo'],
+        'umbral_bajo': API_QUOTA_CONFIG['umbral_bajo'],
+        'cache_ttl': dict(CACHE_CONFIG['ttl_segundos'])
+    }
+
+def _int_between(value, low: int, high: int) -> int:
+    value = int(value)
+    if not low <= value <= high:
+        raise ValueError(f"{value} fuera del rango {low}-{high}")
+    return value
+
+def _leagues(value) -> List[int]:
+    leagues = sorted({int(league_id) for league_id in value})
+    unknown = set(leagues) - set(LIGAS_PERMITIDAS)
+    if unknown:
+        raise ValueError(f"Ligas desconocidas: {sorted(unknown)}")
+    return leagues
+
+def _ttls(value) -> Dict[str, int]:
+    return {str(endpoint): _int_between(seconds, 0, 86400) for endpoint, seconds in dict(value).items()}
+
+# Claves ajustables en caliente: cada una valida y normaliza el valor (ValueError si no es válido)
+VALIDATORS: Dict[str, Callable] = {
+    'consultas_diarias': lambda value: _int_between(value, 0, RUNTIME_CONFIG['consultas_diarias_max']),
+    'ligas_gratuitas': _leagues,
+    'ligas_activas': _leagues,
+    'intervalo_monitoreo': lambda value: _int_between(
+        value, RUNTIME_CONFIG['intervalo_monitoreo_min'], RUNTIME_CONFIG['intervalo_monitoreo_max']
+    ),
+    'reserva_monitoreo': lambda value: _int_between(value, 0, 100000),
+    'umbral_bajo': lambda value: _int_between(value, 0, 100000),
+    'cache_ttl': _ttls
+}
+
+class RuntimeSnapshot:
+    """Una versión completa de la configuración. No se modifica: quien necesita varias claves
+    coherentes entre sí toma el snapshot una vez y lee todo de él"""
+    __slots__ = ('version', 'values')
+    
+    def __init__(self, version: int, values: Dict):
+        self.version = version
+        self.values = values
+    
+    def __getitem__(self, key: str):
+        return self.values[key]
+
+class RuntimeConfig:
+    """Configuración que el panel de administración cambia sin reiniciar.
+    Cada cambio es una fila nueva de runtime_config (la versión es su id); cada proceso revisa
+    la última versión cada `refresco_segundos` y, si cambió, arma un snapshot nuevo y lo
+    reemplaza de una vez, así los lectores nunca ven una mezcla de versiones"""
+    
+    def __init__(self, store, config: Dict = None):
+        self.store = store
+        self.config = config or RUNTIME_CONFIG
+        self._snapshot = RuntimeSnapshot(0, _defaults())
+        self._listeners: List[Callable[[RuntimeSnapshot], None]] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.refresh(force=True)
+    
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+    
+    def snapshot(self) -> RuntimeSnapshot:
+        return self._snapshot
+    
+    def get(self, key: str):
+        return self._snapshot.values[key]
+    
+    def leagues(self, free_only: bool = False) -> Dict[int, str]:
+        """Ligas habilitadas (y, con free_only, además incluidas en el plan gratuito)"""
+        snapshot = self._snapshot
+        enabled = set(snapshot['ligas_activas'])
+        if free_only:
+            enabled &= set(snapshot['ligas_gratuitas'])
+        return {league_id: name for league_id, name in LIGAS_PERMITIDAS.items() if league_id in enabled}
+    
+    def subscribe(self, listener: Callable[[RuntimeSnapshot], None]):
+        """Registra un callback que recibe cada snapshot nuevo; se llama ya con el vigente"""
+        with self._lock:
+            self._listeners.append(listener)
+            listener(self._snapshot)
+    
+    def refresh(self, force: bool = False) -> bool:
+        """Carga la configuración de la base si hay una versión nueva. True si la aplicó"""
+        version = self.store.get_runtime_config_version()
+        if version is None or (version == self._snapshot.version and not force):
+            return False
+        
+        with self._lock:
+            loaded = self.store.get_runtime_config()
+            if loaded is None:
+                return False
+            version, stored = loaded
+            if version == self._snapshot.version and not force:
+                return False
+            
+            values = _defaults()
+            for key, raw in stored.items():
+                validator = VALIDATORS.get(key)
+                if validator is None:
+                    continue  # Clave que ya no se usa
+                try:
+                    values[key] = validator(json.loads(raw))
+                except (TypeError, ValueError) as e:
+                    logging.error("Valor inválido para %s en runtime_config, se usa el por defecto: %s", key, e)
+            
+            previous = self._snapshot
+            self._snapshot = RuntimeSnapshot(version, values)
+            changed = [key for key, value in values.items() if previous.values.get(key) != value]
+            if changed and previous.version:
+                logging.info("Configuración v%d aplicada: %s", version, ', '.join(changed))
+            for listener in self._listeners:
+                try:
+                    listener(self._snapshot)
+                except Exception as e:
+                    logging.error(f"Error aplicando la configuración v{version}: {e}")
+        return True
+    
+    def set(self, key: str, value, updated_by: int = None) -> RuntimeSnapshot:
+        """Valida y guarda un valor nuevo; el proceso que lo guarda lo aplica en el momento
+        y el resto en su próxima revisión"""
+        validator = VALIDATORS.get(key)
+        if validator is None:
+            raise KeyError(f"Clave de configuración desconocida: {key}")
+        value = validator(value)
+        if self.store.set_runtime_config(key, json.dumps(value), updated_by) is None:
+            raise RuntimeError(f"No se pudo guardar {key}")
+        self.refresh()
+        return self._snapshot
+    
+    def history(self, limit: int = 10) -> List[Dict]:
+        """Últimos cambios guardados, del más nuevo al más viejo"""
+        return self.store.get_runtime_config_history(limit)
+    
+    def start(self):
+        """Empieza a revisar si hay versiones nuevas; se llama con el event loop corriendo"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+    
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.config['refresco_segundos'])
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logging.error(f"Error recargando la configuración: {e}")
+
+def _create_runtime() -> RuntimeConfig:
+    # database importa este módulo: la base se resuelve recién al construir la instancia
+    from database import db
+    return RuntimeConfig(db)
+
+# Instancia global de la configuración en caliente
+runtime = Lazy('runtime', _create_runtime)
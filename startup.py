@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+from metrics import STARTUP_SECONDS
+
+# Referencia para medir el tiempo de importación de los módulos del bot
+_IMPORTED_AT = time.perf_counter()
+
+# Fases del arranque del proceso en orden: (nombre, segundos)
+_phases: List[Tuple[str, float]] = []
+_reported = False
+
+def record_phase(name: str, seconds: float):
+    _phases.append((name, seconds))
+    STARTUP_SECONDS.set(seconds, phase=name)
+
+@contextmanager
+def phase(name: str):
+    """Mide un bloque del arranque como una fase del reporte"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - start)
+
+def mark_imports():
+    """Registra lo que tardaron las importaciones desde que se importó este módulo"""
+    record_phase('imports', time.perf_counter() - _IMPORTED_AT)
+
+def report() -> Dict[str, float]:
+    """Loguea una sola vez por proceso el tiempo de cada fase del arranque"""
+    global _reported
+    timings = dict(_phases)
+    if not _reported:
+        _reported = True
+        total = time.perf_counter() - _IMPORTED_AT
+        detalle = ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in _phases)
+        logging.info("Arranque en %.2f s: %s", total, detalle or 'sin fases', extra={'fases': timings})
+    return timings
+
+class Lazy:
+    """Instancia global que se construye en el primer acceso a uno de sus atributos.
+    Importar el módulo no abre la base ni crea pools: cada proceso paga solo lo que usa.
+    configure() cambia la fábrica (p. ej. otra configuración) antes de construirla"""
+    
+    def __init__(self, name: str, factory: Callable):
+        self._lazy_name = name
+        self._lazy_factory = factory
+        self._lazy_instance = None
+        self._lazy_lock = threading.Lock()
+    
+    def _lazy_get(self):
+        instance = self._lazy_instance
+        if instance is None:
+            with self._lazy_lock:
+                instance = self._lazy_instance
+                if instance is None:
+                    with phase(f"init:{self._lazy_name}"):
+                        instance = self._lazy_factory()
+                    self._lazy_instance = instance
+        return instance
+    
+    def __getattr__(self, attr: str):
+        # Solo se llama para lo que el proxy no define: se delega en la instancia
+        return getattr(self._lazy_get(), attr)
+    
+    def __repr__(self) -> str:
+        state = repr(self._lazy_instance) if self._lazy_instance is not None else 'sin construir'
+        return f"<Lazy {self._lazy_name}: {state}>"
+    
+    @property
+    def created(self) -> bool:
+        return self._lazy_instance is not None
+    
+    def configure(self, factory: Callable):
+        """Reemplaza la fábrica; la instancia ya construida (si la hay) se descarta"""
+        with self._lazy_lock:
+            self._lazy_factory = factory
+            self._lazy_instance = None
+
+def warm_up(*instances: Lazy):
+    """Construye las instancias indicadas antes de atender tráfico, para que el primer
+    usuario no pague la creación de tablas o pools"""
+    for instance in instances:
+        instance._lazy_get()
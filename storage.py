@@ -0,0 +1,217 @@
+import sqlite3
+import logging
+import re
+from contextlib import contextmanager
+from typing import List
+
+class StorageBackend:
+    """Interfaz de almacenamiento usada por Database.
+
+    Database escribe el SQL en el dialecto común a SQLite y PostgreSQL (placeholders '?',
+    INSERT ... ON CONFLICT); cada backend traduce lo que haga falta y resuelve las
+    operaciones propias del motor (DDL, vacuum, backup)."""
+    name = 'base'
+    # Si backup() está implementado: sin él, el job de backup no se programa
+    supports_backup = False
+
+    @contextmanager
+    def connect(self):
+        """Conexión con commit al salir sin errores y rollback si hay una excepción"""
+        raise NotImplementedError
+
+    def prepare(self, cursor):
+        """Ajustes del motor antes de crear las tablas"""
+
+    def translate_ddl(self, sql: str) -> str:
+        """Adapta un CREATE TABLE escrito para SQLite al motor"""
+        return sql
+
+    def column_names(self, cursor, table: str) -> List[str]:
+        raise NotImplementedError
+
+    def incremental_vacuum(self, pages: int):
+        """Libera espacio del almacenamiento sin bloquear la base"""
+
+    def convert_to_incremental_vacuum(self) -> bool:
+        """Migración offline para que incremental_vacuum pueda liberar espacio. True si convirtió"""
+        return False
+
+    def backup(self, target_file: str, pages_per_step: int, step_pause: float):
+        raise NotImplementedError(f"Backup no soportado por el backend {self.name}")
+
+class SQLiteBackend(StorageBackend):
+    name = 'sqlite'
+    supports_backup = True
+
+    def __init__(self, db_file: str, wal: bool = False, busy_timeout: float = 5.0):
+        self.db_file = db_file
+        # Con varios procesos escribiendo (modo webhook): WAL para que las lecturas no esperen
+        # a las escrituras, y busy_timeout para esperar el lock en lugar de fallar con 'database is locked'
+        self.wal = wal
+        self.busy_timeout = busy_timeout
+        self._incremental_warned = False
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def prepare(self, cursor):
+        # Solo tiene efecto en bases nuevas; las existentes se convierten con --migrar-vacuum
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        if self.wal:
+            # Queda guardado en el archivo: basta con fijarlo al abrir la base
+            cursor.execute('PRAGMA journal_mode = WAL')
+            if cursor.fetchone()[0].lower() != 'wal':
+                logging.warning(f"SQLite database {self.db_file} could not switch to WAL journal mode")
+
+    def column_names(self, cursor, table: str) -> List[str]:
+        cursor.execute(f'PRAGMA table_info({table})')
+        return [column[1] for column in cursor.fetchall()]
+
+    @staticmethod
+    def _is_incremental(cursor) -> bool:
+        cursor.execute('PRAGMA auto_vacuum')
+        return cursor.fetchone()[0] == 2
+
+    def incremental_vacuum(self, pages: int):
+        # Nunca corre VACUUM: reescribir toda la base bloquearía a los demás procesos
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            if not self._is_incremental(cursor):
+                if not self._incremental_warned:
+                    self._incremental_warned = True
+                    logging.warning(
+                        "Database without incremental auto_vacuum: free pages are not released; "
+                        "stop the bot and run 'python bot.py --migrar-vacuum' once"
+                    )
+                return
+            cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+            cursor.fetchall()
+
+    def convert_to_incremental_vacuum(self) -> bool:
+        """Convierte una base creada sin auto_vacuum incremental. Reescribe el archivo completo
+        (VACUUM): correrlo con el bot detenido"""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            cursor = conn.cursor()
+            if self._is_incremental(cursor):
+                return False
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            return self._is_incremental(cursor)
+        finally:
+            conn.close()
+
+    def backup(self, target_file: str, pages_per_step: int, step_pause: float):
+        """Backup online: copia pages_per_step páginas por paso con una pausa entre pasos"""
+        source = sqlite3.connect(self.db_file, timeout=self.busy_timeout)
+        target = sqlite3.connect(target_file)
+        try:
+            source.backup(target, pages=pages_per_step, sleep=step_pause)
+        finally:
+            target.close()
+            source.close()
+
+class _PostgresCursor:
+    """Cursor de psycopg2 que acepta el SQL con placeholders '?'"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @staticmethod
+    def _translate(sql: str) -> str:
+        return sql.replace('%', '%%').replace('?', '%s')
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(self._translate(sql), tuple(params))
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self._cursor.executemany(self._translate(sql), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+class _PostgresConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self) -> _PostgresCursor:
+        return _PostgresCursor(self._conn.cursor())
+
+    def execute(self, sql: str, params=()) -> _PostgresCursor:
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        self._conn.commit()
+
+# Hora UTC como texto con un formato de to_char (el de CURRENT_TIMESTAMP o CURRENT_DATE en SQLite)
+_UTC_NOW_TEXT = "to_char(now() AT TIME ZONE 'UTC', '{}')"
+
+class PostgresBackend(StorageBackend):
+    """Backend PostgreSQL con pool de conexiones para varios procesos del bot sobre el mismo estado"""
+    name = 'postgres'
+
+    def __init__(self, dsn: str, min_connections: int = 1, max_connections: int = 10):
+        # Import diferido: psycopg2 solo es necesario con este backend
+        from psycopg2.pool import ThreadedConnectionPool
+        self.pool = ThreadedConnectionPool(min_connections, max_connections, dsn)
+
+    @contextmanager
+    def connect(self):
+        conn = self.pool.getconn()
+        try:
+            yield _PostgresConnection(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def translate_ddl(self, sql: str) -> str:
+        # chat_id de Telegram no entra en 32 bits; fechas y timestamps se guardan como
+        # texto ISO igual que en SQLite para que las comparaciones con str sigan valiendo
+        sql = re.sub(r'\bINTEGER\b', 'BIGINT', sql)
+        sql = sql.replace('BIGINT PRIMARY KEY AUTOINCREMENT', 'BIGSERIAL PRIMARY KEY')
+        sql = re.sub(r'\bBOOLEAN DEFAULT (\d)', r'INTEGER DEFAULT \1', sql)
+        # Los valores por defecto se escriben con el formato y el reloj (UTC) de SQLite: el texto
+        # de CURRENT_TIMESTAMP en PostgreSQL lleva microsegundos y zona, y CURRENT_DATE usa la de la sesión
+        sql = sql.replace('DEFAULT CURRENT_TIMESTAMP', f"DEFAULT {_UTC_NOW_TEXT.format('YYYY-MM-DD HH24:MI:SS')}")
+        sql = sql.replace('DEFAULT CURRENT_DATE', f"DEFAULT {_UTC_NOW_TEXT.format('YYYY-MM-DD')}")
+        sql = re.sub(r'\b(DATE|TIMESTAMP)\b', 'TEXT', sql)
+        return sql
+
+    def column_names(self, cursor, table: str) -> List[str]:
+        cursor.execute(
+            'SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = ?',
+            (table,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def create_backend(config: dict, db_file: str = None) -> StorageBackend:
+    """Crea el backend configurado en DATABASE_CONFIG"""
+    if config.get('backend', 'sqlite') == 'postgres':
+        return PostgresBackend(
+            config['postgres_dsn'],
+            config.get('pool_min', 1),
+            config.get('pool_max', 10)
+        )
+    return SQLiteBackend(
+        db_file or config['file'],
+        wal=config.get('sqlite_wal', False),
+        busy_timeout=config.get('sqlite_busy_timeout', 5.0)
+    )
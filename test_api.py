@@ -1,13 +1,13 @@
 import requests
+from config import API_FOOTBALL_TOKEN, API_FOOTBALL_URL
 
-API_KEY = 'AQUI_TU_API_KEY'  # Reemplaza por tu API Key real
-
+# Prueba manual contra la API real (consume cuota). Para medir rendimiento sin red: python -m benchmarks.run
 headers = {
-    'x-apisports-key': '9a44b9ab4bb7260880bc284c12969a10'
+    'x-apisports-key': API_FOOTBALL_TOKEN
 }
 
 # Endpoint para partidos en vivo
-url = 'https://v3.football.api-sports.io/fixtures?live=all'
+url = f'{API_FOOTBALL_URL}/fixtures?live=all'
 
 response = requests.get(url, headers=headers)
 
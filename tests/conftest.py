@@ -0,0 +1,12 @@
+import pytest
+from database import Database
+from runtime_config import RuntimeConfig, _create_runtime, runtime
+
+@pytest.fixture
+def database(tmp_path):
+    """Base SQLite nueva en un directorio temporal; la configuración en caliente global la usa
+    en lugar de la base por defecto"""
+    database = Database(str(tmp_path / 'users.db'))
+    runtime.configure(lambda: RuntimeConfig(database))
+    yield database
+    runtime.configure(_create_runtime)
@@ -0,0 +1,138 @@
+import asyncio
+import pytest
+from telegram.ext import ApplicationHandlerStop
+import admin_panel as admin_panel_module
+import bot as bot_module
+from admin_panel import AdminPanel
+from metrics import API_RESPONSES, API_SECONDS, SEND_RATE
+
+ADMIN = 1
+
+class FakeMessage:
+    def __init__(self, chat_id: int, text: str = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.replies = []
+    
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+class FakeQuery:
+    def __init__(self, chat_id: int, data: str):
+        self.data = data
+        self.message = FakeMessage(chat_id)
+        self.edits = []
+    
+    async def answer(self, *args, **kwargs):
+        pass
+    
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append((text, kwargs.get('reply_markup')))
+
+class FakeUpdate:
+    def __init__(self, chat_id: int, callback_query: FakeQuery = None, message: FakeMessage = None):
+        self.callback_query = callback_query
+        self.message = message
+        self.effective_chat = type('Chat', (), {'id': chat_id})()
+
+class FakeContext:
+    """Lo que los handlers usan de CallbackContext: chat_data del chat y el bot"""
+    
+    def __init__(self):
+        self.chat_data = {}
+        self.bot = object()
+
+@pytest.fixture
+def panel(database, monkeypatch):
+    """Panel con un administrador; registra los envíos masivos en lugar de hacerlos"""
+    admin_panel_module.admin_panel.configure(
+        lambda: AdminPanel({'admin_ids': [ADMIN], 'log_channel': None, 'support_channel': None})
+    )
+    monkeypatch.setattr(bot_module, 'db', database)
+    monkeypatch.setattr(admin_panel_module, 'db', database)
+    sent = []
+    
+    async def broadcast(bot, message_text, segment, value=None):
+        sent.append((bot, message_text, segment, value))
+        return {'sent': 3, 'failed': 0, 'total': 3}
+    
+    monkeypatch.setattr(admin_panel_module, 'broadcast', broadcast)
+    yield sent
+    admin_panel_module.admin_panel.configure(AdminPanel)
+
+async def _press(chat_id: int, data: str, context: FakeContext) -> FakeQuery:
+    query = FakeQuery(chat_id, data)
+    await bot_module.BotFutbolPremium().handle_callback(FakeUpdate(chat_id, callback_query=query), context)
+    return query
+
+async def _write(chat_id: int, text: str, context: FakeContext) -> FakeMessage:
+    message = FakeMessage(chat_id, text)
+    try:
+        await admin_panel_module.admin_panel.receive_broadcast_message(FakeUpdate(chat_id, message=message), context)
+    except ApplicationHandlerStop:
+        message.stopped = True
+    await asyncio.gather(*admin_panel_module.admin_panel._background)
+    return message
+
+def test_broadcast_flow_sends_the_next_admin_message(panel):
+    context = FakeContext()
+    
+    async def flow():
+        await _press(ADMIN, 'admin_broadcast_premium', context)
+        assert context.chat_data == {'broadcast_type': 'premium'}
+        return await _write(ADMIN, 'Hola a todos', context)
+    
+    message = asyncio.run(flow())
+    assert message.stopped  # No llega al handler de bienvenida
+    assert panel == [(context.bot, 'Hola a todos', 'premium', None)]
+    assert message.replies[-1].startswith('✅')
+    assert context.chat_data == {}
+
+def test_text_without_pending_broadcast_goes_to_the_next_handler(panel):
+    context = FakeContext()
+    message = asyncio.run(_write(ADMIN, 'hola', context))
+    assert not hasattr(message, 'stopped')
+    assert message.replies == []
+    
+    context.chat_data['broadcast_type'] = 'all'
+    message = asyncio.run(_write(2, 'hola', context))  # No es administrador
+    assert not hasattr(message, 'stopped')
+    assert panel == []
+
+def test_cancel_button_discards_pending_broadcast(panel):
+    context = FakeContext()
+    
+    async def flow():
+        await _press(ADMIN, 'admin_broadcast_all', context)
+        await _press(ADMIN, 'admin_broadcast_cancel', context)
+        return await _write(ADMIN, 'hola', context)
+    
+    message = asyncio.run(flow())
+    assert not hasattr(message, 'stopped')
+    assert panel == []
+
+def test_unknown_broadcast_type_is_ignored(panel):
+    context = FakeContext()
+    query = asyncio.run(_press(ADMIN, 'admin_broadcast_league', context))
+    assert query.edits == []
+    assert context.chat_data == {}
+
+def test_non_admin_cannot_start_a_broadcast(panel):
+    context = FakeContext()
+    query = asyncio.run(_press(2, 'admin_broadcast_all', context))
+    assert query.edits[0][0] == "❌ No tienes permisos de administrador."
+    assert context.chat_data == {}
+
+def test_logs_escape_markdown_in_metric_labels(panel):
+    API_SECONDS.observe(0.2, endpoint='fixtures')
+    API_RESPONSES.inc(endpoint='fixtures', status='connection_error')
+    SEND_RATE.set(10.0, kind='live_alert')
+    
+    query = FakeQuery(ADMIN, 'admin_logs')
+    asyncio.run(admin_panel_module.admin_panel.show_logs(query))
+    mensaje = query.edits[0][0]
+    assert 'connection\\_error: 1' in mensaje
+    assert '• live\\_alert:' in mensaje
+    # Fuera de los bloques de código no queda ningún '_' sin escapar
+    outside_code = mensaje.split('`')[::2]
+    assert all(part.count('_') == part.count('\\_') for part in outside_code)
@@ -0,0 +1,80 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+import api_client
+from api_client import ApiFootballClient
+
+ENDPOINT = '/standings'
+PARAMS = {'league': 39, 'season': 2024}
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    
+    def __init__(self, payload):
+        self._payload = payload
+    
+    def json(self):
+        return self._payload
+    
+    def close(self):
+        pass
+
+class FakeHttp:
+    """Cuenta las llamadas a la API; con gate, cada llamada espera a que el test la libere"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.gate = None
+    
+    def get(self, url, endpoint, **kwargs):
+        if self.gate:
+            self.gate.wait(5)
+        self.calls += 1
+        return FakeResponse({'response': [self.calls]})
+
+@pytest.fixture
+def client(database, monkeypatch):
+    monkeypatch.setattr(api_client, 'db', database)
+    monkeypatch.setattr(api_client, 'http', FakeHttp())
+    client = ApiFootballClient()
+    yield client
+    client._executor.shutdown(wait=True)
+
+def _age(client, delta: timedelta):
+    """Envejece la respuesta guardada en la caché del proceso"""
+    key = client._cache_key(ENDPOINT, PARAMS)
+    payload, fetched_at = client._cache[key]
+    client._cache[key] = (payload, fetched_at - delta)
+
+def test_miss_fetches_and_fresh_entry_is_served_from_cache(client):
+    data, fetched_at = client.get_with_age(ENDPOINT, PARAMS)
+    assert data == {'response': [1]}
+    assert abs(datetime.now() - fetched_at) < timedelta(seconds=5)
+    assert client.get_with_age(ENDPOINT, PARAMS) == (data, fetched_at)
+    assert api_client.http.calls == 1
+
+def test_stale_entry_is_served_and_refreshed_in_background(client):
+    client.get_with_age(ENDPOINT, PARAMS)
+    _age(client, timedelta(hours=1))
+    api_client.http.gate = threading.Event()
+    
+    # Las dos lecturas devuelven la copia vieja al instante y lanzan un solo refresco
+    stale, stale_at = client.get_with_age(ENDPOINT, PARAMS)
+    assert client.get_with_age(ENDPOINT, PARAMS) == (stale, stale_at)
+    assert stale == {'response': [1]}
+    assert datetime.now() - stale_at > timedelta(minutes=59)
+    
+    api_client.http.gate.set()
+    client._executor.shutdown(wait=True)
+    assert api_client.http.calls == 2
+    data, fetched_at = client.get_with_age(ENDPOINT, PARAMS)
+    assert data == {'response': [2]}
+    assert fetched_at > stale_at
+
+def test_entry_older_than_max_stale_is_fetched_again(client):
+    client.get_with_age(ENDPOINT, PARAMS)
+    _age(client, timedelta(hours=api_client.CACHE_CONFIG['max_stale_horas'], minutes=1))
+    data, _ = client.get_with_age(ENDPOINT, PARAMS)
+    assert data == {'response': [2]}
+    assert api_client.http.calls == 2
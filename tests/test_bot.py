@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+import bot as bot_module
+import runtime_config
+from config import MENSAJES
+
+class FakeQuery:
+    """Lo que los handlers usan de un CallbackQuery: data, message.chat_id y las respuestas"""
+    
+    def __init__(self, chat_id: int, data: str):
+        self.data = data
+        self.message = type('Message', (), {'chat_id': chat_id})()
+        self.edits = []
+    
+    async def answer(self, *args, **kwargs):
+        pass
+    
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+def _press(chat_id: int, data: str) -> FakeQuery:
+    query = FakeQuery(chat_id, data)
+    update = type('Update', (), {'callback_query': query})()
+    asyncio.run(bot_module.BotFutbolPremium().handle_callback(update, None))
+    return query
+
+@pytest.fixture
+def shown(database, monkeypatch):
+    """Base de prueba para el bot; registra las ligas que llegan a consultarse"""
+    monkeypatch.setattr(bot_module, 'db', database)
+    leagues = []
+    
+    async def get_partidos_hoy(self, query, liga_id, prioridad):
+        leagues.append(liga_id)
+    
+    monkeypatch.setattr(bot_module.BotFutbolPremium, 'get_partidos_hoy', get_partidos_hoy)
+    database.add_user(1, 'usuario')
+    return leagues
+
+@pytest.mark.parametrize('data', [
+    'liga_partidos_999',  # Liga desconocida
+    'liga_partidos_128'  # Liga solo premium
+])
+def test_league_outside_the_plan_is_rejected_without_counting(shown, database, data):
+    query = _press(1, data)
+    assert query.edits == [MENSAJES['liga_no_disponible']]
+    assert shown == []
+    assert database.load_user_context(1).queries_today == 0
+
+def test_disabled_league_is_rejected(shown, database):
+    runtime_config.runtime.set('ligas_activas', [140])
+    assert _press(1, 'liga_partidos_39').edits == [MENSAJES['liga_no_disponible']]
+    assert shown == []
+
+def test_allowed_league_is_counted_and_shown(shown, database):
+    _press(1, 'liga_partidos_39')
+    assert shown == [39]
+    assert database.load_user_context(1).queries_today == 1
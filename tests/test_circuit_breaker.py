@@ -0,0 +1,66 @@
+import pytest
+import http_client
+from http_client import CIRCUITO_ABIERTO, CIRCUITO_CERRADO, CIRCUITO_SEMIABIERTO, CircuitBreaker
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(http_client, 'time', fake)
+    return fake
+
+def _open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(max_failures=3, reset_seconds=30)
+    for _ in range(3):
+        breaker.record_failure()
+    return breaker
+
+def test_opens_after_max_failures(clock):
+    breaker = CircuitBreaker(max_failures=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CIRCUITO_CERRADO
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CIRCUITO_ABIERTO
+    assert not breaker.allow()
+
+def test_success_resets_failures(clock):
+    breaker = CircuitBreaker(max_failures=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CIRCUITO_CERRADO
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = _open_breaker()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == CIRCUITO_SEMIABIERTO
+    assert not breaker.allow()
+
+def test_probe_success_closes(clock):
+    breaker = _open_breaker()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CIRCUITO_CERRADO
+    assert breaker.allow()
+
+def test_probe_failure_reopens(clock):
+    breaker = _open_breaker()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CIRCUITO_ABIERTO
+    assert breaker.opened_at == clock.now
+    assert not breaker.allow()
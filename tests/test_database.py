@@ -0,0 +1,212 @@
+import asyncio
+import types
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+import database as database_module
+
+def _premium_counter(database) -> int:
+    return database.get_stats()['premium_users']
+
+def _events(database):
+    return [(event['chat_id'], event['event_type'], event['plan']) for event in database.get_pending_plan_events()]
+
+@pytest.fixture
+def users(database):
+    """Dos planes vencidos (uno de un usuario inactivo), uno vigente y uno gratuito"""
+    now = datetime.now()
+    for chat_id in (1, 2, 3, 4, 5):
+        database.add_user(chat_id, f"user{chat_id}")
+    database.update_user_plan(1, 'premium', now - timedelta(days=1))
+    database.update_user_plan(2, 'pro', now - timedelta(minutes=1))
+    database.update_user_plan(3, 'premium', now + timedelta(days=10))
+    database.update_user_plan(5, 'premium', now - timedelta(days=2))
+    with database.backend.connect() as conn:
+        conn.execute('UPDATE users SET is_active = 0 WHERE chat_id = 5')
+    return database
+
+def test_expire_lapsed_plans_adjusts_counter(users):
+    assert _premium_counter(users) == 4
+    assert users.expire_lapsed_plans() == 3
+    # El usuario inactivo no estaba en el contador: solo se descuentan los dos activos
+    assert _premium_counter(users) == 2
+    assert sorted(_events(users)) == [(1, 'expired', 'premium'), (2, 'expired', 'pro'), (5, 'expired', 'premium')]
+    assert users.get_plan(1)[0] == 'gratuito'
+    assert users.get_plan(3)[0] == 'premium'
+
+def test_expire_lapsed_plans_twice_counts_once(users):
+    users.expire_lapsed_plans()
+    assert users.expire_lapsed_plans() == 0
+    assert _premium_counter(users) == 2
+    assert len(_events(users)) == 3
+
+class FrozenDatetime(datetime):
+    """datetime.now() controlado por el test"""
+    current = datetime(2024, 5, 1, 12, 0, 0)
+    
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(database_module, 'datetime', FrozenDatetime)
+    FrozenDatetime.current = datetime(2024, 5, 1, 12, 0, 0)
+    return FrozenDatetime
+
+def test_leader_lock_is_exclusive_and_renewable(database, clock):
+    assert database.acquire_leader_lock('job:backup', 'a', 60)
+    assert not database.acquire_leader_lock('job:backup', 'b', 60)
+    clock.current += timedelta(seconds=50)
+    assert database.acquire_leader_lock('job:backup', 'a', 60)  # Renueva hasta +110 s
+    clock.current += timedelta(seconds=50)
+    assert not database.acquire_leader_lock('job:backup', 'b', 60)
+
+def test_leader_lock_taken_over_after_ttl(database, clock):
+    assert database.acquire_leader_lock('job:backup', 'a', 60)
+    clock.current += timedelta(seconds=61)
+    assert database.acquire_leader_lock('job:backup', 'b', 60)
+    assert not database.acquire_leader_lock('job:backup', 'a', 60)
+
+def test_released_lock_is_free(database, clock):
+    assert database.acquire_leader_lock('job:backup', 'a', 60)
+    database.release_leader_lock('job:backup', 'b')  # No es de b: no se libera
+    assert not database.acquire_leader_lock('job:backup', 'b', 60)
+    database.release_leader_lock('job:backup', 'a')
+    assert database.acquire_leader_lock('job:backup', 'b', 60)
+
+def test_stats_come_from_incremental_counters(database):
+    for chat_id in (1, 2, 3):
+        database.add_user(chat_id, f"user{chat_id}")
+    database.add_user(1, 'repetido')  # Ya existía: no suma
+    database.update_user_plan(1, 'premium', datetime.now() + timedelta(days=30))
+    database.update_user_plan(2, 'pro')
+    database.update_user_plan(2, 'premium')  # De pago a pago: no cambia el contador
+    database.update_user_plan(3, 'gratuito')
+    database.log_query(1, 'tabla', 39)
+    database.log_query(1, 'goleadores', 39)
+    database.log_query(3, 'tabla', 140)
+    
+    stats = database.get_stats()
+    assert stats['total_users'] == 3
+    assert stats['premium_users'] == 2
+    assert stats['queries_today'] == 3
+    assert stats['active_today'] == 2
+    
+    database.update_user_plan(1, 'gratuito')
+    assert _premium_counter(database) == 1
+
+def test_concurrent_plan_change_is_counted_once(database, monkeypatch):
+    """Otro proceso cambia el plan entre la lectura y el UPDATE: el ajuste usa el plan que se reemplaza"""
+    database.add_user(1, 'usuario')
+    connect = database.backend.connect
+    interleaved = []
+    
+    class Cursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+        
+        def __getattr__(self, attr):
+            return getattr(self._cursor, attr)
+        
+        def execute(self, sql, params=()):
+            self._last_sql = sql
+            return self._cursor.execute(sql, params)
+        
+        def fetchone(self):
+            row = self._cursor.fetchone()
+            if self._last_sql.startswith('SELECT COALESCE(plan') and not interleaved:
+                interleaved.append(True)
+                database.update_user_plan(1, 'pro')
+            return row
+    
+    @contextmanager
+    def interleaving_connect():
+        with connect() as conn:
+            yield types.SimpleNamespace(cursor=lambda: Cursor(conn.cursor()), commit=conn.commit)
+    
+    monkeypatch.setattr(database.backend, 'connect', interleaving_connect)
+    database.update_user_plan(1, 'premium')
+    monkeypatch.undo()
+    
+    assert interleaved
+    assert database.get_plan(1)[0] == 'premium'
+    assert _premium_counter(database) == 1  # gratuito -> pro (+1), pro -> premium (0)
+
+def _chat_ids(users) -> list:
+    return [user.chat_id for user in users]
+
+@pytest.fixture
+def many_users(database):
+    """Usuarios y grupos (chat_id negativo), uno de ellos inactivo"""
+    for chat_id in (-100200, -5, 1, 2, 3, 10 ** 10, 42):
+        database.add_user(chat_id, f"user{chat_id}")
+    with database.backend.connect() as conn:
+        conn.execute('UPDATE users SET is_active = 0 WHERE chat_id = 42')
+    return database
+
+def test_iter_users_pages_by_chat_id(many_users):
+    expected = [-100200, -5, 1, 2, 3, 10 ** 10]
+    assert _chat_ids(many_users.iter_users(chunk_size=2)) == expected
+    assert _chat_ids(many_users.iter_users(chunk_size=3)) == expected  # Último bloque exacto
+    
+    async def collect():
+        return [user async for user in many_users.aiter_users(chunk_size=4)]
+    
+    assert _chat_ids(asyncio.run(collect())) == expected
+
+def test_iter_users_shards_partition_users(many_users):
+    shards = [_chat_ids(many_users.iter_users(chunk_size=2, shard=(index, 3))) for index in range(3)]
+    assert sorted(sum(shards, [])) == [-100200, -5, 1, 2, 3, 10 ** 10]
+    for index, chat_ids in enumerate(shards):
+        assert all(abs(chat_id) % 3 == index for chat_id in chat_ids)
+
+def test_broadcast_segments(many_users):
+    now = datetime.now()
+    many_users.update_user_plan(1, 'premium', now + timedelta(days=5))
+    many_users.update_user_plan(2, 'pro', now - timedelta(days=1))  # Vencido: cuenta como gratuito
+    many_users.update_user_plan(3, 'premium')  # Sin vencimiento
+    many_users.add_user_alert(2, 'goles', league_id=39)
+    many_users.add_user_alert(3, 'goles', league_id=140)
+    with many_users.backend.connect() as conn:
+        conn.execute("UPDATE users SET last_activity = '2000-01-01 00:00:00' WHERE chat_id IN (-5, 3)")
+    
+    def segment(name, value=None):
+        return _chat_ids(many_users.iter_users(name, value, chunk_size=2))
+    
+    assert segment('premium') == [1, 3]
+    assert segment('free') == [-100200, -5, 2, 10 ** 10]
+    assert segment('league', 39) == [2]
+    assert segment('inactive', 30) == [-5, 3]
+    with pytest.raises(ValueError):
+        many_users._segment_condition('otro')
+
+@pytest.mark.parametrize('archive', [False, True])
+def test_compact_daily_queries_summarizes_old_days(database, archive):
+    today = database_module.utc_today()
+    old, older = (today - timedelta(days=35)).isoformat(), (today - timedelta(days=40)).isoformat()
+    for chat_id in (1, 2):
+        database.add_user(chat_id, f"user{chat_id}")
+    with database.backend.connect() as conn:
+        conn.executemany(
+            'INSERT INTO daily_queries (chat_id, query_type, league_id, query_date) VALUES (?, ?, ?, ?)',
+            [(1, 'tabla', 39, older), (1, 'goleadores', 39, older), (1, 'tabla', 140, older),
+             (2, 'tabla', 39, older), (1, 'tabla', 39, old)]
+        )
+        conn.execute('INSERT INTO daily_active_users (date, chat_id) VALUES (?, 1)', (older,))
+    database.log_query(1, 'tabla', 39)  # De hoy: se conserva
+    
+    assert database.compact_daily_queries(30, archive=archive) == 5
+    assert database.compact_daily_queries(30, archive=archive) == 0
+    with database.backend.connect() as conn:
+        summary = conn.execute(
+            'SELECT chat_id, date, league_id, queries_count FROM usage_stats ORDER BY date, chat_id, league_id'
+        ).fetchall()
+        remaining = conn.execute('SELECT query_date FROM daily_queries').fetchall()
+        archived = conn.execute('SELECT COUNT(*) FROM daily_queries_archive').fetchone()[0]
+        active = conn.execute('SELECT COUNT(*) FROM daily_active_users WHERE date = ?', (older,)).fetchone()[0]
+    assert summary == [(1, older, 39, 2), (1, older, 140, 1), (2, older, 39, 1), (1, old, 39, 1)]
+    assert remaining == [(today.isoformat(),)]
+    assert archived == (5 if archive else 0)
+    assert active == 0
+    assert database.load_user_context(1).queries_today == 1
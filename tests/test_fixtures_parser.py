@@ -0,0 +1,56 @@
+import io
+import json
+import pytest
+import fixtures_parser
+from fixtures_parser import parse_fixtures_response
+from models import Fixture
+
+PAYLOAD = {
+    'get': 'fixtures',
+    'results': 2,
+    'response': [
+        {
+            'fixture': {'id': 1, 'date': '2024-05-01T19:00:00+00:00', 'status': {'short': '2H', 'elapsed': 70}},
+            'league': {'id': 39, 'name': 'Premier League'},
+            'teams': {'home': {'id': 10, 'name': 'Local'}, 'away': {'id': 20, 'name': 'Visitante'}},
+            'goals': {'home': 2, 'away': 1},
+            'events': [{'type': 'Goal', 'player': {'name': 'Alguien'}}]
+        },
+        {
+            'fixture': {'id': 2, 'date': '2024-05-01T21:00:00+00:00', 'status': {'short': 'NS'}},
+            'league': {'id': 140, 'name': 'La Liga'},
+            'teams': {'home': {'id': 30, 'name': 'Otro'}, 'away': {'id': 40, 'name': 'Rival'}},
+            'goals': {'home': None, 'away': None}
+        }
+    ]
+}
+
+EXPECTED = [
+    Fixture(1, '2024-05-01T19:00:00+00:00', '2H', 39, 10, 'Local', 20, 'Visitante', 2, 1),
+    Fixture(2, '2024-05-01T21:00:00+00:00', 'NS', 140, 30, 'Otro', 40, 'Rival', None, None)
+]
+
+class FakeResponse:
+    """Lo que el parser usa de requests.Response: raw (stream) y content"""
+    
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode('utf-8')
+        self.raw = io.BytesIO(self.content)
+
+def test_streaming_parser():
+    pytest.importorskip('ijson')
+    response = FakeResponse(PAYLOAD)
+    assert parse_fixtures_response(response) == EXPECTED
+    assert response.raw.decode_content is True
+
+def test_fallback_without_ijson(monkeypatch):
+    monkeypatch.setattr(fixtures_parser, 'ijson', None)
+    response = FakeResponse(PAYLOAD)
+    assert parse_fixtures_response(response) == EXPECTED
+    assert response.raw.tell() == 0  # No lee el stream
+
+def test_empty_response(monkeypatch):
+    payload = {'response': []}
+    assert parse_fixtures_response(FakeResponse(payload)) == []
+    monkeypatch.setattr(fixtures_parser, 'ijson', None)
+    assert parse_fixtures_response(FakeResponse(payload)) == []
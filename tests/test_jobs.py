@@ -0,0 +1,32 @@
+import asyncio
+import pytest
+import jobs
+
+@pytest.fixture
+def scheduled(database, monkeypatch):
+    """Nombres de los jobs que programa schedule_jobs (sin correrlos)"""
+    monkeypatch.setattr(jobs, 'db', database)
+    names = []
+    
+    async def run_periodic(name, job, interval_seconds, *args, first_delay=0):
+        names.append(name)
+    
+    monkeypatch.setattr(jobs, 'run_periodic', run_periodic)
+    
+    def schedule():
+        async def run():
+            jobs.schedule_jobs(None)
+            await asyncio.sleep(0)
+        asyncio.run(run())
+        return names
+    
+    return schedule
+
+def test_backup_is_scheduled_with_sqlite(scheduled):
+    assert 'backup' in scheduled()
+
+def test_backup_is_not_scheduled_without_backend_support(scheduled, database, monkeypatch):
+    monkeypatch.setattr(database.backend, 'supports_backup', False)
+    names = scheduled()
+    assert 'backup' not in names
+    assert 'retencion_consultas' in names
@@ -0,0 +1,74 @@
+import asyncio
+import types
+import pytest
+import monitor as monitor_module
+import runtime_config
+from monitor import LiveMonitor
+
+_real_sleep = asyncio.sleep
+
+async def _no_sleep(delay, *args):
+    """Sin la pausa entre mensajes de send_alert_to_users"""
+    await _real_sleep(0)
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+    
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+@pytest.fixture
+def monitor(database, monkeypatch):
+    monkeypatch.setattr(monitor_module, 'db', database)
+    return LiveMonitor(types.SimpleNamespace(bot=FakeBot()))
+
+def test_each_user_gets_alerts_in_detection_order(monitor, database, monkeypatch):
+    monkeypatch.setattr(monitor_module.asyncio, 'sleep', _no_sleep)
+    for chat_id in (1, 2, 3, 4):
+        database.add_user(chat_id, f"user{chat_id}")
+    
+    async def run():
+        monitor.start_senders(2)
+        for mensaje in ('gol 1-0', 'gol 1-1', 'final'):
+            await monitor.queue.put(mensaje)
+        await monitor.queue.join()
+        for queue in monitor._shard_queues:
+            await queue.join()
+        for task in monitor._tasks:
+            task.cancel()
+    
+    asyncio.run(run())
+    assert monitor.pending_alerts() == 0
+    for chat_id in (1, 2, 3, 4):
+        received = [text for user, text in monitor.application.bot.sent if user == chat_id]
+        assert received == ['gol 1-0', 'gol 1-1', 'final']
+
+def test_leader_renews_lock_while_waiting_long_intervals(monitor, database, monkeypatch):
+    runtime_config.runtime.set('intervalo_monitoreo', 600)
+    clock = types.SimpleNamespace(now=0.0)
+    
+    async def sleep(delay):
+        clock.now += delay
+        await _real_sleep(0)
+    
+    monkeypatch.setattr(monitor_module, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(monitor_module, 'asyncio', types.SimpleNamespace(sleep=sleep, to_thread=asyncio.to_thread))
+    renewals = []
+    acquire = database.acquire_leader_lock
+    
+    def acquire_leader_lock(name, holder, ttl):
+        renewals.append(clock.now)
+        return acquire(name, holder, ttl)
+    
+    monkeypatch.setattr(database, 'acquire_leader_lock', acquire_leader_lock)
+    
+    async def run():
+        assert await monitor._renew_leadership()
+        await monitor._wait_interval()
+    
+    asyncio.run(run())
+    ttl = monitor_module.MONITOREO_CONFIG['lock_ttl_segundos']
+    # Sin renovar durante la espera, el lock vencería a los 180 s de un intervalo de 600 s
+    assert max(later - earlier for earlier, later in zip(renewals, renewals[1:] + [clock.now])) < ttl
+    assert monitor.is_leader
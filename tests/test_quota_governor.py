@@ -0,0 +1,57 @@
+import pytest
+from api_client import PRIORIDAD_BAJA, PRIORIDAD_LIVE, PRIORIDAD_USUARIO, QuotaGovernor
+
+CONFIG = {
+    'limite_diario': 100,
+    'limite_por_minuto': 1000,
+    'reserva_monitoreo': 30,
+    'umbral_bajo': 20,
+    'reserva_minuto': 2
+}
+
+def _governor(used: int, store=None, **config) -> QuotaGovernor:
+    governor = QuotaGovernor(dict(CONFIG, **config), store)
+    for _ in range(used):
+        governor.record_request()
+    return governor
+
+@pytest.mark.parametrize('used, low, user, live', [
+    (0, True, True, True),
+    (50, False, True, True),  # 50 restantes: no supera reserva + umbral (30 + 20)
+    (70, False, False, True),  # 30 restantes: solo queda la reserva del monitoreo
+    (100, False, False, False)
+])
+def test_allow_sheds_by_priority(used, low, user, live):
+    governor = _governor(used)
+    assert governor.allow(PRIORIDAD_BAJA) is low
+    assert governor.allow(PRIORIDAD_USUARIO) is user
+    assert governor.allow(PRIORIDAD_LIVE) is live
+    assert governor.get_status()['shed_today'] == [low, user, live].count(False)
+
+def test_minute_reserve_is_kept_for_live_calls():
+    governor = _governor(8, limite_por_minuto=10)
+    assert not governor.allow(PRIORIDAD_USUARIO)
+    assert not governor.allow(PRIORIDAD_BAJA)
+    assert governor.allow(PRIORIDAD_LIVE)
+
+def test_remaining_from_headers_counts_later_calls():
+    governor = _governor(10)
+    governor.update_from_headers({'x-ratelimit-requests-remaining': '40'})
+    governor.record_request()
+    assert governor.remaining_today() == 39
+    assert not governor.allow(PRIORIDAD_BAJA)
+    assert governor.allow(PRIORIDAD_USUARIO)
+
+def test_apply_runtime_changes_reserves():
+    governor = _governor(50)
+    governor.apply_runtime({'reserva_monitoreo': 10, 'umbral_bajo': 10})
+    assert governor.allow(PRIORIDAD_BAJA)
+
+def test_shared_store_counts_calls_of_every_process(database):
+    first = _governor(40, store=database)
+    second = _governor(30, store=database)
+    # 70 llamadas entre los dos procesos: ninguno puede gastar la reserva del monitoreo
+    assert first.get_status()['daily_remaining'] == 30
+    assert not first.allow(PRIORIDAD_USUARIO)
+    assert not second.allow(PRIORIDAD_USUARIO)
+    assert second.allow(PRIORIDAD_LIVE)
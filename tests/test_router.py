@@ -0,0 +1,36 @@
+from router import CallbackRouter, TIER_ADMIN, parse_int
+
+async def _handler(query, **params):
+    pass
+
+def _router() -> CallbackRouter:
+    router = CallbackRouter()
+    router.exact('admin_stats', _handler)
+    router.prefix('admin_', _handler, TIER_ADMIN, parse=lambda rest: {'data': f"admin_{rest}"})
+    router.prefix('admin_league_', _handler, parse=parse_int('league_id'), key='ligas_activas')
+    return router
+
+def test_exact_match_wins_over_prefix():
+    route, params = _router().resolve('admin_stats')
+    assert route.name == 'admin_stats'
+    assert params == {}
+
+def test_longest_prefix_wins():
+    route, params = _router().resolve('admin_league_39')
+    assert route.name == 'admin_league_*'
+    assert route.kwargs == {'key': 'ligas_activas'}
+    assert params == {'league_id': 39}
+
+def test_prefix_receives_the_rest():
+    route, params = _router().resolve('admin_statsx')
+    assert route.name == 'admin_*'
+    assert route.tier == TIER_ADMIN
+    assert params == {'data': 'admin_statsx'}
+
+def test_invalid_parameters_do_not_fall_back_to_shorter_prefix():
+    assert _router().resolve('admin_league_abc') == (None, {})
+
+def test_unknown_callback():
+    router = _router()
+    assert router.resolve('otro') == (None, {})
+    assert router.resolve('admin') == (None, {})
@@ -0,0 +1,59 @@
+import json
+import pytest
+from config import LIMITES_GRATUITO, MONITOREO_CONFIG
+from runtime_config import RuntimeConfig
+
+def _store(database, **raw):
+    """Guarda valores crudos (JSON) salteando la validación de RuntimeConfig.set"""
+    for key, value in raw.items():
+        database.set_runtime_config(key, value)
+    return database
+
+def test_defaults_without_stored_values(database):
+    config = RuntimeConfig(database)
+    assert config.version == 0
+    assert config.get('consultas_diarias') == LIMITES_GRATUITO['consultas_diarias']
+
+def test_invalid_stored_values_fall_back_to_defaults(database):
+    _store(
+        database,
+        consultas_diarias='"muchas"',
+        intervalo_monitoreo='1',  # Fuera del rango permitido
+        ligas_activas='[39, 99999]',  # Liga desconocida
+        cache_ttl='{no es json',
+        umbral_bajo='7',
+        clave_vieja='1'
+    )
+    config = RuntimeConfig(database)
+    assert config.version == 6
+    assert config.get('consultas_diarias') == LIMITES_GRATUITO['consultas_diarias']
+    assert config.get('intervalo_monitoreo') == MONITOREO_CONFIG['intervalo_segundos']
+    assert 99999 not in config.leagues()
+    assert config.get('umbral_bajo') == 7
+    assert 'clave_vieja' not in config.snapshot().values
+
+def test_refresh_applies_new_version_to_listeners(database):
+    config = RuntimeConfig(database)
+    seen = []
+    config.subscribe(lambda snapshot: seen.append(snapshot['umbral_bajo']))
+    assert not config.refresh()
+    
+    _store(database, umbral_bajo='5')
+    assert config.refresh()
+    assert seen[-1] == 5
+    
+    _store(database, umbral_bajo='"x"')
+    assert config.refresh()
+    assert config.get('umbral_bajo') != 5  # El inválido vuelve al por defecto, no al anterior
+
+def test_set_validates_before_saving(database):
+    config = RuntimeConfig(database)
+    with pytest.raises(ValueError):
+        config.set('consultas_diarias', 10 ** 6)
+    with pytest.raises(KeyError):
+        config.set('clave_vieja', 1)
+    assert database.get_runtime_config_version() == 0
+    
+    snapshot = config.set('ligas_gratuitas', ['39', 140], updated_by=1)
+    assert snapshot['ligas_gratuitas'] == [39, 140]
+    assert json.loads(database.get_runtime_config()[1]['ligas_gratuitas']) == [39, 140]
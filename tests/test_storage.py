@@ -0,0 +1,75 @@
+import os
+import uuid
+from datetime import datetime
+import pytest
+from database import TIMESTAMP_FORMAT, Database, utc_now
+from storage import PostgresBackend, SQLiteBackend, create_backend
+
+# Servidor PostgreSQL para las pruebas del backend; sin él se omiten
+POSTGRES_DSN = os.getenv('TEST_DATABASE_URL')
+
+def _translator() -> PostgresBackend:
+    """PostgresBackend sin pool: translate_ddl no usa la conexión"""
+    return PostgresBackend.__new__(PostgresBackend)
+
+def test_postgres_defaults_keep_sqlite_text_format():
+    sql = _translator().translate_ddl('''
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        query_date DATE DEFAULT CURRENT_DATE,
+        plan_expires_at TIMESTAMP
+    ''')
+    assert "created_at TEXT DEFAULT to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')" in sql
+    assert "query_date TEXT DEFAULT to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD')" in sql
+    assert 'plan_expires_at TEXT' in sql
+    assert 'CURRENT_' not in sql
+
+def test_only_sqlite_supports_backup():
+    assert SQLiteBackend.supports_backup
+    assert not PostgresBackend.supports_backup
+
+def _journal_mode(database) -> str:
+    with database.backend.connect() as conn:
+        return conn.execute('PRAGMA journal_mode').fetchone()[0]
+
+def test_sqlite_wal_only_when_configured(tmp_path):
+    assert _journal_mode(Database(str(tmp_path / 'polling.db'))) == 'delete'
+    
+    backend = create_backend({'sqlite_wal': True, 'sqlite_busy_timeout': 3}, str(tmp_path / 'webhook.db'))
+    assert backend.busy_timeout == 3
+    assert _journal_mode(Database(backend.db_file, backend)) == 'wal'
+
+@pytest.fixture
+def postgres():
+    """Database sobre PostgreSQL en un schema nuevo que se borra al terminar"""
+    if not POSTGRES_DSN:
+        pytest.skip('TEST_DATABASE_URL no configurada')
+    psycopg2 = pytest.importorskip('psycopg2')
+    from psycopg2.extensions import make_dsn
+    
+    schema = f"test_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(POSTGRES_DSN)
+    admin.autocommit = True
+    admin.cursor().execute(f'CREATE SCHEMA {schema}')
+    backend = PostgresBackend(make_dsn(POSTGRES_DSN, options=f'-c search_path={schema}'))
+    try:
+        yield Database('postgres', backend)
+    finally:
+        backend.pool.closeall()
+        admin.cursor().execute(f'DROP SCHEMA {schema} CASCADE')
+        admin.close()
+
+def test_postgres_users_and_queries(postgres):
+    assert postgres.add_user(10 ** 10, 'usuario')  # chat_id fuera de 32 bits
+    postgres.log_query(10 ** 10, 'tabla', 39)
+    
+    user = postgres.get_user(10 ** 10)
+    created_at = datetime.strptime(user.created_at, TIMESTAMP_FORMAT)
+    assert abs((created_at - utc_now()).total_seconds()) < 60
+    assert postgres.load_user_context(10 ** 10).queries_today == 1
+    assert postgres.get_stats()['total_users'] == 1
+
+def test_postgres_leader_lock(postgres):
+    assert postgres.acquire_leader_lock('job:backup', 'a', 60)
+    assert not postgres.acquire_leader_lock('job:backup', 'b', 60)
+    postgres.release_leader_lock('job:backup', 'a')
+    assert postgres.acquire_leader_lock('job:backup', 'b', 60)
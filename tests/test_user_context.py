@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from config import LIMITES_GRATUITO
+import runtime_config
+
+def _last_activity(database, chat_id: int) -> str:
+    with database.backend.connect() as conn:
+        return conn.execute('SELECT last_activity FROM users WHERE chat_id = ?', (chat_id,)).fetchone()[0]
+
+def test_unknown_user_is_free_without_queries(database):
+    user = database.load_user_context(99)
+    assert user.plan == 'gratuito'
+    assert user.queries_today == 0
+    assert user.daily_limit == LIMITES_GRATUITO['consultas_diarias']
+    assert user.can_query()
+
+def test_loads_plan_and_todays_queries_and_touches_activity(database):
+    database.add_user(1, 'usuario')
+    with database.backend.connect() as conn:
+        conn.execute("UPDATE users SET last_activity = '2000-01-01 00:00:00' WHERE chat_id = 1")
+    database.log_query(1, 'tabla', 39)
+    database.log_query(1, 'goleadores', 39)
+    
+    user = database.load_user_context(1)
+    assert user.queries_today == 2
+    assert not user.is_premium
+    assert _last_activity(database, 1) > '2000-01-01 00:00:00'
+
+def test_daily_limit_follows_runtime_config(database):
+    database.add_user(1, 'usuario')
+    for _ in range(3):
+        database.log_query(1, 'tabla', 39)
+    runtime_config.runtime.set('consultas_diarias', 3)
+    
+    user = database.load_user_context(1)
+    assert user.daily_limit == 3
+    assert user.queries_remaining == 0
+    assert not user.can_query()
+    assert user.can_query(cost=0)
+
+def test_premium_and_expired_plans(database):
+    database.add_user(1, 'vigente')
+    database.add_user(2, 'vencido')
+    database.update_user_plan(1, 'premium', datetime.now() + timedelta(days=5))
+    database.update_user_plan(2, 'premium', datetime.now() - timedelta(days=1))
+    
+    premium = database.load_user_context(1)
+    assert premium.is_premium
+    assert premium.queries_remaining is None
+    assert not database.load_user_context(2).is_premium
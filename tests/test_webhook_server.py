@@ -0,0 +1,50 @@
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import pytest
+from config import WEBHOOK_CONFIG
+from webhook_server import _WebhookHandler, shard_for
+
+SECRET = 'secreto'
+
+def _update(update_id: int, chat_id: int) -> dict:
+    return {'update_id': update_id, 'message': {'chat': {'id': chat_id}, 'text': 'hola'}}
+
+@pytest.fixture
+def server(monkeypatch):
+    """Servidor de ingreso en un puerto libre con un worker cuya cola admite un update"""
+    monkeypatch.setitem(WEBHOOK_CONFIG, 'secret', SECRET)
+    monkeypatch.setitem(WEBHOOK_CONFIG, 'espera_cola_segundos', 0.05)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _WebhookHandler)
+    server.queues = [queue.Queue(1)]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _post(server, update: dict) -> int:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.server_address[1]}{WEBHOOK_CONFIG['path']}",
+        data=json.dumps(update).encode(),
+        headers={'X-Telegram-Bot-Api-Secret-Token': SECRET, 'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def test_full_queue_answers_503_instead_of_blocking(server):
+    assert _post(server, _update(1, 10)) == 200
+    assert _post(server, _update(2, 10)) == 503
+    assert server.queues[0].get_nowait()['update_id'] == 1
+    assert _post(server, _update(3, 10)) == 200
+
+def test_same_chat_goes_to_same_worker():
+    assert shard_for(_update(1, 42), 4) == shard_for(_update(2, 42), 4) == 2
+    callback = {'update_id': 3, 'callback_query': {'from': {'id': 7}, 'message': {'chat': {'id': 42}}}}
+    assert shard_for(callback, 4) == 2
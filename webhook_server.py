@@ -0,0 +1,190 @@
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Full
+from typing import Dict, Optional
+from config import TELEGRAM_API_URL, TELEGRAM_TOKEN, WEBHOOK_CONFIG
+from logging_setup import setup_logging
+from metrics import start_metrics_server
+from startup import phase
+
+# Campos del update que traen el chat o el usuario que lo originó
+_CHAT_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                'my_chat_member', 'chat_member', 'chat_join_request')
+_USER_FIELDS = ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query')
+
+def chat_id_of(update: Dict) -> Optional[int]:
+    """chat_id (o id de usuario) al que pertenece un update en JSON"""
+    for field in _CHAT_FIELDS:
+        if field in update:
+            return update[field]['chat']['id']
+    callback = update.get('callback_query')
+    if callback:
+        message = callback.get('message')
+        return message['chat']['id'] if message else callback['from']['id']
+    for field in _USER_FIELDS:
+        if field in update:
+            return update[field]['from']['id']
+    return None
+
+def shard_for(update: Dict, workers: int) -> int:
+    """Worker que procesa el update: el mismo chat siempre va al mismo worker"""
+    chat_id = chat_id_of(update)
+    return (chat_id if chat_id is not None else update.get('update_id', 0)) % workers
+
+class ChatSerializer:
+    """Procesa en orden los updates de un mismo chat y en paralelo los de chats distintos"""
+    
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._pending: Dict[int, int] = {}
+    
+    async def run(self, chat_id: Optional[int], coro):
+        if chat_id is None:
+            await coro
+            return
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._pending[chat_id] = self._pending.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                await coro
+        finally:
+            self._pending[chat_id] -= 1
+            if not self._pending[chat_id]:
+                del self._pending[chat_id]
+                del self._locks[chat_id]
+
+async def _serve_worker(index: int, queue, background_tasks: bool):
+    """Event loop de un worker: toma updates de su cola y los procesa con la Application"""
+    with phase('imports'):
+        from telegram import Update
+        from bot import attach_loop_tools, build_application, start_background_tasks
+    
+    application = build_application(updater=False)
+    serializer = ChatSerializer()
+    slots = asyncio.Semaphore(WEBHOOK_CONFIG['updates_concurrentes'])
+    tasks = set()
+    
+    async def process(data: Dict):
+        try:
+            await serializer.run(chat_id_of(data), application.process_update(Update.de_json(data, application.bot)))
+        except Exception as e:
+            logging.error(f"Worker {index}: error procesando update {data.get('update_id')}: {e}")
+        finally:
+            slots.release()
+    
+    async with application:
+        attach_loop_tools(application)
+        await application.start()
+        if background_tasks and index == 0:
+            # Monitoreo y jobs corren en un solo worker para no duplicar trabajo
+            start_background_tasks(application)
+        logging.info(f"Worker {index} listo (pid {os.getpid()})")
+        
+        while True:
+            data = await asyncio.to_thread(queue.get)
+            if data is None:
+                break
+            await slots.acquire()
+            task = asyncio.create_task(process(data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        
+        if tasks:
+            await asyncio.wait(tasks)
+        await application.stop()
+
+def _run_worker(index: int, queue, background_tasks: bool):
+    setup_logging(f"worker-{index}")
+    # El proceso principal solo recibe HTTP; cada worker expone sus propias métricas
+    start_metrics_server(port_offset=index + 1)
+    try:
+        asyncio.run(_serve_worker(index, queue, background_tasks))
+    except KeyboardInterrupt:
+        pass
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    """Recibe los updates de Telegram y los encola en el worker de su chat"""
+    
+    def do_POST(self):
+        if self.path != WEBHOOK_CONFIG['path']:
+            self.send_error(404)
+            return
+        # Sin el secreto cualquiera podría inyectar updates (p. ej. callbacks con el chat de un admin)
+        secret = WEBHOOK_CONFIG['secret']
+        if not secret or not hmac.compare_digest(self.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret):
+            self.send_error(403)
+            return
+        try:
+            update = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            self.send_error(400)
+            return
+        
+        queues = self.server.queues
+        # Con la cola llena se espera un poco; si sigue llena, 503 y Telegram reintenta más tarde
+        # (sin límite, cada request ocupaba un hilo del servidor hasta que el worker se liberara)
+        try:
+            queues[shard_for(update, len(queues))].put(update, timeout=WEBHOOK_CONFIG['espera_cola_segundos'])
+        except Full:
+            logging.warning(f"Cola del worker llena: update {update.get('update_id')} rechazado con 503")
+            self.send_error(503)
+            return
+        self.send_response(200)
+        self.end_headers()
+    
+    def log_message(self, format, *args):
+        # Sin un log por request; los errores se registran en los workers
+        pass
+
+def register_webhook():
+    """Registra la URL del webhook en Telegram"""
+    import requests
+    
+    if not WEBHOOK_CONFIG['url']:
+        logging.warning("WEBHOOK_URL no configurada; se asume el webhook ya registrado")
+        return
+    data = {'url': WEBHOOK_CONFIG['url'], 'secret_token': WEBHOOK_CONFIG['secret']}
+    try:
+        response = requests.post(f"{TELEGRAM_API_URL}{TELEGRAM_TOKEN}/setWebhook", data=data, timeout=10)
+        if not response.ok:
+            logging.error(f"Error registrando webhook: {response.text}")
+    except requests.RequestException as e:
+        logging.error(f"Error registrando webhook: {e}")
+
+def run_webhook(background_tasks: bool = True):
+    """Modo webhook: ingreso HTTP en este proceso y N procesos worker sin estado propio.
+    Dedupe de alertas y caché de la API se comparten a través de la base.
+    Con background_tasks, el worker 0 también corre el monitoreo y las tareas periódicas"""
+    if not WEBHOOK_CONFIG['secret']:
+        raise RuntimeError(
+            "El modo webhook requiere WEBHOOK_SECRET: sin él no se puede verificar que los updates vengan de Telegram"
+        )
+    workers = WEBHOOK_CONFIG['workers'] or os.cpu_count() or 1
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue(WEBHOOK_CONFIG['cola_max']) for _ in range(workers)]
+    processes = [
+        context.Process(target=_run_worker, args=(index, queue, background_tasks), name=f'bot-worker-{index}', daemon=True)
+        for index, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+    
+    register_webhook()
+    server = ThreadingHTTPServer((WEBHOOK_CONFIG['host'], WEBHOOK_CONFIG['port']), _WebhookHandler)
+    server.queues = queues
+    logging.info(f"Webhook escuchando en {WEBHOOK_CONFIG['host']}:{WEBHOOK_CONFIG['port']} con {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join(timeout=10)